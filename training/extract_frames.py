@@ -1,103 +1,234 @@
 import cv2
-from cv2 import CAP_PROP_FPS, ROTATE_90_CLOCKWISE, ROTATE_90_COUNTERCLOCKWISE, ROTATE_180, INTER_AREA
+from cv2 import CAP_PROP_FPS, CAP_PROP_FRAME_COUNT, CAP_PROP_POS_FRAMES, ROTATE_90_CLOCKWISE, ROTATE_90_COUNTERCLOCKWISE, ROTATE_180, INTER_AREA
 import argparse
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-#Instance of pathclass for OS path and directory management 
-P = argparse.ArgumentParser(description="A simple video frame extractor.")
-#Command line arguments to be used to control the script behavior
-P.add_argument("--input", required=True, help="Path to the video file")
-P.add_argument("--output", required=True, help="Output directory for frames")
-P.add_argument("--fps", type=float, default=6.0, help="Target frame rate for extraction")
-P.add_argument("--max_height", type=int, default=720, help="Max height for resizing frames")
-P.add_argument("--rotate", choices=["none","cw","ccw","180"], default="none",
-               help="Specify initial rotation (cw/ccw/180)")
-P.add_argument("--auto_portrait", action="store_true",
-               help="Automatically rotate to ensure height >= width")
-P.add_argument("--sample", type=int, default=0,
-               help="If greater than 0, stop after this many frames (for debugging)")
-#Take CLI command line arguments and store in object ARGS when needs to be altered or accessed
-ARGS = P.parse_args()
-
-# Create a video capture object using the path provided by --input 
-video_cap = cv2.VideoCapture(ARGS.input)
-#Check to see if the file was opened, if not throw a runtime error 
-if not video_cap.isOpened():
-    raise RuntimeError("Error: Could not open video file.")
-
-#Get OG FPS of video, if nothing then provide generic value of 30
-SRC_FPS = video_cap.get(CAP_PROP_FPS) 
-if SRC_FPS == 0:
-    SRC_FPS = 30.0
-
-#Calculate how many OG frames to be read to get ARGS.fps target
-skip_interval = int(round(SRC_FPS / ARGS.fps))
-#Will save every frame if target fps >= source fps 
-if skip_interval < 1:
-    skip_interval = 1 
-
-#Path object for output directory 
-out_folder = Path(ARGS.output)
-#Create output directory if it doesn't exist and parent directories 
-out_folder.mkdir(parents=True, exist_ok=True)
-
-# Loop counters 
-F_COUNT = 0  # Total frames read
-S_COUNT = 0  # Total frames saved
-
-# Loop to process video frame by frame 
-while True:
-    # Read data from next frame, store the boolean return in ret and the frame itself in frame
-    ret = video_cap.read()
-    frame = video_cap.read() 
-    if not ret:
-        break # End of video
-
-    # Only process frames at the desired FPS
-    if F_COUNT % skip_interval == 0:
-        
-        # Apply rotation if specified in CLI command (ARGS)  
-        if ARGS.rotate == "cw":
-            frame = cv2.rotate(frame, ROTATE_90_CLOCKWISE)
-        elif ARGS.rotate == "ccw":
-            frame = cv2.rotate(frame, ROTATE_90_COUNTERCLOCKWISE)
-        elif ARGS.rotate == "180":
-            frame = cv2.rotate(frame, ROTATE_180)
-
-        # If the --auto_portrait flad was set and the frame's width is greater than its height, rotate it 
-        if ARGS.auto_portrait:
-            H, W = frame.shape[:2]
-            if W > H:
-                frame = cv2.rotate(frame, ROTATE_90_CLOCKWISE)
-                
-        # Get height and width after any rotation 
+
+def parse_args():
+    #Instance of pathclass for OS path and directory management
+    P = argparse.ArgumentParser(description="A simple video frame extractor.")
+    #Command line arguments to be used to control the script behavior
+    P.add_argument("--input", required=True, nargs="+", help="Path to one or more video files")
+    P.add_argument("--output", required=True, help="Output directory for frames")
+    P.add_argument("--fps", type=float, default=6.0, help="Target frame rate for extraction")
+    P.add_argument("--max_height", type=int, default=720, help="Max height for resizing frames")
+    P.add_argument("--rotate", choices=["none","cw","ccw","180"], default="none",
+                   help="Specify initial rotation (cw/ccw/180)")
+    P.add_argument("--auto_portrait", action="store_true",
+                   help="Automatically rotate to ensure height >= width")
+    P.add_argument("--sample", type=int, default=0,
+                   help="If greater than 0, stop after this many frames per video (for debugging)")
+    P.add_argument("--mode", choices=["auto","grab","seek"], default="auto",
+                   help="grab: skip frames with grab() (no retrieve/convert); seek: jump straight to each "
+                        "kept frame; auto: seek when kept frames are at least --seek_interval frames apart")
+    P.add_argument("--seek_interval", type=int, default=60,
+                   help="In auto mode, use seeking when the skip interval is at least this many frames")
+    P.add_argument("--writers", type=int, default=4,
+                   help="Threads per video that rotate/resize/encode JPEGs")
+    P.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                   help="Videos processed in parallel (one process each)")
+    #Take CLI command line arguments and store in object ARGS when needs to be altered or accessed
+    return P.parse_args()
+
+
+def prepare_and_save(frame, output_path, rotate, auto_portrait, max_height):
+    """
+    Rotate/resize one kept frame and write it as JPEG.
+    Runs on a writer thread (OpenCV releases the GIL for these calls).
+    """
+    # Apply rotation if specified in CLI command (ARGS)
+    if rotate == "cw":
+        frame = cv2.rotate(frame, ROTATE_90_CLOCKWISE)
+    elif rotate == "ccw":
+        frame = cv2.rotate(frame, ROTATE_90_COUNTERCLOCKWISE)
+    elif rotate == "180":
+        frame = cv2.rotate(frame, ROTATE_180)
+
+    # If the --auto_portrait flag was set and the frame's width is greater than its height, rotate it
+    if auto_portrait:
         H, W = frame.shape[:2]
+        if W > H:
+            frame = cv2.rotate(frame, ROTATE_90_CLOCKWISE)
+
+    # Get height and width after any rotation
+    H, W = frame.shape[:2]
+
+    #  Check if the current frame height exceeds the max height specified in ARGS
+    if H > max_height:
+        # Calc the resizing ratio needed to reduce the height to max_height
+        R = max_height / H
+        # Calculate the new width based on the above ratio to maintain aspect ratio
+        new_W = int(W * R)
+
+        # Resize the frame using INTER_AREA interpolation for downscaling
+        frame = cv2.resize(frame, (new_W, max_height), interpolation=INTER_AREA)
+
+    # Save operation
+    cv2.imwrite(str(output_path), frame)
+
+
+def iter_kept_frames(video_cap, skip_interval, use_seek):
+    """
+    Yield only the frames we keep (every skip_interval-th frame).
+
+    - grab mode: skipped frames are grab()bed, so they are never retrieved/converted to BGR
+    - seek mode: jump straight to each kept frame index, for sparse sampling. The frame count
+      is 0 or approximate for WebM, streamed and VFR files, so without a count this falls back
+      to grab mode, and after the last counted index it reads on in grab mode until the video ends
+    """
+    if use_seek:
+        total_frames = int(video_cap.get(CAP_PROP_FRAME_COUNT))
+        if total_frames > 0:
+            for index in range(0, total_frames, skip_interval):
+                video_cap.set(CAP_PROP_POS_FRAMES, index)
+                ret, frame = video_cap.read()
+                if not ret:
+                    return # End of video
+                yield frame
+            # Frames past the reported count, if any
+            yield from grab_kept_frames(video_cap, skip_interval, first=skip_interval - 1)
+            return
+
+    yield from grab_kept_frames(video_cap, skip_interval)
+
+
+def grab_kept_frames(video_cap, skip_interval, first=0):
+    """
+    Read on from the current position, keeping the frame `first` frames ahead and
+    every skip_interval-th frame after it (grab mode).
+    """
+    F_COUNT = 0  # Total frames read
+    while True:
+        if F_COUNT >= first and (F_COUNT - first) % skip_interval == 0:
+            # Read data from next frame, store the boolean return in ret and the frame itself in frame
+            ret, frame = video_cap.read()
+            if not ret:
+                break # End of video
+            yield frame
+        elif not video_cap.grab():
+            break # End of video
+        F_COUNT += 1
+
+
+def frame_prefixes(input_paths):
+    """
+    Output filename prefix for each input video: its stem, or "<parent folder>_<stem>"
+    when another input has the same stem (so their frames don't overwrite each other).
+    Raises ValueError if two inputs still end up with the same prefix.
+    """
+    paths = [Path(p) for p in input_paths]
+    stems = [p.stem for p in paths]
+    prefixes = [f"{p.parent.name}_{p.stem}" if stems.count(p.stem) > 1 else p.stem for p in paths]
+    duplicates = sorted({prefix for prefix in prefixes if prefixes.count(prefix) > 1})
+    if duplicates:
+        raise ValueError(f"Inputs would write the same frame names: {', '.join(duplicates)}")
+    return prefixes
+
+
+def extract_video(input_path, output, fps, max_height, rotate, auto_portrait, sample, mode, seek_interval, writers,
+                  base_name=None):
+    """
+    Extract frames from one video. Returns (input_path, saved_count).
+    Frames are named <base_name>_00000.jpg, ... (base_name defaults to the video's stem).
+    """
+    # Create a video capture object using the path provided by --input
+    video_cap = cv2.VideoCapture(str(input_path))
+    #Check to see if the file was opened, if not throw a runtime error
+    if not video_cap.isOpened():
+        raise RuntimeError(f"Error: Could not open video file: {input_path}")
+
+    #Get OG FPS of video, if nothing then provide generic value of 30
+    SRC_FPS = video_cap.get(CAP_PROP_FPS)
+    if SRC_FPS == 0:
+        SRC_FPS = 30.0
+
+    #Calculate how many OG frames to be read to get the target fps
+    skip_interval = int(round(SRC_FPS / fps))
+    #Will save every frame if target fps >= source fps
+    if skip_interval < 1:
+        skip_interval = 1
+
+    use_seek = mode == "seek" or (mode == "auto" and skip_interval >= seek_interval)
+
+    #Path object for output directory
+    out_folder = Path(output)
+    #Create output directory if it doesn't exist and parent directories
+    out_folder.mkdir(parents=True, exist_ok=True)
+
+    base_name = base_name or Path(input_path).stem
+    S_COUNT = 0  # Total frames saved
+
+    # Bound the number of decoded frames waiting for a writer so memory stays flat
+    in_flight = threading.BoundedSemaphore(writers * 2)
+
+    def save(frame, output_path):
+        try:
+            prepare_and_save(frame, output_path, rotate, auto_portrait, max_height)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        futures = []
+        for frame in iter_kept_frames(video_cap, skip_interval, use_seek):
+            # Building the output filename with Path methods
+            output_path = out_folder / f"{base_name}_{S_COUNT:05d}.jpg"
+            in_flight.acquire()
+            futures.append(pool.submit(save, frame, output_path))
+            S_COUNT += 1
+
+            # Debug/Sample limit check
+            if sample > 0 and S_COUNT >= sample:
+                break
+
+        for future in futures:
+            future.result()  # re-raise write errors
+
+    # Release the video capture object
+    video_cap.release()
+    return str(input_path), S_COUNT
+
+
+def main():
+    ARGS = parse_args()
+    options = dict(
+        output=ARGS.output,
+        fps=ARGS.fps,
+        max_height=ARGS.max_height,
+        rotate=ARGS.rotate,
+        auto_portrait=ARGS.auto_portrait,
+        sample=ARGS.sample,
+        mode=ARGS.mode,
+        seek_interval=ARGS.seek_interval,
+        writers=ARGS.writers,
+    )
+
+    try:
+        prefixes = frame_prefixes(ARGS.input)
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+
+    total_saved = 0
+    if len(ARGS.input) == 1 or ARGS.jobs <= 1:
+        for input_path, base_name in zip(ARGS.input, prefixes):
+            name, saved = extract_video(input_path, base_name=base_name, **options)
+            print(f"{name}: saved {saved} images")
+            total_saved += saved
+    else:
+        # One process per video so decoding runs on several cores
+        with ProcessPoolExecutor(max_workers=min(ARGS.jobs, len(ARGS.input))) as pool:
+            futures = [pool.submit(extract_video, input_path, base_name=base_name, **options)
+                       for input_path, base_name in zip(ARGS.input, prefixes)]
+            for future in as_completed(futures):
+                name, saved = future.result()
+                print(f"{name}: saved {saved} images")
+                total_saved += saved
+
+    # Print summary
+    print(f"Finished. Saved a total of {total_saved} images to {ARGS.output}")
+
 
-        #  Check if the current frame height exceeds the max height specified in ARGS
-        if H > ARGS.max_height:
-            # Calc the resizing ratio needed to reduce the height to ARGS.max_height
-            R = ARGS.max_height / H
-            # Calculate the new width based on the above ratio to maintain aspect ratio
-            new_W = int(W * R)
-            
-            # Resize the frame using INTER_AREA interpolation for downscaling 
-            frame = cv2.resize(frame, (new_W, ARGS.max_height), interpolation=INTER_AREA)
-        
-        # Building the output filename with Path methods
-        base_name = Path(ARGS.input).stem
-        file_name = f"{base_name}_{S_COUNT:05d}.jpg"
-        output_path = out_folder / file_name
-        
-        # Save operation
-        cv2.imwrite(str(output_path), frame)
-        S_COUNT += 1
-
-        # Debug/Sample limit check
-        if ARGS.sample > 0 and S_COUNT >= ARGS.sample:
-            break
-            
-    F_COUNT += 1
-
-# Release the video capture object and print summary
-video_cap.release()
-print(f"Finished. Saved a total of {S_COUNT} images to {out_folder}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
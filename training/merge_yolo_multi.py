@@ -1,8 +1,15 @@
 import argparse
+import hashlib
+import json
+import os
 import random
 import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 
 import yaml
 
@@ -12,10 +19,23 @@ import yaml
 # Image extensions we treat as valid inputs when scanning directories
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
 
-# When we try to find the actual file for a stem, we probe in this order
+# When several images share a stem, the first extension in this order wins
 # (keeps original behavior including uppercase variants).
 PROBE_EXTS = [".jpg", ".png", ".jpeg", ".bmp", ".JPG", ".PNG", ".JPEG"]
 
+# How images are placed into the output dataset
+LINK_MODES = ["copy", "hardlink", "reflink", "auto"]
+
+# Linux ioctl to clone a file's extents (btrfs, xfs with reflink=1, ...)
+FICLONE = 0x40049409
+
+# Written in the output root; remembers what each output file was made from
+MANIFEST_NAME = ".merge_manifest.json"
+MANIFEST_VERSION = 1
+
+# Manifest hash recorded for labels that did not exist in the source
+EMPTY_LABEL_HASH = "empty"
+
 
 # ---- Small Utilities ---------------------------------------------------------
 
@@ -52,56 +72,115 @@ def ensure_out_split_dirs(out_root: Path, split: str) -> Tuple[Path, Path]:
     return out_images, out_labels
 
 
-def find_image_with_any_extension(base_dir: Path, stem: str) -> Path:
+def _ext_rank(path: Path) -> int:
+    """Position of a file's extension in PROBE_EXTS (unknown extensions sort last)."""
+    try:
+        return PROBE_EXTS.index(path.suffix)
+    except ValueError:
+        return len(PROBE_EXTS)
+
+
+def index_images(images_dir: Path) -> Dict[str, Path]:
+    """
+    List an images directory once and return {stem: image_path}.
+    Replaces probing every stem with up to seven exists() calls.
+    """
+    index: Dict[str, Path] = {}
+    if not images_dir.is_dir():
+        return index
+
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            path = Path(entry.path)
+            if path.suffix.lower() not in IMAGE_EXTS:
+                continue
+            current = index.get(path.stem)
+            if current is None or _ext_rank(path) < _ext_rank(current):
+                index[path.stem] = path
+    return index
+
+
+def index_labels(labels_dir: Path) -> Set[str]:
+    """List a labels directory once and return the set of label file names."""
+    if not labels_dir.is_dir():
+        return set()
+    with os.scandir(labels_dir) as entries:
+        return {entry.name for entry in entries if entry.name.endswith(".txt")}
+
+
+# ---- Copy Jobs ---------------------------------------------------------------
+
+class CopyJob(NamedTuple):
     """
-    Given a directory and filename stem, return the first existing image path
-    by probing common extensions. If none found, returns a non-existing Path.
+    One file to place in the output dataset.
+    `src` is None for a missing label (an empty label file is written).
     """
-    for ext in PROBE_EXTS:
-        candidate = base_dir / f"{stem}{ext}"
-        if candidate.exists():
-            return candidate
-    return base_dir / f"{stem}.jpg"  # a non-existing path if nothing matched
+    src: Optional[Path]
+    dst: Path
+    is_image: bool
+
+
+def _jobs_for_stem(
+    img_path: Path,
+    label_names: Set[str],
+    src_labels: Path,
+    out_images: Path,
+    out_labels: Path,
+    prefix: str,
+) -> List[CopyJob]:
+    """Image + label jobs for one stem (missing labels become empty files to preserve negatives)."""
+    stem = img_path.stem
+    label_name = f"{stem}.txt"
+    label_src = src_labels / label_name if label_name in label_names else None
+
+    # Prefix output names to avoid filename collisions
+    return [
+        CopyJob(img_path, out_images / f"{prefix}_{img_path.name}", True),
+        CopyJob(label_src, out_labels / f"{prefix}_{stem}.txt", False),
+    ]
 
 
-# ---- Core Copy Helpers -------------------------------------------------------
+def _unique_dst(jobs: List[CopyJob]) -> List[CopyJob]:
+    """
+    Drop jobs whose output another job already writes.
+    a.jpg and a.png share the label a.txt: it is placed once, not twice at the same time.
+    """
+    seen: Set[Path] = set()
+    unique: List[CopyJob] = []
+    for job in jobs:
+        if job.dst not in seen:
+            seen.add(job.dst)
+            unique.append(job)
+    return unique
+
 
-def copy_split(src_root: Path, out_root: Path, split: str, prefix: str) -> int:
+def copy_split(src_root: Path, out_root: Path, split: str, prefix: str) -> List[CopyJob]:
     """
-    Copy a dataset split folder (train/val/test/valid) from src to out.
+    Plan copying a dataset split folder (train/val/test/valid) from src to out.
     Images are renamed with a prefix to avoid collisions (e.g., d1_XXXX.jpg).
     If a corresponding label is missing, an empty label file is written
     (this preserves negatives).
+    Returns the list of jobs; nothing is copied until run_jobs().
     """
     src_images = src_root / split / "images"
     src_labels = src_root / split / "labels"
 
     if not src_images.exists():
-        return 0
+        return []
 
     out_images, out_labels = ensure_out_split_dirs(out_root, split)
+    label_names = index_labels(src_labels)
 
-    copied = 0
-    for img_path in src_images.glob("*.*"):
-        if img_path.suffix.lower() not in IMAGE_EXTS:
-            continue
-
-        stem = img_path.stem
-        lbl_path = src_labels / f"{stem}.txt"
-
-        # Prefix output names to avoid filename collisions
-        new_img = out_images / f"{prefix}_{img_path.name}"
-        new_lbl = out_labels / f"{prefix}_{stem}.txt"
-
-        shutil.copy2(img_path, new_img)
-        if lbl_path.exists():
-            shutil.copy2(lbl_path, new_lbl)
-        else:
-            new_lbl.write_text("")  # preserve negatives with empty label
-
-        copied += 1
-
-    return copied
+    jobs: List[CopyJob] = []
+    with os.scandir(src_images) as entries:
+        for entry in entries:
+            img_path = Path(entry.path)
+            if not entry.is_file() or img_path.suffix.lower() not in IMAGE_EXTS:
+                continue
+            jobs.extend(_jobs_for_stem(img_path, label_names, src_labels, out_images, out_labels, prefix))
+    return _unique_dst(jobs)
 
 
 def split_train_if_needed(
@@ -109,27 +188,23 @@ def split_train_if_needed(
     out_root: Path,
     prefix: str,
     val_pct: float = 0.10
-) -> Tuple[int, int]:
+) -> Tuple[List[CopyJob], List[CopyJob]]:
     """
     If a dataset only has 'train', create a 'val' split by randomly moving a
     portion of the images into val (labels move alongside).
-    Returns (train_count, val_count) copied out.
+    Returns (train_jobs, val_jobs).
     """
     train_images_dir = src_root / "train" / "images"
     if not train_images_dir.exists():
-        return 0, 0
+        return [], []
 
-    # Gather candidate stems from existing train images
-    train_imgs = list(train_images_dir.glob("*.*"))
-    if not train_imgs:
-        return 0, 0
+    # Gather candidate stems from existing train images (one directory listing)
+    image_index = index_images(train_images_dir)
+    if not image_index:
+        return [], []
 
-    stems = [
-        p.stem for p in train_imgs
-        if p.suffix.lower() in IMAGE_EXTS
-    ]
-    if not stems:
-        return 0, 0
+    # Sorted first so the seeded shuffle does not depend on directory order
+    stems = sorted(image_index)
 
     # Deterministic shuffle (seed fixed)
     random.seed(42)
@@ -137,34 +212,267 @@ def split_train_if_needed(
 
     # Always produce at least 1 val image if there is any data
     n_val = max(1, int(len(stems) * val_pct))
-    val_stems = set(stems[:n_val])
-    train_stems = set(stems[n_val:])
+    val_stems = stems[:n_val]
+    train_stems = stems[n_val:]
+
+    src_labels = src_root / "train" / "labels"
+    label_names = index_labels(src_labels)
 
-    def copy_subset(subset: set, split: str) -> int:
+    def plan_subset(subset: List[str], split: str) -> List[CopyJob]:
         out_images, out_labels = ensure_out_split_dirs(out_root, split)
-        cnt = 0
+        jobs: List[CopyJob] = []
         for stem in subset:
-            # Find the actual image file by probing common extensions
-            actual_img = find_image_with_any_extension(train_images_dir, stem)
-            if not actual_img.exists():
-                continue
+            jobs.extend(_jobs_for_stem(image_index[stem], label_names, src_labels, out_images, out_labels, prefix))
+        return jobs
+
+    return plan_subset(train_stems, "train"), plan_subset(val_stems, "val")
+
+
+# ---- Parallel Transfer -------------------------------------------------------
+
+def _reflink(src: Path, dst: Path) -> None:
+    """Clone src into dst without copying data (Linux FICLONE). Raises OSError if unsupported."""
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink is only supported on Linux")
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            dst.unlink()
+            raise
+    shutil.copystat(src, dst)
+
+
+class Transferrer:
+    """
+    Places files in the output dataset using copy, hardlink or reflink.
+    Linking is only attempted when source and destination share a filesystem,
+    and falls back to a normal copy otherwise. Labels are always copied so
+    editing the merged labels never touches the source datasets.
+    """
+
+    def __init__(self, link_mode: str = "copy"):
+        self.link_mode = link_mode
+        self._dev_cache: Dict[Path, int] = {}
+        self._reflink_ok = link_mode in ("reflink", "auto")
+        self._lock = threading.Lock()
+        self.method_counts: Dict[str, int] = {}
+        self.files = 0
+        self.bytes = 0
+
+    def _device(self, directory: Path) -> int:
+        dev = self._dev_cache.get(directory)
+        if dev is None:
+            dev = directory.stat().st_dev
+            self._dev_cache[directory] = dev
+        return dev
+
+    def _place(self, job: CopyJob) -> str:
+        if job.src is None:
+            job.dst.write_text("")  # preserve negatives with empty label
+            return "empty"
+
+        # Replace rather than overwrite: an earlier --link run may have left a hardlink
+        # to the source here, and writing through it would modify the source file.
+        job.dst.unlink(missing_ok=True)
+
+        if job.is_image and self.link_mode != "copy" and \
+                self._device(job.src.parent) == self._device(job.dst.parent):
+            if self._reflink_ok:
+                try:
+                    _reflink(job.src, job.dst)
+                    return "reflink"
+                except OSError:
+                    # Filesystem can't clone: stop trying for the rest of the run
+                    self._reflink_ok = False
+            if self.link_mode in ("hardlink", "auto"):
+                try:
+                    os.link(job.src, job.dst)
+                    return "hardlink"
+                except OSError:
+                    pass
+
+        shutil.copy2(job.src, job.dst)
+        return "copy"
+
+    def run(self, job: CopyJob) -> None:
+        method = self._place(job)
+        size = job.src.stat().st_size if job.src is not None else 0
+        with self._lock:
+            self.method_counts[method] = self.method_counts.get(method, 0) + 1
+            self.files += 1
+            self.bytes += size
+
+
+def run_jobs(jobs: List[CopyJob], link_mode: str = "copy", workers: int = 8) -> Transferrer:
+    """
+    Execute copy jobs on a thread pool and print progress plus a throughput summary.
+    Returns the Transferrer holding the counters.
+    """
+    transferrer = Transferrer(link_mode)
+    total = len(jobs)
+    if total == 0:
+        print("Nothing to copy.")
+        return transferrer
+
+    start = time.perf_counter()
+    report_every = max(1, total // 20)  # ~every 5%
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(transferrer.run, job) for job in jobs]
+        for future in as_completed(futures):
+            future.result()  # re-raise copy errors
+            done += 1
+            if done % report_every == 0 or done == total:
+                print(f"  {done}/{total} files ({100 * done // total}%)", end="\r", flush=True)
+    print()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    mb = transferrer.bytes / (1024 * 1024)
+    methods = ", ".join(f"{k}={v}" for k, v in sorted(transferrer.method_counts.items()))
+    print(f"Transferred {transferrer.files} files ({mb:.1f} MB) in {elapsed:.1f}s "
+          f"→ {transferrer.files / elapsed:.0f} files/s, {mb / elapsed:.1f} MB/s [{methods}]")
+    return transferrer
+
+
+# ---- Manifest / Incremental Merge ---------------------------------------------
+
+class FileInfo(NamedTuple):
+    """Fingerprint of a source file as recorded in the manifest."""
+    size: int
+    mtime_ns: int
+    hash: str
+
+
+def file_hash(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Content hash of a file (blake2b, 128-bit hex)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(out_root: Path) -> Dict[str, dict]:
+    """
+    Load {output_rel_path: entry} from a previous run.
+    Returns {} if there is no manifest or it is unreadable (forces a full merge).
+    """
+    path = out_root / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        print(f"Ignoring unreadable manifest: {path}")
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_manifest(out_root: Path, entries: Dict[str, dict]) -> None:
+    """Write the manifest atomically so an interrupted run never leaves half a file."""
+    path = out_root / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": entries}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def fingerprint_sources(
+    jobs: List[CopyJob],
+    previous: Dict[str, dict],
+    workers: int = 8,
+) -> Dict[Path, FileInfo]:
+    """
+    Size, mtime and content hash for every source file in `jobs`.
+    Files whose size and mtime match the previous manifest reuse the recorded
+    hash, so only new or changed files are read.
+    """
+    prev_by_src = {e["src"]: e for e in previous.values() if e.get("src")}
+    sources = list({job.src for job in jobs if job.src is not None})
+
+    def fingerprint(src: Path) -> Tuple[Path, FileInfo]:
+        st = src.stat()
+        prev = prev_by_src.get(str(src))
+        if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+            return src, FileInfo(st.st_size, st.st_mtime_ns, prev["hash"])
+        return src, FileInfo(st.st_size, st.st_mtime_ns, file_hash(src))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(fingerprint, sources))
+
+
+def _sample_key(job: CopyJob) -> Tuple[Path, str]:
+    """Output split dir + prefixed stem; shared by an image job and its label job."""
+    return job.dst.parent.parent, job.dst.stem
+
+
+def drop_duplicate_images(
+    jobs: List[CopyJob],
+    infos: Dict[Path, FileInfo],
+) -> Tuple[List[CopyJob], int]:
+    """
+    Keep only the first image for each content hash (across all datasets and splits),
+    dropping later duplicates together with their labels.
+    Returns (kept_jobs, number_of_dropped_images).
+    """
+    seen: Set[str] = set()
+    dropped: Set[Tuple[Path, str]] = set()
+    for job in jobs:
+        if not job.is_image:
+            continue
+        digest = infos[job.src].hash
+        if digest in seen:
+            dropped.add(_sample_key(job))
+        else:
+            seen.add(digest)
+    return [job for job in jobs if _sample_key(job) not in dropped], len(dropped)
 
-            label_src = src_root / "train" / "labels" / f"{stem}.txt"
-            new_img = out_images / f"{prefix}_{actual_img.name}"
-            new_lbl = out_labels / f"{prefix}_{stem}.txt"
 
-            shutil.copy2(actual_img, new_img)
-            if label_src.exists():
-                shutil.copy2(label_src, new_lbl)
-            else:
-                new_lbl.write_text("")
+def _manifest_entry(job: CopyJob, infos: Dict[Path, FileInfo], link_mode: str) -> dict:
+    if job.src is None:
+        return {"src": None, "size": 0, "mtime_ns": 0, "hash": EMPTY_LABEL_HASH}
+    info = infos[job.src]
+    entry = {"src": str(job.src), "size": info.size, "mtime_ns": info.mtime_ns, "hash": info.hash}
+    if job.is_image:
+        # Only images are linked; a different --link re-places them
+        entry["link"] = link_mode
+    return entry
 
-            cnt += 1
-        return cnt
 
-    copied_val = copy_subset(val_stems, "val")
-    copied_train = copy_subset(train_stems, "train")
-    return copied_train, copied_val
+def plan_incremental(
+    out_root: Path,
+    jobs: List[CopyJob],
+    infos: Dict[Path, FileInfo],
+    previous: Dict[str, dict],
+    link_mode: str = "copy",
+    rerun_all: bool = False,
+) -> Tuple[List[CopyJob], List[Path], Dict[str, dict]]:
+    """
+    Compare the planned jobs with the previous manifest.
+    Returns (jobs_to_run, stale_output_paths, new_manifest_entries):
+    - jobs whose output already exists and whose source and link mode are unchanged
+      are skipped, unless `rerun_all` is set
+    - outputs recorded last time but no longer planned are stale and get removed
+    """
+    entries: Dict[str, dict] = {}
+    to_run: List[CopyJob] = []
+    for job in jobs:
+        rel = job.dst.relative_to(out_root).as_posix()
+        entry = _manifest_entry(job, infos, link_mode)
+        entries[rel] = entry
+        if rerun_all or previous.get(rel) != entry or not job.dst.exists():
+            to_run.append(job)
+
+    stale = [out_root / rel for rel in previous if rel not in entries]
+    return to_run, stale, entries
 
 
 # ---- Main Merge Logic --------------------------------------------------------
@@ -172,13 +480,22 @@ def split_train_if_needed(
 def merge_datasets(
     out_root: Path,
     dataset_roots: List[Path],
-    val_pct_if_missing: float
+    val_pct_if_missing: float,
+    link_mode: str = "copy",
+    workers: int = 8,
+    incremental: bool = True,
+    dedupe: bool = True,
 ) -> None:
     """
     Merge multiple YOLO datasets into a single dataset under `out_root`.
     - Class names must match (case-insensitive)
     - Files are prefixed per-source (d1_, d2_, ...)
     - If only 'train' exists in a source, a 'val' split is created automatically
+    - All sources are planned first, then files are transferred in parallel
+    - Identical images (same content hash) are only kept once when `dedupe` is set
+    - A manifest from the previous run is used to remove outputs whose source
+      disappeared and, with `incremental`, to copy only new/changed files
+      (without it, every file is re-hashed and re-copied)
     """
 
     # Ensure base out structure exists (train/val/test). Other splits
@@ -190,7 +507,9 @@ def merge_datasets(
     first_yaml = dataset_roots[0] / "data.yaml"
     base_names = read_names_from_yaml(first_yaml)
 
-    # Process each dataset root in order
+    all_jobs: List[CopyJob] = []
+
+    # Plan each dataset root in order
     for idx, root in enumerate(dataset_roots, start=1):
         yaml_path = root / "data.yaml"
         if not yaml_path.exists():
@@ -205,23 +524,54 @@ def merge_datasets(
             )
 
         prefix = f"d{idx}"
-        copied = 0
+        jobs: List[CopyJob] = []
+
+        # If neither 'val' nor 'valid' exists, 'train' is split into train/val below
+        # instead of also being copied whole (which put every val image in train too).
+        needs_val_split = not (root / "val").exists() and not (root / "valid").exists()
 
         # Copy splits that exist.
         # NOTE: Original behavior leaves 'valid' copied into an output 'valid' split.
         # (Even though the comment said "put 'valid' into 'val'", the actual code
         # copies into 'valid'. We keep that behavior unchanged.)
         for split in ["train", "val", "valid", "test"]:
-            copied += copy_split(root, out_root, split, prefix)
+            if split == "train" and needs_val_split:
+                continue
+            jobs.extend(copy_split(root, out_root, split, prefix))
 
-        # If neither 'val' nor 'valid' existed, create 'val' by sampling from 'train'
-        if not (root / "val").exists() and not (root / "valid").exists():
-            t_count, v_count = split_train_if_needed(
+        # Create 'val' by sampling from 'train'
+        if needs_val_split:
+            train_jobs, val_jobs = split_train_if_needed(
                 root, out_root, prefix, val_pct_if_missing
             )
-            copied += t_count + v_count
+            jobs.extend(train_jobs)
+            jobs.extend(val_jobs)
+
+        copied = sum(1 for job in jobs if job.is_image)
+        print(f"[{root}] → {copied} images with prefix {prefix}")
+        all_jobs.extend(jobs)
+
+    # Loaded for a full merge too: it is how outputs of removed sources are found
+    previous = load_manifest(out_root)
+    print(f"\nFingerprinting sources ({len(previous)} files in previous manifest)...")
+    infos = fingerprint_sources(all_jobs, previous if incremental else {}, workers=workers)
+
+    if dedupe:
+        all_jobs, duplicates = drop_duplicate_images(all_jobs, infos)
+        print(f"Dropped {duplicates} duplicate images (identical content)")
 
-        print(f"[{root}] → copied {copied} images with prefix {prefix}")
+    to_run, stale, entries = plan_incremental(out_root, all_jobs, infos, previous,
+                                              link_mode=link_mode, rerun_all=not incremental)
+    print(f"{len(to_run)} files new or changed, {len(all_jobs) - len(to_run)} unchanged, "
+          f"{len(stale)} to remove")
+
+    for path in stale:
+        if path.exists():
+            path.unlink()
+
+    print(f"\nTransferring files ({link_mode}, {workers} workers)...")
+    run_jobs(to_run, link_mode=link_mode, workers=workers)
+    save_manifest(out_root, entries)
 
     # Write the final merged data.yaml in the output root
     data_yaml = {
@@ -259,6 +609,31 @@ def parse_args() -> argparse.Namespace:
         default=0.10,
         help="Val split ratio if a dataset only has train/"
     )
+    parser.add_argument(
+        "--link",
+        choices=LINK_MODES,
+        default="copy",
+        help="How to place images: copy (default), hardlink, reflink, or auto "
+             "(reflink → hardlink → copy). Links are only used when source and output "
+             "share a filesystem; labels are always copied."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) * 4),
+        help="Number of parallel copy threads"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-hash and re-copy everything instead of only new/changed files "
+             "(outputs of removed sources are still cleaned up)"
+    )
+    parser.add_argument(
+        "--keep_duplicates",
+        action="store_true",
+        help="Keep images whose content is identical to an image already merged"
+    )
     return parser.parse_args()
 
 
@@ -271,8 +646,12 @@ def main() -> None:
         out_root=out_root,
         dataset_roots=dataset_roots,
         val_pct_if_missing=args.val_pct_if_missing,
+        link_mode=args.link,
+        workers=args.workers,
+        incremental=not args.full,
+        dedupe=not args.keep_duplicates,
     )
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
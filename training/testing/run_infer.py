@@ -1,31 +1,101 @@
 # training/testing/run_infer.py
-import sys
-import os
-import io
-from contextlib import redirect_stdout, redirect_stderr
+import argparse
 from pathlib import Path
 from ultralytics import YOLO
 
+
+def next_predict_dir(runs_dir: Path) -> Path:
+    """
+    Pick the next free runs/detect/predict* folder (predict, predict2, predict3, ...)
+    so count_punches_v5.py can still auto-find the latest log.
+    """
+    candidate = runs_dir / "predict"
+    n = 2
+    while candidate.exists():
+        candidate = runs_dir / f"predict{n}"
+        n += 1
+    return candidate
+
+
+def stream_detections(model, source, device, conf, out_dir, save_video=False):
+    """
+    Run inference frame by frame and yield (frame_num, class_counts).
+
+    What this does:
+    - Uses stream=True so ultralytics yields one Results object at a time
+      (nothing is buffered for the whole video)
+    - Only writes an annotated video when save_video is set, and then into out_dir
+    - Drops each Results object (and its image) as soon as it has been counted
+    """
+    results = model.predict(
+        source=source,
+        conf=conf,
+        device=device,
+        stream=True,
+        save=save_video,
+        project=str(out_dir.parent),
+        name=out_dir.name,
+        exist_ok=True,
+        verbose=False,
+    )
+
+    for i, result in enumerate(results):
+        class_counts = {}
+        boxes = result.boxes
+        if boxes is not None and len(boxes) > 0:
+            for class_id in boxes.cls.tolist():
+                class_name = model.names[int(class_id)]
+                class_counts[class_name] = class_counts.get(class_name, 0) + 1
+        yield i + 1, class_counts
+
+
+def format_detection_line(frame_num, class_counts):
+    """Format one frame the way count_punches_v5.py expects it."""
+    if not class_counts:
+        return f"frame {frame_num}: no detections"
+    detection_parts = [f"{count} {class_name}" for class_name, count in class_counts.items()]
+    return f"frame {frame_num}: {', '.join(detection_parts)}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run YOLO inference on an image or video and log per-frame detections.")
+    parser.add_argument("source", help="Path to image or video (relative paths are resolved from the repo root)")
+    parser.add_argument("device", nargs="?", default="cpu", help="cpu or cuda (default: cpu)")
+    parser.add_argument("--out", default=None,
+                        help="Output folder for inference_log.txt (default: next free runs/detect/predict*)")
+    parser.add_argument("--save-video", action="store_true",
+                        help="Also write the annotated video/images into the output folder")
+    parser.add_argument("--conf", type=float, default=0.1, help="Confidence threshold (default 0.1)")
+    parser.add_argument("--flush-every", type=int, default=30,
+                        help="Flush the log to disk every N frames (default 30)")
+    args = parser.parse_args()
+    if args.flush_every < 1:
+        parser.error("--flush-every must be at least 1")
+    return args
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python run_infer.py <path_to_image_or_video> [cpu|cuda]")
-        return
+    args = parse_args()
 
-    source = sys.argv[1]
-    device = sys.argv[2] if len(sys.argv) >= 3 else "cpu"  # default to CPU
-    
     # Resolve repo root from this file's location
     repo_root = Path(__file__).resolve().parents[2]
-    
+
     # If source is a relative path, make it absolute from repo root
-    if not Path(source).is_absolute():
+    source = Path(args.source)
+    if not source.is_absolute():
         source = repo_root / source
-    
+
+    out_dir = Path(args.out) if args.out else next_predict_dir(repo_root / "runs" / "detect")
+    if not out_dir.is_absolute():
+        out_dir = repo_root / out_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+
     # Debug: Print what we're using
     print(f"Source: {source}")
-    print(f"Device: {device}")
-    print(f"Source exists: {Path(source).exists()}")
-    
+    print(f"Device: {args.device}")
+    print(f"Source exists: {source.exists()}")
+    print(f"Output folder: {out_dir}")
+
     # Adjusted to current repo layout: model is under webapp/backend/models/best.pt
     model_path = repo_root / "webapp" / "backend" / "models" / "best.pt"
 
@@ -34,75 +104,36 @@ def main():
         return
 
     model = YOLO(str(model_path))
-    
-    # Run prediction and get results
-    results = model.predict(source=source, conf=0.1, device=device, save=True, verbose=True)
-    
-    # Build the frame detection log manually from results
-    frame_detections = []
-    frame_detections.append("FRAME DETECTIONS:")
-    frame_detections.append("="*50)
-    frame_detections.append("")
-    
-    # Process each result (each frame)
-    for i, result in enumerate(results):
-        frame_num = i + 1
-        boxes = result.boxes
-        
-        if boxes is not None and len(boxes) > 0:
-            # Count detections by class
-            class_counts = {}
-            for box in boxes:
-                class_id = int(box.cls[0])
-                class_name = model.names[class_id]
-                class_counts[class_name] = class_counts.get(class_name, 0) + 1
-            
-            # Format the detection line
-            detection_parts = []
-            for class_name, count in class_counts.items():
-                detection_parts.append(f"{count} {class_name}")
-            
-            detection_line = f"frame {frame_num}: {', '.join(detection_parts)}"
-            frame_detections.append(detection_line)
-        else:
-            frame_detections.append(f"frame {frame_num}: no detections")
-    
-    # Join all frame detections
-    captured_stdout = "\n".join(frame_detections)
-    captured_stderr = ""
-    
-    # Find the latest predict folder
-    runs_dir = repo_root / "runs" / "detect"
-    predict_folders = [d for d in runs_dir.iterdir() if d.is_dir() and d.name.startswith("predict")]
-    
-    if predict_folders:
-        # Get the most recent predict folder by creation time (not alphabetical)
-        latest_predict = max(predict_folders, key=lambda x: x.stat().st_mtime)
-        print(f"Results saved to: {latest_predict}")
-        
-        # Save inference log to the predict folder
-        log_file = latest_predict / "inference_log.txt"
-        
-        print(f"Saving inference log to: {log_file}")
-        
-        with open(log_file, 'w', encoding='utf-8') as f:
-            f.write(f"Source: {source}\n")
-            f.write(f"Device: {device}\n")
-            f.write(f"Predict folder: {latest_predict}\n")
-            f.write("\n" + "="*50 + "\n")
-            f.write("FRAME DETECTIONS:\n")
-            f.write("="*50 + "\n\n")
-            f.write(captured_stdout)
-            
-            if captured_stderr:
-                f.write("\n" + "="*50 + "\n")
-                f.write("STDERR:\n")
-                f.write("="*50 + "\n\n")
-                f.write(captured_stderr)
-        
-        print(f"✅ Full inference log saved to: {log_file}")
-    else:
-        print("No predict folder found")
+
+    log_file = out_dir / "inference_log.txt"
+    print(f"Saving inference log to: {log_file}")
+
+    frame_count = 0
+    with open(log_file, 'w', encoding='utf-8') as f:
+        f.write(f"Source: {source}\n")
+        f.write(f"Device: {args.device}\n")
+        f.write(f"Predict folder: {out_dir}\n")
+        f.write("\n" + "="*50 + "\n")
+        f.write("FRAME DETECTIONS:\n")
+        f.write("="*50 + "\n\n")
+
+        # Write each frame as soon as it is inferred instead of collecting all results first.
+        # Lines also go to stdout so "run_infer.py ... > inference_log.txt" keeps working.
+        for frame_num, class_counts in stream_detections(
+            model, str(source), args.device, args.conf, out_dir, save_video=args.save_video
+        ):
+            line = format_detection_line(frame_num, class_counts)
+            f.write(line + "\n")
+            print(line)
+            frame_count = frame_num
+            if frame_num % args.flush_every == 0:
+                f.flush()
+
+    print(f"Processed {frame_count} frames")
+    if args.save_video:
+        print(f"Annotated output saved to: {out_dir}")
+    print(f"✅ Full inference log saved to: {log_file}")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,17 +1,37 @@
-from fastapi import FastAPI, WebSocket, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, WebSocket, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .models import YOLOProcessor
+from fastapi.responses import Response, FileResponse, JSONResponse
+from starlette.requests import ClientDisconnect
+from . import metrics
+from . import profiling
+from . import sessions
+from . import capture
+from . import motion
+from . import roi
+from . import uploads
+from . import upload_guard
+from . import scratch
+from . import presets
+from . import video_io
+from .logging_config import setup_logging, get_logger, request_id_var, new_request_id
 from .utils import preprocess_video
+from .inference_client import inference_addresses
+import asyncio
+import contextvars
 import json
-import time
-import tempfile
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from pydantic import BaseModel
-import traceback
+from typing import Optional
 import inspect
 from .firebaseAdmin import save_or_update_score, db  # Import db from firebaseAdmin
 
+# Structured, leveled logging (BRAWLR_LOG_LEVEL / BRAWLR_LOG_FORMAT)
+setup_logging()
+logger = get_logger(__name__)
+
 # Create the FastAPI app instance
 app = FastAPI(title="Brawlr Backend", version="1.0.0")
 
@@ -24,14 +44,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load YOLO model once at startup
-yolo_processor = YOLOProcessor()
+# Tag every log line of a request with its correlation id (X-Request-ID, or a new one)
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# Load YOLO model once at startup, or, when started by serve.py with dedicated
+# inference servers, forward frames to them (this process then never imports torch)
+if inference_addresses():
+    from .inference_client import RemoteYOLOProcessor
+    yolo_processor = RemoteYOLOProcessor(inference_addresses())
+else:
+    from .models import YOLOProcessor
+    yolo_processor = YOLOProcessor()
+
+async def _run_blocking(func, *args, **kwargs):
+    """
+    Run blocking work (decoding, inference, preprocess_video) on a worker thread
+
+    The event loop keeps serving /ws sessions, /capacity and /metrics meanwhile.
+    The thread runs in a copy of the request context (request id, active
+    profile), and a profiled request samples it too.
+    """
+    def run():
+        with profiling.sampled_thread():
+            return func(*args, **kwargs)
+    return await asyncio.to_thread(run)
 
 # WebSocket endpoint - this is where the frontend connects
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     # Accept the WebSocket connection from the frontend
     await websocket.accept()
+
+    # One session per camera connection. The router (or a reconnecting client) passes
+    # ?session=<id> so the same session keeps landing on this node.
+    session = sessions.registry.open(websocket.query_params.get("session") or websocket.headers.get("x-request-id"))
+    if session is None:
+        metrics.WS_SESSIONS_REFUSED.inc()
+        logger.warning("WebSocket refused: node at capacity", extra=sessions.registry.capacity())
+        await websocket.send_text(json.dumps({"type": "error", "code": "capacity", "nodeId": sessions.NODE_ID}))
+        await websocket.close(code=1013)  # Try Again Later
+        return
+    metrics.WS_ACTIVE_SOCKETS.inc()
+    request_id_var.set(session.id)
+    logger.info("WebSocket connected")
+    await websocket.send_text(json.dumps({"type": "session", "sessionId": session.id, "nodeId": sessions.NODE_ID}))
+
+    # Tell the client what to capture; updated below as latency/load change
+    capture_controller = capture.CaptureController()
+    await websocket.send_text(json.dumps(capture_controller.initial_message()))
+
+    # Still frames reuse this session's last result instead of running YOLO
+    motion_gate = motion.MotionGate("ws")
+    # YOLO runs on a crop around the boxer once they have been found
+    roi_tracker = roi.RoiTracker()
+
+    # Admin-enabled profiling (POST /debug/profile); nothing is set up when it is off
+    profile = profile_token = None
+    frames_profiled = 0
+    profile_settings = profiling.ws_profiling.settings()
+    if profile_settings["enabled"]:
+        profile = profiling.RequestProfile("ws")
+        profile_token = profile.activate()
     
     try:
         # Keep listening for messages forever
@@ -44,23 +126,56 @@ async def websocket_endpoint(websocket: WebSocket):
             
             # Check if the message is a frame (video frame from camera)
             if message["type"] == "frame":
+                metrics.WS_FRAMES_IN.inc()
+
                 # Process the frame with YOLO
-                punch_result = yolo_processor.process_frame(message["image"])
+                sessions.registry.begin_frame(session)
+                frame_start = time.perf_counter()
+                try:
+                    # Off the event loop: other sessions keep receiving and sending meanwhile, and with
+                    # an inference server each session's frame can hold its own ring slot
+                    punch_result = await _run_blocking(yolo_processor.process_frame, message["image"],
+                                                       motion_gate, roi_tracker)
+                finally:
+                    sessions.registry.end_frame(session, time.perf_counter() - frame_start)
                 
-                if punch_result:
-                    # Send the real punch result back to the frontend
-                    await websocket.send_text(json.dumps(punch_result))
-                else:
+                if not punch_result:
                     # No punch detected, send a "no punch" message
-                    no_punch_result = {
+                    punch_result = {
                         "type": "no_punch",
                         "timestamp": int(time.time() * 1000)
                     }
-                    await websocket.send_text(json.dumps(no_punch_result))
+
+                # Echo the client's sequence number when it sent one (load generator latency matching)
+                if "seq" in message:
+                    punch_result["seq"] = message["seq"]
+
+                # Send the result back to the frontend
+                with profiling.stage("send", metrics.WS_SEND_SECONDS):
+                    await websocket.send_text(json.dumps(punch_result))
+                metrics.WS_FRAMES_OUT.inc()
+
+                capture_update = capture_controller.update(session.inference_ms, sessions.registry.utilization())
+                if capture_update:
+                    logger.info("Capture level changed", extra=capture_update)
+                    await websocket.send_text(json.dumps(capture_update))
+
+                if profile is not None:
+                    frames_profiled += 1
+                    if frames_profiled >= profile_settings["max_frames"]:
+                        profile.deactivate(profile_token)
+                        profile.save()
+                        profile = None
                 
     except Exception as e:
-        print(f"WebSocket error: {e}")
         # Connection closed or error occurred
+        logger.info("WebSocket closed", extra={"reason": repr(e)})
+    finally:
+        metrics.WS_ACTIVE_SOCKETS.dec()
+        sessions.registry.close(session)
+        if profile is not None:
+            profile.deactivate(profile_token)
+            profile.save()
 
 # Simple HTTP endpoints for testing
 @app.get("/")
@@ -71,128 +186,369 @@ async def root():
 async def health():
     return {"status": "healthy", "model_loaded": yolo_processor.model is not None}
 
+@app.get("/capacity")
+async def capacity():
+    """
+    Load signal for the /ws router: active sessions, queue depth, utilization, accepting
+    """
+    return sessions.registry.capacity()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Prometheus scrape endpoint (frame stages, sockets, upload stages, Firestore latency)
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# --------------------------
+# Profiling (admin only)
+# --------------------------
+def _require_admin(request: Request):
+    if not profiling.is_admin(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def _start_profile(request: Request, response: Response, kind: str, label: str):
+    """
+    Start profiling this request if it asked for it (X-Brawlr-Profile: 1 or ?profile=1).
+    Returns (profile, token), or (None, None) when not requested.
+    """
+    wanted = request.headers.get("x-brawlr-profile") == "1" or request.query_params.get("profile") == "1"
+    if not wanted:
+        return None, None
+    _require_admin(request)
+    profile = profiling.RequestProfile(kind, label=label)
+    response.headers["X-Brawlr-Profile"] = f"/debug/profiles/{profile.id}"
+    return profile, profile.activate()
+
+def _finish_profile(profile, token):
+    if profile is not None:
+        profile.deactivate(token)
+        profile.save()
+
+class ProfileToggleRequest(BaseModel):
+    enabled: bool
+    max_frames: Optional[int] = None
+
+@app.post("/debug/profile")
+async def toggle_ws_profiling(body: ProfileToggleRequest, request: Request):
+    """
+    Turn profiling of new /ws sessions on or off
+
+    Applies to every web worker on this node (the setting is a file in
+    BRAWLR_PROFILE_DIR), not just the one that got this request.
+    """
+    _require_admin(request)
+    return profiling.ws_profiling.configure(body.enabled, body.max_frames)
+
+@app.get("/debug/profiles")
+async def list_profiles(request: Request):
+    _require_admin(request)
+    return {"profiles": profiling.list_artifacts()}
+
+@app.get("/debug/profiles/{profile_id}")
+async def download_profile(profile_id: str, request: Request, format: str = "json"):
+    """
+    Download a profile: format=json (stage timers + top stacks) or format=collapsed (flamegraph input)
+    """
+    _require_admin(request)
+    path = profiling.artifact_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if format == "json" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
 
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
 
-# Video upload endpoint
-@app.post("/upload-video")
-async def upload_video(video: UploadFile = File(...),
-                       username: str = Form(None)):
-     # Check file size
-    video.file.seek(0, 2)  # Seek to end
-    file_size = video.file.tell()
-    video.file.seek(0)  # Reset to beginning
-    
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large (max 100MB)")
+# Uploads are received as they stream in, never spooled whole first
+async def _receive_video(request: Request, profile):
+    """
+    Stream a multipart upload to disk under a node-wide upload slot,
+    enforcing MAX_FILE_SIZE as it arrives (see upload_guard.py)
+    """
+    try:
+        async with upload_guard.upload_slot():
+            with profiling.stage("write", metrics.UPLOAD_STAGE_SECONDS.labels(stage="write")):
+                video = await upload_guard.receive_video(request, MAX_FILE_SIZE)
+    except upload_guard.UploadTooLarge as e:
+        metrics.UPLOADS_REJECTED.labels(reason="too_large").inc()
+        raise HTTPException(status_code=413, detail=str(e))
+    except upload_guard.InvalidUpload as e:
+        metrics.UPLOADS_REJECTED.labels(reason="invalid").inc()
+        raise HTTPException(status_code=400, detail=str(e))
+    except upload_guard.UploadBusy as e:
+        metrics.UPLOADS_REJECTED.labels(reason="busy").inc()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    if profile is not None:
+        profile.label = video.filename
+    return video
+
+def _get_preset(name):
+    """Upload analysis preset by name (see presets.py); 400 for unknown names"""
+    try:
+        return presets.get_preset(name)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown preset (available: {', '.join(sorted(presets.PRESETS))})")
 
+# Video upload endpoint (multipart form: video file, optional username)
+@app.post("/upload-video")
+async def upload_video(request: Request, response: Response, preset: Optional[str] = None):
     """
     Upload a video file and process it through YOLO to count punches
+    (?preset=fast|accurate|... picks the speed/accuracy trade-off; admins can
+    add X-Brawlr-Profile: 1 to capture a profile of this request)
     """
+    analysis_preset = _get_preset(preset)
+    profile, profile_token = _start_profile(request, response, "upload", "")
     try:
-        #validate file type
-        if not video.content_type.startswith('video/'):
-            raise HTTPException(status_code=400, detail="File must be a video")
-        
-        #save uploaded video to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{video.filename.split('.')[-1]}") as temp_file:
-            # content = await video.read()
-            # temp_file.write(content)
-            # temp_file_path = temp_file.name
-            #Change for straming file 
-            while chunk := await video.read(1024 * 1024):
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
-        
-        try:
+        with await _receive_video(request, profile) as video:  # deletes the upload on exit
+            return await _upload_video(video, video.fields.get("username"), analysis_preset)
+    finally:
+        _finish_profile(profile, profile_token)
+
+async def _upload_video(video: upload_guard.ReceivedVideo, username: str, preset: presets.Preset):
+    try:
+        # The upload is already in scratch space (written by _receive_video while it arrived);
+        # the preprocessed copy goes there too and is deleted when the with-block exits
+        with scratch.space.file(".mp4", size_hint=video.size) as preprocessed:
              # Preprocess video for faster analysis (lower resolution)
-            print(f"Preprocessing video (fast mode): {video.filename}")
-            preprocessed_path = preprocess_video(temp_file_path, max_resolution=480)
+            logger.info("Preprocessing video", extra={"upload_filename": video.filename, "scratch_ram": preprocessed.in_ram,
+                                                      "preset": preset.name})
+            with profiling.stage("preprocess", metrics.UPLOAD_STAGE_SECONDS.labels(stage="preprocess")):
+                preprocessed_path = await _run_blocking(preprocess_video, video.path,
+                                                        max_resolution=preset.preprocess_resolution,
+                                                        output_path=preprocessed.path)
             
             # Process video through YOLO
-            print(f"Processing video: {video.filename}")
-            #print(f"Video size: {len(content)} bytes")
-            # Use ultra-fast processing (every 5th frame)
-            punch_counts = yolo_processor.process_video(preprocessed_path)
+            # Both blocking calls run on worker threads: /ws sessions, /capacity and /metrics
+            # on this node keep answering while the upload is analysed
+            analysis = await _run_blocking(yolo_processor.process_video, preprocessed_path, **preset.process_options())
+            punch_counts = analysis["punchCounts"]
             
             total_score = punch_counts.get("total", 0)
             save_result = None
 
             if username and total_score > 0:
-                print(f"Saving score for user: {username} with score: {total_score}")
+                logger.info("Saving score", extra={"username": username, "score": total_score})
                 save_result = await save_or_update_score(username, total_score)
             
+            metrics.UPLOAD_JOBS.labels(endpoint="upload-video", status="ok").inc()
             return {
                 "success": True,
                 "filename": video.filename,
+                "videoType": analysis["videoType"],
                 "punchCounts": punch_counts,
-                "processingMode": "ultra-fast",
+                "processingMode": preset.name,
+                "preset": preset.name,
                 "scoreSaved": save_result
             }
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-            if 'preprocessed_path' in locals() and os.path.exists(preprocessed_path):
-                os.unlink(preprocessed_path)
                 
     except Exception as e:
-        print(f"Video processing error: {e}")
+        metrics.UPLOAD_JOBS.labels(endpoint="upload-video", status="error").inc()
+        logger.exception("Video processing error")
         raise HTTPException(status_code=500, detail=f"Video processing failed: {str(e)}")
     
 
     # Ultra-fast video upload endpoint
 @app.post("/upload-video-fast")
-async def upload_video_fast(video: UploadFile = File(...)):
+async def upload_video_fast(request: Request, response: Response):
     """
     Ultra-fast video upload and processing with maximum frame skipping
+    (the "fast" preset)
     """
+    profile, profile_token = _start_profile(request, response, "upload-fast", "")
     try:
-        # Validate file type
-        if not video.content_type.startswith('video/'):
-            raise HTTPException(status_code=400, detail="File must be a video")
-        
-        # Create temporary file to save uploaded video
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{video.filename.split('.')[-1]}") as temp_file:
-            # Write uploaded video to temporary file
-            # content = await video.read()
-            # temp_file.write(content)
-            # temp_file_path = temp_file.name
-            while chunk := await video.read(1024 * 1024):
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
-        
-        try:
+        with await _receive_video(request, profile) as video:  # deletes the upload on exit
+            return await _upload_video_fast(video)
+    finally:
+        _finish_profile(profile, profile_token)
+
+async def _upload_video_fast(video: upload_guard.ReceivedVideo):
+    try:
+        # Preprocessed copy in scratch space, deleted when the with-block exits
+        with scratch.space.file(".mp4", size_hint=video.size) as preprocessed:
             # Preprocess video for faster analysis (lower resolution)
-            print(f"Preprocessing video (fast mode): {video.filename}")
-            preprocessed_path = preprocess_video(temp_file_path, max_resolution=480)
+            preset = presets.get_preset("fast")
+            logger.info("Preprocessing video (fast mode)", extra={"upload_filename": video.filename, "scratch_ram": preprocessed.in_ram})
+            with profiling.stage("preprocess", metrics.UPLOAD_STAGE_SECONDS.labels(stage="preprocess")):
+                preprocessed_path = await _run_blocking(preprocess_video, video.path,
+                                                        max_resolution=preset.preprocess_resolution,
+                                                        output_path=preprocessed.path)
             
-            # Process video through YOLO with maximum optimizations
-            print(f"Processing video (fast mode): {video.filename}")
-            #print(f"Video size: {len(content)} bytes")
-            
-            # Use ultra-fast processing (every 5th frame)
-            punch_counts = yolo_processor.process_video_fast(preprocessed_path)
+            # Process video through YOLO with the fast preset (smaller inference size, YOLO on every Nth frame)
+            analysis = await _run_blocking(yolo_processor.process_video, preprocessed_path, **preset.process_options())
             
+            metrics.UPLOAD_JOBS.labels(endpoint="upload-video-fast", status="ok").inc()
             return {
                 "success": True,
                 "filename": video.filename,
-                "punchCounts": punch_counts,
-                "processingMode": "ultra-fast"
+                "videoType": analysis["videoType"],
+                "punchCounts": analysis["punchCounts"],
+                "processingMode": preset.name,
+                "preset": preset.name
             }
-            
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-            if 'preprocessed_path' in locals() and os.path.exists(preprocessed_path):
-                os.unlink(preprocessed_path)
                 
     except Exception as e:
-        print(f"Fast video processing error: {e}")
+        metrics.UPLOAD_JOBS.labels(endpoint="upload-video-fast", status="error").inc()
+        logger.exception("Fast video processing error")
         raise HTTPException(status_code=500, detail=f"Fast video processing failed: {str(e)}")
 
+# Resumable chunked uploads (see uploads.py)
+upload_store = uploads.UploadStore()
+
+# Analysing a streamable upload while it arrives needs PyAV (it decodes from a file
+# object) and the model in this process: an inference server runs only
+# BRAWLR_INFERENCE_VIDEO_JOBS video jobs at once, and one waiting on upload bytes
+# would hold up every other upload on it
+STREAMING_UPLOADS = video_io.av is not None and not inference_addresses()
+
+# Longest GET /uploads/{id}?wait=... may block, in seconds
+MAX_RESULT_WAIT = 60.0
+
+# Resumable upload analyses run at once in this web worker (each also runs the pipeline's
+# stage threads); more wait their turn instead of piling up threads
+UPLOAD_ANALYSES = int(os.getenv("BRAWLR_UPLOAD_ANALYSES", "2"))
+_upload_analyses = ThreadPoolExecutor(max_workers=max(1, UPLOAD_ANALYSES), thread_name_prefix="brawlr-upload-analysis")
+
+class UploadCreateRequest(BaseModel):
+    filename: str
+    size: int
+    contentType: str
+    username: Optional[str] = None
+    preset: Optional[str] = None
+
+@app.post("/uploads", status_code=201)
+async def create_upload(body: UploadCreateRequest):
+    """
+    Start a resumable upload. Send the file with PUT /uploads/{uploadId}
+    in chunks of about chunkSize bytes, each with an Upload-Offset header
+    """
+    if body.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large (max 100MB)")
+    if body.size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if not body.contentType.startswith('video/'):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    preset = _get_preset(body.preset)
+
+    meta = upload_store.create(body.filename, body.size, body.contentType, body.username, preset.name)
+    logger.info("Upload started", extra={"upload_id": meta["id"], "upload_filename": body.filename, "size": body.size})
+    return {"uploadId": meta["id"], "offset": 0, "chunkSize": uploads.CHUNK_SIZE}
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    """
+    Append a chunk. Upload-Offset must equal the bytes the server has;
+    otherwise 409 with the current offset, so the client can resume from it
+    """
+    try:
+        offset = int(request.headers["upload-offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Offset header required")
+
+    try:
+        async with upload_guard.upload_slot():
+            meta = await upload_store.append(upload_id, offset, request.stream())
+    except upload_guard.UploadBusy as e:
+        metrics.UPLOADS_REJECTED.labels(reason="busy").inc()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except uploads.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except uploads.OffsetMismatch as e:
+        metrics.UPLOAD_CHUNKS.labels(status="conflict").inc()
+        return JSONResponse(status_code=409, content={"detail": "Offset mismatch", "offset": e.offset})
+    except ValueError as e:
+        metrics.UPLOAD_CHUNKS.labels(status="error").inc()
+        raise HTTPException(status_code=413, detail=f"Chunk runs past the end of the upload ({e})")
+    except ClientDisconnect:
+        # The bytes that arrived are kept; the client resumes from GET /uploads/{id}
+        metrics.UPLOAD_CHUNKS.labels(status="error").inc()
+        logger.info("Upload chunk interrupted", extra={"upload_id": upload_id})
+        return Response(status_code=400)
+    metrics.UPLOAD_CHUNKS.labels(status="ok").inc()
+
+    complete = meta["offset"] >= meta["size"]
+    streaming = STREAMING_UPLOADS and uploads.streamable(meta["container"])
+    if (complete or streaming) and upload_store.claim(upload_id):
+        _start_upload_analysis(meta, streaming, asyncio.get_running_loop())
+    return {"uploadId": upload_id, "offset": meta["offset"], "complete": complete, "container": meta["container"]}
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str, wait: float = 0):
+    """
+    Offset (to resume from), state (receiving, processing, done, failed)
+    and, once done, the result. wait=N holds the request up to N seconds
+    for the result
+    """
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_RESULT_WAIT)
+    while True:
+        try:
+            status = upload_store.status(upload_id)
+        except uploads.UploadNotFound:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if status["state"] in (uploads.DONE, uploads.FAILED) or time.monotonic() >= deadline:
+            return status
+        await asyncio.sleep(0.25)
+
+def _start_upload_analysis(meta, streaming, loop):
+    # On the bounded analysis pool (with this request's context for log correlation): analysis
+    # can take longer than the request, and a streaming one waits for the rest of the upload
+    context = contextvars.copy_context()
+    _upload_analyses.submit(context.run, _analyze_upload, meta, streaming, loop)
+
+def _analyze_upload(meta, streaming, loop):
+    upload_id = meta["id"]
+    data_path = str(upload_store.data_path(upload_id))
+    logger.info("Analysing upload", extra={"upload_id": upload_id, "container": meta["container"], "streaming": streaming,
+                                           "preset": meta["preset"]})
+    try:
+        preset = presets.get_preset(meta["preset"])
+        if streaming:
+            # Decoded as the chunks arrive, resized in the pipeline instead of by preprocess_video
+            analysis = yolo_processor.process_video(data_path, frame_size=preset.preprocess_resolution,
+                                                    expected_size=meta["size"], **preset.process_options())
+        else:
+            with scratch.space.file(".mp4", size_hint=meta["size"]) as preprocessed:
+                with profiling.stage("preprocess", metrics.UPLOAD_STAGE_SECONDS.labels(stage="preprocess")):
+                    preprocessed_path = preprocess_video(data_path, max_resolution=preset.preprocess_resolution,
+                                                         output_path=preprocessed.path)
+                analysis = yolo_processor.process_video(preprocessed_path, **preset.process_options())
+
+        punch_counts = analysis["punchCounts"]
+        total_score = punch_counts.get("total", 0)
+        save_result = None
+        if meta["username"] and total_score > 0:
+            logger.info("Saving score", extra={"username": meta["username"], "score": total_score})
+            save_result = asyncio.run_coroutine_threadsafe(save_or_update_score(meta["username"], total_score), loop).result()
+
+        upload_store.finish(upload_id, {
+            "success": True,
+            "filename": meta["filename"],
+            "videoType": analysis["videoType"],
+            "punchCounts": punch_counts,
+            "processingMode": "streaming" if streaming else preset.name,
+            "preset": preset.name,
+            "scoreSaved": save_result,
+        })
+        metrics.UPLOAD_JOBS.labels(endpoint="uploads", status="ok").inc()
+    except video_io.UploadStalled as e:
+        # The client paused (uploads are kept for BRAWLR_UPLOAD_TTL): keep the bytes and go back to
+        # receiving, so its next chunk starts the analysis again
+        metrics.UPLOAD_JOBS.labels(endpoint="uploads", status="stalled").inc()
+        logger.info("Upload stalled, analysis restarts with the next chunk",
+                    extra={"upload_id": upload_id, "offset": e.position})
+        upload_store.release(upload_id)
+        # A chunk that arrived while this analysis was giving up found the upload still claimed
+        if upload_store.offset(upload_id) > e.position and upload_store.claim(upload_id):
+            _start_upload_analysis(meta, streaming, loop)
+        return
+    except Exception as e:
+        metrics.UPLOAD_JOBS.labels(endpoint="uploads", status="error").inc()
+        logger.exception("Upload processing error", extra={"upload_id": upload_id})
+        upload_store.fail(upload_id, f"Video processing failed: {str(e)}")
+    upload_store.discard_data(upload_id)
+
 # Save score endpoint
 class SaveScoreRequest(BaseModel):
     username: str
@@ -211,7 +567,7 @@ async def save_score(request: SaveScoreRequest):
         if request.score < 0:
             raise HTTPException(status_code=400, detail="Score must be non-negative")
         
-        print(f"Saving score for user: {request.username} with score: {request.score}")
+        logger.info("Saving score", extra={"username": request.username, "score": request.score})
         result = await save_or_update_score(request.username.strip(), request.score)
         
         return {
@@ -222,6 +578,5 @@ async def save_score(request: SaveScoreRequest):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error saving score: {e}")
-        traceback.print_exc()
+        logger.exception("Error saving score")
         raise HTTPException(status_code=500, detail=f"Failed to save score: {str(e)}")
\ No newline at end of file
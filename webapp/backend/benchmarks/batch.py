@@ -0,0 +1,120 @@
+"""
+Upload throughput by inference batch size
+
+Runs process_video on each clip once per batch size (motion gate off, so
+every frame goes to YOLO). It reports frames per second, the speedup over
+batch=1, and whether the punch counts match batch=1. Runs on the CPU
+unless --device cuda is given.
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.batch
+    python -m webapp.backend.benchmarks.batch --batch-sizes 1 4 8 16 --clips ~/brawlr-clips
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from ..motion import MotionGate
+from ..pipeline import fit_batch_size
+from ..utils import preprocess_video
+from .fixtures import clip_info, recorded_clips, synthetic_clip_path
+from .frame import parse_size
+from .results import default_output, write_results
+
+
+def bench_clip(processor, clip, batch_sizes, frame_skip, max_resolution):
+    """
+    Returns:
+        list[dict]: One row per batch size
+    """
+    info = clip_info(clip)
+    preprocessed = preprocess_video(str(clip), max_resolution=max_resolution)
+    try:
+        rows = []
+        baseline = None
+        for batch_size in batch_sizes:
+            start = time.perf_counter()
+            counts = processor.process_video(preprocessed, frame_skip=frame_skip, max_resolution=max_resolution,
+                                             motion_gate=MotionGate("upload", enabled=False),
+                                             batch_size=batch_size)["punchCounts"]
+            seconds = time.perf_counter() - start
+            row = {
+                "batch_size": batch_size,
+                "frames": info["frames"],
+                "process_s": round(seconds, 3),
+                "frames_per_s": round(info["frames"] / seconds, 2) if seconds else None,
+                "punch_counts": counts,
+            }
+            if baseline is None:
+                baseline = row
+            row["speedup"] = round(baseline["process_s"] / seconds, 2) if seconds else None
+            row["counts_match"] = counts == baseline["punch_counts"]
+            rows.append(row)
+        return rows
+    finally:
+        if preprocessed != str(clip) and os.path.exists(preprocessed):
+            os.unlink(preprocessed)
+
+
+def run(batch_sizes, sizes, durations, clips=(), fps=30, max_resolution=640, frame_skip=3, device="cpu", cache_dir=None):
+    """
+    Returns:
+        (list[dict], device)
+    """
+    from ..models import YOLOProcessor
+
+    processor = YOLOProcessor(gate_model_path=None)
+    if processor.model is None:
+        raise SystemExit("YOLO model not loaded")
+    if device != processor.device:
+        processor.model.to(device)
+        processor.device = device
+    print(f"Memory-capped batch size for BRAWLR_UPLOAD_BATCH on {device}: "
+          f"{fit_batch_size(max(batch_sizes), device, max_resolution)} (of {max(batch_sizes)} requested)")
+
+    cases = [
+        (f"synthetic_{width}x{height}_{duration:g}s", synthetic_clip_path(cache_dir, duration, fps=fps, width=width, height=height))
+        for width, height in sizes
+        for duration in durations
+    ]
+    cases += [(f"recorded_{clip.stem}", clip) for clip in clips]
+
+    results = []
+    for case, clip in cases:
+        for row in bench_clip(processor, clip, batch_sizes, frame_skip, max_resolution):
+            results.append({"case": case, **row})
+            print(f"{case:<36} batch {row['batch_size']:>3}  {row['frames_per_s']:>7.1f} fps  "
+                  f"{row['speedup']:>5.2f}x  counts {'match' if row['counts_match'] else 'DIFFER'}")
+    return results, device
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="process_video throughput by inference batch size")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16], help="First one is the baseline")
+    parser.add_argument("--sizes", nargs="+", default=["640x360"], help="Synthetic clip sizes, WIDTHxHEIGHT")
+    parser.add_argument("--durations", type=float, nargs="+", default=[10], help="Synthetic clip durations in seconds")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--clips", default=os.getenv("BRAWLR_BENCH_CLIPS"), help="Directory of recorded clips")
+    parser.add_argument("--max-resolution", type=int, default=640)
+    parser.add_argument("--frame-skip", type=int, default=3)
+    parser.add_argument("--device", default="cpu", choices=["cpu", "cuda"])
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "brawlr-bench"),
+                        help="Where generated clips are cached")
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/batch.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [parse_size(size) for size in args.sizes]
+    results, device = run(args.batch_sizes, sizes, args.durations, recorded_clips(args.clips), args.fps,
+                          args.max_resolution, args.frame_skip, args.device, args.cache_dir)
+    params = {key: getattr(args, key) for key in ("batch_sizes", "sizes", "durations", "fps", "clips",
+                                                  "max_resolution", "frame_skip")}
+    write_results(args.json or default_output("batch"), "batch", results, params, device)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Cascade report: throughput and punch-count accuracy vs the single-model path
+
+Runs process_video on each clip with the full model only, then once per
+gate threshold with the cascade on. For each threshold it reports the
+speedup, the share of frames passed to the full model, and the per-type
+count error against the single-model counts. The motion gate is off in
+every run, so only the cascade is measured.
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.cascade --gate-model models/gate_n_cls.pt --clips ~/brawlr-clips
+    python -m webapp.backend.benchmarks.cascade --gate-model models/gate_n_cls.pt --thresholds 0.05 0.1 0.2 0.4
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from ..cascade import GATE_IMGSZ, GATE_MODEL, CascadeGate
+from ..clustering import PUNCH_TYPES
+from ..motion import MotionGate
+from ..utils import preprocess_video
+from .fixtures import clip_info, recorded_clips, synthetic_clip_path
+from .frame import parse_size
+from .results import default_output, write_results
+
+
+def timed_counts(processor, video_path, frame_skip, max_resolution):
+    start = time.perf_counter()
+    counts = processor.process_video(video_path, frame_skip=frame_skip, max_resolution=max_resolution,
+                                     motion_gate=MotionGate("upload", enabled=False))["punchCounts"]
+    return counts, time.perf_counter() - start
+
+
+def bench_clip(processor, gate, clip, thresholds, frame_skip, max_resolution):
+    """
+    Single-model run plus one cascade run per threshold on one clip
+
+    Returns:
+        list[dict]: One row per threshold
+    """
+    info = clip_info(clip)
+    preprocessed = preprocess_video(str(clip), max_resolution=max_resolution)
+    try:
+        processor.cascade = None
+        baseline, baseline_s = timed_counts(processor, preprocessed, frame_skip, max_resolution)
+
+        rows = []
+        processor.cascade = gate
+        for threshold in thresholds:
+            gate.threshold = threshold
+            gate.passed = gate.rejected = 0
+            counts, process_s = timed_counts(processor, preprocessed, frame_skip, max_resolution)
+            scored = gate.passed + gate.rejected
+            errors = {key: counts[key] - baseline[key] for key in PUNCH_TYPES + ["total"]}
+            rows.append({
+                "frames": info["frames"],
+                "duration_s": info["duration_s"],
+                "threshold": threshold,
+                "single_process_s": round(baseline_s, 3),
+                "cascade_process_s": round(process_s, 3),
+                "speedup": round(baseline_s / process_s, 2) if process_s else None,
+                "single_frames_per_s": round(info["frames"] / baseline_s, 2) if baseline_s else None,
+                "cascade_frames_per_s": round(info["frames"] / process_s, 2) if process_s else None,
+                "pass_rate": round(gate.passed / scored, 4) if scored else None,
+                "single_counts": baseline,
+                "cascade_counts": counts,
+                "count_error": errors,
+                "total_abs_error": sum(abs(errors[key]) for key in PUNCH_TYPES),
+            })
+        return rows
+    finally:
+        if preprocessed != str(clip) and os.path.exists(preprocessed):
+            os.unlink(preprocessed)
+
+
+def run(gate_model, thresholds, sizes, durations, clips=(), fps=30, max_resolution=640, frame_skip=3,
+        gate_imgsz=GATE_IMGSZ, cache_dir=None):
+    """
+    Returns:
+        (list[dict], device)
+    """
+    from ..models import YOLOProcessor
+
+    processor = YOLOProcessor(gate_model_path=None)
+    if processor.model is None:
+        raise SystemExit("YOLO model not loaded")
+    gate = CascadeGate(gate_model, threshold=thresholds[0], imgsz=gate_imgsz, device=processor.device)
+
+    cases = [
+        (f"synthetic_{width}x{height}_{duration:g}s", synthetic_clip_path(cache_dir, duration, fps=fps, width=width, height=height))
+        for width, height in sizes
+        for duration in durations
+    ]
+    cases += [(f"recorded_{clip.stem}", clip) for clip in clips]
+
+    results = []
+    for case, clip in cases:
+        for row in bench_clip(processor, gate, clip, thresholds, frame_skip, max_resolution):
+            results.append({"case": case, **row})
+            print(f"{case:<36} threshold {row['threshold']:<5g} pass {row['pass_rate'] or 0:>6.1%}  "
+                  f"speedup {row['speedup']:>5.2f}x  count error {row['total_abs_error']}")
+    return results, processor.device
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cascade (gate + full model) vs single-model throughput and count accuracy")
+    parser.add_argument("--gate-model", default=GATE_MODEL, help="Gate model (default: BRAWLR_GATE_MODEL)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.4], help="Gate thresholds to try")
+    parser.add_argument("--gate-imgsz", type=int, default=GATE_IMGSZ)
+    parser.add_argument("--sizes", nargs="+", default=["640x360"], help="Synthetic clip sizes, WIDTHxHEIGHT")
+    parser.add_argument("--durations", type=float, nargs="+", default=[10], help="Synthetic clip durations in seconds")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--clips", default=os.getenv("BRAWLR_BENCH_CLIPS"), help="Directory of recorded clips")
+    parser.add_argument("--max-resolution", type=int, default=640)
+    parser.add_argument("--frame-skip", type=int, default=3)
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "brawlr-bench"),
+                        help="Where generated clips are cached")
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/cascade.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not args.gate_model:
+        raise SystemExit("No gate model: pass --gate-model or set BRAWLR_GATE_MODEL")
+    sizes = [parse_size(size) for size in args.sizes]
+    results, device = run(args.gate_model, args.thresholds, sizes, args.durations, recorded_clips(args.clips), args.fps,
+                          args.max_resolution, args.frame_skip, args.gate_imgsz, args.cache_dir)
+    params = {key: getattr(args, key) for key in ("gate_model", "thresholds", "gate_imgsz", "sizes", "durations", "fps",
+                                                  "clips", "max_resolution", "frame_skip")}
+    write_results(args.json or default_output("cascade"), "cascade", results, params, device)
+
+
+if __name__ == "__main__":
+    main()
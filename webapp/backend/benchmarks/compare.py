@@ -0,0 +1,93 @@
+"""
+Compare two benchmark result files and flag regressions
+
+Matches results by "case" and compares every timing/throughput field they
+share. Lower is better for *_ms / *_s fields, higher is better for
+frames_per_s, fps_single_stream and realtime_factor.
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.compare base/frame.json head/frame.json
+    python -m webapp.backend.benchmarks.compare base/video.json head/video.json --threshold 0.10
+
+Exits with status 1 if any metric got worse by more than --threshold.
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = {"frames_per_s", "fps_single_stream", "realtime_factor"}
+
+
+def flatten(row, prefix=""):
+    """{"stages": {"decode": {"p50_ms": 1}}} -> {"stages.decode.p50_ms": 1} (numbers only)"""
+    flat = {}
+    for key, value in row.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def is_compared(metric):
+    leaf = metric.rsplit(".", 1)[-1]
+    return leaf in HIGHER_IS_BETTER or leaf.endswith("_ms") or (leaf.endswith("_s") and leaf != "duration_s")
+
+
+def compare(base, head, threshold):
+    """
+    Returns:
+        list[dict]: One row per compared metric with base, head, relative change and verdict
+    """
+    base_rows = {row["case"]: flatten(row) for row in base["results"]}
+    rows = []
+    for head_row in head["results"]:
+        case = head_row["case"]
+        if case not in base_rows:
+            continue
+        before = base_rows[case]
+        for metric, after in flatten(head_row).items():
+            if not is_compared(metric) or metric not in before or not before[metric]:
+                continue
+            change = (after - before[metric]) / before[metric]
+            worse = -change if metric.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else change
+            verdict = "regression" if worse > threshold else "improvement" if worse < -threshold else "ok"
+            rows.append({"case": case, "metric": metric, "base": before[metric], "head": after,
+                         "change": round(change, 4), "verdict": verdict})
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base", help="Results from the baseline commit")
+    parser.add_argument("head", help="Results from the commit under test")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Relative change treated as noise (default 0.05)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    if base["benchmark"] != head["benchmark"]:
+        raise SystemExit(f"Different benchmarks: {base['benchmark']} vs {head['benchmark']}")
+
+    print(f"{base['benchmark']}: {(base['git']['sha'] or '?')[:10]} -> {(head['git']['sha'] or '?')[:10]}")
+    if base["environment"].get("device") != head["environment"].get("device"):
+        print(f"⚠️  Different devices: {base['environment'].get('device')} vs {head['environment'].get('device')}")
+
+    rows = compare(base, head, args.threshold)
+    for row in rows:
+        marker = {"regression": "❌", "improvement": "✅", "ok": "  "}[row["verdict"]]
+        print(f"{marker} {row['case']:<32} {row['metric']:<40} {row['base']:>10.3f} -> {row['head']:>10.3f} ({row['change']:+.1%})")
+
+    regressions = [row for row in rows if row["verdict"] == "regression"]
+    print(f"\n{len(rows)} metrics compared, {len(regressions)} regressions (threshold {args.threshold:.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Upload decode throughput by decoder, with and without prefetching
+
+For each clip and each decoder available on this host (see video_io), it
+reports:
+- decode_fps: frames per second, decoding only
+- serial_fps: decode, then a fixed per-frame stand-in for inference
+  (--work-ms, sleeps like a GPU/torch call that releases the GIL)
+- pipelined_fps: the same work with decoding prefetched on a thread
+  (what process_video does)
+
+"baseline" is a plain single-threaded cv2.VideoCapture, as before video_io.
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.decode
+    python -m webapp.backend.benchmarks.decode --sizes 1280x720 1920x1080 --work-ms 15 --clips ~/brawlr-clips
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import cv2  # type: ignore
+
+from .. import video_io
+from .fixtures import recorded_clips, synthetic_clip_path
+from .frame import parse_size
+from .results import default_output, write_results
+
+
+def baseline_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def open_frames(path, decoder, threads):
+    """(frames iterator, close) for a decoder name or "baseline\""""
+    if decoder == "baseline":
+        frames = baseline_frames(path)
+        return frames, frames.close
+    video = video_io.VideoReader(path, decoder=decoder, threads=threads)
+    return video.frames(), video.close
+
+
+def timed_pass(path, decoder, threads, work_s=0.0, pipelined=False, depth=video_io.DECODE_QUEUE):
+    """
+    Returns:
+        (frames, seconds)
+    """
+    frames, close = open_frames(path, decoder, threads)
+    count = 0
+    start = time.perf_counter()
+    try:
+        source = video_io.prefetch(frames, depth) if pipelined else frames
+        for _ in source:
+            if work_s:
+                time.sleep(work_s)
+            count += 1
+    finally:
+        close()
+    return count, time.perf_counter() - start
+
+
+def bench_clip(path, decoders, threads, work_ms, depth):
+    rows = []
+    for decoder in decoders:
+        frames, decode_s = timed_pass(path, decoder, threads)
+        _, serial_s = timed_pass(path, decoder, threads, work_ms / 1000)
+        _, pipelined_s = timed_pass(path, decoder, threads, work_ms / 1000, pipelined=True, depth=depth)
+        rows.append({
+            "decoder": decoder,
+            "frames": frames,
+            "decode_fps": round(frames / decode_s, 1) if decode_s else None,
+            "serial_fps": round(frames / serial_s, 1) if serial_s else None,
+            "pipelined_fps": round(frames / pipelined_s, 1) if pipelined_s else None,
+        })
+    return rows
+
+
+def run(sizes, durations, clips=(), fps=30, threads=video_io.DECODE_THREADS, work_ms=10.0,
+        depth=video_io.DECODE_QUEUE, cache_dir=None):
+    decoders = ["baseline"] + video_io.available_decoders()
+    cases = [
+        (f"synthetic_{width}x{height}_{duration:g}s", synthetic_clip_path(cache_dir, duration, fps=fps, width=width, height=height))
+        for width, height in sizes
+        for duration in durations
+    ]
+    cases += [(f"recorded_{clip.stem}", clip) for clip in clips]
+
+    results = []
+    for case, clip in cases:
+        for row in bench_clip(clip, decoders, threads, work_ms, depth):
+            results.append({"case": case, **row})
+            print(f"{case:<32} {row['decoder']:<9} decode {row['decode_fps']:>7.1f} fps  "
+                  f"serial {row['serial_fps']:>6.1f} fps  pipelined {row['pipelined_fps']:>6.1f} fps")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Video decode throughput by decoder, serial vs prefetched")
+    parser.add_argument("--sizes", nargs="+", default=["640x360", "1280x720", "1920x1080"], help="Synthetic clip sizes, WIDTHxHEIGHT")
+    parser.add_argument("--durations", type=float, nargs="+", default=[10], help="Synthetic clip durations in seconds")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--clips", default=os.getenv("BRAWLR_BENCH_CLIPS"), help="Directory of recorded clips")
+    parser.add_argument("--threads", type=int, default=video_io.DECODE_THREADS, help="Decoder threads (0 = FFmpeg's choice)")
+    parser.add_argument("--work-ms", type=float, default=10.0, help="Simulated inference time per frame")
+    parser.add_argument("--depth", type=int, default=video_io.DECODE_QUEUE, help="Prefetch queue size")
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "brawlr-bench"),
+                        help="Where generated clips are cached")
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/decode.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [parse_size(size) for size in args.sizes]
+    results = run(sizes, args.durations, recorded_clips(args.clips), args.fps, args.threads, args.work_ms,
+                  args.depth, args.cache_dir)
+    params = {key: getattr(args, key) for key in ("sizes", "durations", "fps", "clips", "threads", "work_ms", "depth")}
+    write_results(args.json or default_output("decode"), "decode", results, params)
+
+
+if __name__ == "__main__":
+    main()
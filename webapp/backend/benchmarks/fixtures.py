@@ -0,0 +1,151 @@
+import base64
+import cv2  # type: ignore
+import numpy as np
+from pathlib import Path
+
+# Extensions picked up from a recorded clips directory
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
+
+
+def make_synthetic_clip(path, duration_s=10.0, fps=30, width=1280, height=720, seed=0):
+    """
+    Write a synthetic test clip to disk
+
+    What this does:
+    - Draws a noisy background with a moving "glove" blob
+    - Encodes it with mp4v (same codec preprocess_video writes)
+    - Deterministic for a given seed so runs are comparable
+
+    Args:
+        path: Output file path (.mp4)
+        duration_s: Clip length in seconds
+        fps: Frames per second
+        width, height: Frame size in pixels
+        seed: Random seed for the background noise
+
+    Returns:
+        Path: Path to the written clip
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 80, size=(height, width, 3), dtype=np.uint8)
+
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(str(path), fourcc, fps, (width, height))
+
+    total_frames = int(duration_s * fps)
+    radius = max(8, min(width, height) // 12)
+    for i in range(total_frames):
+        frame = background.copy()
+        # Blob moves left to right and "punches" forward every second
+        x = int((i * 7) % width)
+        y = height // 2 + int((height // 6) * np.sin(i / fps * 2 * np.pi))
+        punch = (i % fps) < fps // 4
+        cv2.circle(frame, (x, y), radius * (2 if punch else 1), (30, 30, 200), -1)
+        out.write(frame)
+
+    out.release()
+    return path
+
+
+def synthetic_clip_path(cache_dir, duration_s, fps=30, width=1280, height=720):
+    """
+    Return a cached synthetic clip, creating it on first use
+
+    Args:
+        cache_dir: Directory used to cache generated clips
+        duration_s, fps, width, height: Clip parameters (part of the cache key)
+
+    Returns:
+        Path: Path to the clip
+    """
+    path = Path(cache_dir) / f"synthetic_{width}x{height}_{fps}fps_{duration_s:g}s.mp4"
+    if not path.exists():
+        make_synthetic_clip(path, duration_s=duration_s, fps=fps, width=width, height=height)
+    return path
+
+
+def recorded_clips(clips_dir):
+    """
+    List recorded clips (real camera/phone videos) to benchmark against
+
+    Recorded clips are not committed; point --clips (or BRAWLR_BENCH_CLIPS)
+    at a local folder of videos.
+
+    Args:
+        clips_dir: Directory to scan (None returns an empty list)
+
+    Returns:
+        list[Path]: Video files sorted by name
+    """
+    if not clips_dir:
+        return []
+    clips_dir = Path(clips_dir)
+    if not clips_dir.is_dir():
+        raise FileNotFoundError(f"Recorded clips directory not found: {clips_dir}")
+    return sorted(p for p in clips_dir.iterdir() if p.suffix.lower() in VIDEO_EXTENSIONS)
+
+
+def clip_info(path):
+    """
+    Basic properties of a clip
+
+    Returns:
+        dict: { "path", "width", "height", "fps", "frames", "duration_s" }
+    """
+    cap = cv2.VideoCapture(str(path))
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return {
+            "path": str(path),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": round(fps, 3),
+            "frames": frames,
+            "duration_s": round(frames / fps, 3) if fps else 0.0,
+        }
+    finally:
+        cap.release()
+
+
+def synthetic_frame_b64(width=640, height=480, quality=80, seed=0):
+    """
+    Build one webcam-style frame as the frontend sends it over /ws
+
+    Args:
+        width, height: Frame size in pixels
+        quality: JPEG quality (camera-feed.tsx uses 0.8)
+        seed: Random seed for the background noise
+
+    Returns:
+        str: "data:image/jpeg;base64,..." string
+    """
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(40, 80, size=(height, width, 3), dtype=np.uint8)
+    cv2.circle(frame, (width // 2, height // 2), max(8, min(width, height) // 6), (30, 30, 200), -1)
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.tobytes()).decode("ascii")
+
+
+def recorded_frame_b64(clip_path, frame_index=0, quality=80):
+    """
+    Encode one frame of a recorded clip the same way synthetic_frame_b64 does
+
+    Returns:
+        str or None: data URL, or None if the frame could not be read
+    """
+    cap = cv2.VideoCapture(str(clip_path))
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        ok, frame = cap.read()
+    finally:
+        cap.release()
+    if not ok:
+        return None
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.tobytes()).decode("ascii") if ok else None
@@ -0,0 +1,114 @@
+"""
+Per-frame latency of the live camera path (/ws)
+
+Times each step a webcam frame goes through:
+    base64_to_image -> preprocess_image -> process_frame (decode + preprocess + YOLO + parse)
+
+With a model, YOLO alone is also timed on the full preprocessed frame
+(detect_full) and on the ROI crop a tracker would use for a boxer in the
+middle third of the frame (detect_roi).
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.frame
+    python -m webapp.backend.benchmarks.frame --sizes 640x480 1280x720 --iterations 200
+    python -m webapp.backend.benchmarks.frame --clips ~/brawlr-clips --json frame.json
+    python -m webapp.backend.benchmarks.frame --no-model      # decode/preprocess only
+"""
+import argparse
+import os
+
+from ..roi import RoiTracker
+from ..utils import base64_to_image, preprocess_image
+from .fixtures import recorded_clips, recorded_frame_b64, synthetic_frame_b64
+from .results import default_output, summarize_ms, time_calls, write_results
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def frame_cases(sizes, clips):
+    """(case name, width, height, data URL) for every synthetic size and recorded clip"""
+    for width, height in sizes:
+        yield f"synthetic_{width}x{height}", width, height, synthetic_frame_b64(width, height)
+    for clip in clips:
+        data_url = recorded_frame_b64(clip, frame_index=0)
+        if data_url is None:
+            print(f"⚠️  Could not read a frame from {clip}, skipping")
+            continue
+        image = base64_to_image(data_url)
+        yield f"recorded_{clip.stem}", image.shape[1], image.shape[0], data_url
+
+
+def bench_frame(data_url, processor, iterations, warmup):
+    """Latency summaries for one frame"""
+    image = base64_to_image(data_url)
+    stages = {
+        "base64_to_image": summarize_ms(time_calls(lambda: base64_to_image(data_url), iterations, warmup)),
+        "preprocess_image": summarize_ms(time_calls(lambda: preprocess_image(image), iterations, warmup)),
+    }
+    if processor is not None:
+        stages["process_frame"] = summarize_ms(time_calls(lambda: processor.process_frame(data_url), iterations, warmup))
+        processed = preprocess_image(image)
+        height, width = processed.shape[:2]
+        tracker = RoiTracker(enabled=True)
+        tracker.update((width / 3, height / 3, 2 * width / 3, 2 * height / 3))
+        region, _, imgsz = tracker.crop(processed)
+        stages["detect_full"] = summarize_ms(time_calls(lambda: processor.detect(processed), iterations, warmup))
+        stages["detect_roi"] = summarize_ms(time_calls(lambda: processor.detect(region, imgsz), iterations, warmup))
+    return stages
+
+
+def run(sizes, clips=(), iterations=100, warmup=10, use_model=True):
+    """
+    Run the frame benchmark
+
+    Returns:
+        (list[dict], device): One result per case, and the inference device (None without a model)
+    """
+    processor = None
+    if use_model:
+        from ..models import YOLOProcessor
+
+        processor = YOLOProcessor()
+        if processor.model is None:
+            raise SystemExit("YOLO model not loaded (use --no-model to time decode/preprocess only)")
+
+    results = []
+    for case, width, height, data_url in frame_cases(sizes, clips):
+        stages = bench_frame(data_url, processor, iterations, warmup)
+        row = {"case": case, "width": width, "height": height, "payload_bytes": len(data_url), "stages": stages}
+        if "process_frame" in stages:
+            row["fps_single_stream"] = round(1000 / stages["process_frame"]["mean_ms"], 2)
+        results.append(row)
+
+        summary = "  ".join(f"{name} p50 {s['p50_ms']:.2f}ms p95 {s['p95_ms']:.2f}ms" for name, s in stages.items())
+        print(f"{case:<28} {summary}")
+    return results, processor.device if processor is not None else None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Per-frame latency of base64_to_image -> preprocess_image -> process_frame")
+    parser.add_argument("--sizes", nargs="+", default=["320x240", "640x480", "1280x720"],
+                        help="Synthetic frame sizes, WIDTHxHEIGHT")
+    parser.add_argument("--clips", default=os.getenv("BRAWLR_BENCH_CLIPS"),
+                        help="Directory of recorded clips (first frame of each is benchmarked)")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--no-model", action="store_true", help="Skip process_frame (no YOLO model needed)")
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/frame.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [parse_size(size) for size in args.sizes]
+    results, device = run(sizes, recorded_clips(args.clips), args.iterations, args.warmup, not args.no_model)
+    params = {"sizes": args.sizes, "clips": args.clips, "iterations": args.iterations,
+              "warmup": args.warmup, "model": not args.no_model}
+    write_results(args.json or default_output("frame"), "frame", results, params, device)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Cost of handing a decoded frame to an inference server and getting the result back
+
+Compares the two paths RemoteYOLOProcessor can take, against a server whose
+"model" does nothing, so only the IPC is measured:
+    inline - the ndarray is pickled over the socket (what a multiprocessing queue does)
+    ring   - the pixels are copied into a FrameRing slot, only the slot index is sent
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.handoff
+    python -m webapp.backend.benchmarks.handoff --sizes 640x480 640x640 --iterations 2000 --json handoff.json
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .frame import parse_size
+from .results import default_output, summarize_ms, time_calls, write_results
+
+
+class NullProcessor:
+    """Stands in for YOLOProcessor: no model, no result"""
+
+    model = "null"
+    model_path = "null"
+    device = "cpu"
+
+    def detect(self, image, imgsz=None):
+        return None, None
+
+
+def serve_null(address, key):
+    os.environ["BRAWLR_INFERENCE_AUTHKEY"] = key
+    from ..inference_server import InferenceServer
+
+    InferenceServer(address, NullProcessor()).serve_forever()
+
+
+def run(sizes, iterations=1000, warmup=50):
+    from ..inference_client import RemoteYOLOProcessor
+
+    address = str(Path(tempfile.mkdtemp()) / "handoff.sock")
+    server = multiprocessing.Process(target=serve_null, args=(address, os.environ["BRAWLR_INFERENCE_AUTHKEY"]), daemon=True)
+    server.start()
+    while not os.path.exists(address):
+        time.sleep(0.05)
+
+    client = RemoteYOLOProcessor([address])
+    results = []
+    try:
+        for width, height in sizes:
+            image = np.random.default_rng(0).integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+            inline = summarize_ms(time_calls(lambda: client._call("frame_inline", image, None, timeout=10), iterations, warmup))
+            ring = summarize_ms(time_calls(lambda: client.process_image(image), iterations, warmup))
+            results.append({"case": f"{width}x{height}", "frame_bytes": image.nbytes, "inline": inline, "ring": ring})
+            print(f"{width}x{height:<6} inline p50 {inline['p50_ms']:.3f}ms p99 {inline['p99_ms']:.3f}ms   "
+                  f"ring p50 {ring['p50_ms']:.3f}ms p99 {ring['p99_ms']:.3f}ms")
+    finally:
+        client.close()
+        server.terminate()
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Frame handoff cost: pickled ndarray vs shared-memory ring slot")
+    parser.add_argument("--sizes", nargs="+", default=["320x240", "640x480", "640x640"], help="Frame sizes, WIDTHxHEIGHT")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/handoff.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("BRAWLR_INFERENCE_AUTHKEY", secrets.token_hex(16))
+    results = run([parse_size(size) for size in args.sizes], args.iterations, args.warmup)
+    params = {"sizes": args.sizes, "iterations": args.iterations, "warmup": args.warmup}
+    write_results(args.json or default_output("handoff"), "handoff", results, params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+WebSocket load generator for /ws
+
+Opens N concurrent connections that behave like camera-feed.tsx: each one
+sends {"type": "frame", "image": <JPEG data URL>, "timestamp": ...} at a
+fixed fps and reads the punch/no_punch replies. Frames come from a recorded
+session (a folder of JPEGs) or from a seeded synthetic session, so runs are
+reproducible.
+
+Each frame also carries a "seq" number that the server echoes, which gives
+exact end-to-end latency per frame (send -> reply). Server CPU is read from
+/metrics before and after each run.
+
+Usage (from repo root, backend running on :8000):
+    # Turn a recorded camera clip into a replayable session
+    python -m webapp.backend.benchmarks.loadgen record my_session.mp4 sessions/jab_drill
+
+    # Sweep 1, 2, 4 and 8 clients at the frontend's 10 fps for 30 s each
+    python -m webapp.backend.benchmarks.loadgen run --clients 1 2 4 8 --fps 10 --duration 30
+    python -m webapp.backend.benchmarks.loadgen run --session sessions/jab_drill --clients 4 --json load.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlparse
+
+import cv2  # type: ignore
+import numpy as np
+import websockets
+
+from .results import default_output, summarize_ms, write_results
+
+# camera-feed.tsx: setInterval(captureFrame, 100) and canvas.toBlob(..., "image/jpeg", 0.7)
+FRONTEND_FPS = 10
+FRONTEND_JPEG_QUALITY = 70
+
+
+# --------------------------
+# Sessions
+# --------------------------
+def encode_data_url(frame, quality=FRONTEND_JPEG_QUALITY):
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.tobytes()).decode("ascii")
+
+
+def record_session(video_path, out_dir, fps=FRONTEND_FPS, width=640, quality=FRONTEND_JPEG_QUALITY, max_frames=None):
+    """
+    Convert a camera recording into a session folder of JPEG frames
+
+    What this does:
+    - Samples the video at the frontend's capture rate
+    - Resizes to the given width (webcams usually send 640x480)
+    - Encodes each frame at the frontend's JPEG quality
+    - Writes 000000.jpg, 000001.jpg, ... plus session.json
+
+    Returns:
+        int: Number of frames written
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cap = cv2.VideoCapture(str(video_path))
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or fps
+    step = max(1.0, source_fps / fps)
+
+    written = 0
+    next_index = 0.0
+    index = 0
+    while max_frames is None or written < max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if index >= next_index:
+            height = int(frame.shape[0] * width / frame.shape[1])
+            frame = cv2.resize(frame, (width, height))
+            cv2.imwrite(str(out_dir / f"{written:06d}.jpg"), frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            written += 1
+            next_index += step
+        index += 1
+    cap.release()
+
+    with open(out_dir / "session.json", "w", encoding="utf-8") as f:
+        json.dump({"source": str(video_path), "fps": fps, "width": width, "quality": quality, "frames": written}, f, indent=2)
+    return written
+
+
+def load_session(session_dir):
+    """Data URLs for every JPEG in a session folder, in order"""
+    paths = sorted(Path(session_dir).glob("*.jpg"))
+    if not paths:
+        raise FileNotFoundError(f"No .jpg frames in {session_dir}")
+    return ["data:image/jpeg;base64," + base64.b64encode(p.read_bytes()).decode("ascii") for p in paths]
+
+
+def synthetic_session(frames=100, width=640, height=480, seed=0, quality=FRONTEND_JPEG_QUALITY):
+    """Seeded stand-in for a camera session: noisy background with a moving blob"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 80, size=(height, width, 3), dtype=np.uint8)
+    radius = min(width, height) // 10
+    session = []
+    for i in range(frames):
+        frame = background.copy()
+        x = int(width * (0.2 + 0.6 * (i % 20) / 20))
+        cv2.circle(frame, (x, height // 2), radius * (2 if i % 10 < 3 else 1), (30, 30, 200), -1)
+        session.append(encode_data_url(frame, quality))
+    return session
+
+
+# --------------------------
+# Server metrics
+# --------------------------
+def scrape_metrics(metrics_url):
+    """
+    Read the counters the report needs from /metrics
+
+    Returns:
+        dict or None: cpu_seconds, frames_dropped, frames_in (None if /metrics is unreachable)
+    """
+    try:
+        with urllib.request.urlopen(metrics_url, timeout=5) as response:
+            text = response.read().decode("utf-8")
+    except (urllib.error.URLError, OSError):
+        return None
+
+    values = {"cpu_seconds": 0.0, "frames_dropped": 0.0, "frames_in": 0.0}
+    names = {
+        "process_cpu_seconds_total": "cpu_seconds",
+        "brawlr_ws_frames_dropped_total": "frames_dropped",
+        "brawlr_ws_frames_received_total": "frames_in",
+    }
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_part, _, value = line.rpartition(" ")
+        key = names.get(name_part.split("{", 1)[0])
+        if key:
+            values[key] += float(value)
+    return values
+
+
+def default_metrics_url(ws_url):
+    parsed = urlparse(ws_url)
+    scheme = "https" if parsed.scheme == "wss" else "http"
+    return f"{scheme}://{parsed.netloc}/metrics"
+
+
+# --------------------------
+# Clients
+# --------------------------
+class ClientStats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.late_sends = 0
+        self.latencies = []
+        self.punches = 0
+        self.refused = False
+        self.config_changes = 0
+        self.error = None
+
+
+async def run_client(client_id, url, session, fps, duration, start_delay, drain, follow_config=False):
+    """
+    One simulated camera-feed.tsx client
+
+    What this does:
+    - Sends frames on a fixed schedule (like setInterval), starting at a
+      per-client offset into the session so clients don't send identical frames
+    - Matches replies to frames by the echoed seq and records latency
+    - With follow_config, changes its send rate when the server sends a
+      {"type": "config"} message, like the frontend does
+    - After the run, waits up to `drain` seconds for outstanding replies;
+      anything still unanswered counts as dropped
+    """
+    stats = ClientStats()
+    pending = {}
+    schedule = {"interval": 1.0 / fps}
+    offset = (client_id * 7) % len(session)
+
+    await asyncio.sleep(start_delay)
+    try:
+        async with websockets.connect(url, max_size=None, ping_interval=None) as ws:
+            async def receive():
+                try:
+                    async for raw in ws:
+                        handle_reply(json.loads(raw))
+                except websockets.exceptions.ConnectionClosed as e:
+                    stats.error = repr(e)
+
+            def handle_reply(reply):
+                if reply.get("type") == "error" and reply.get("code") == "capacity":
+                    stats.refused = True
+                    return
+                if reply.get("type") == "config":
+                    stats.config_changes += 1
+                    if follow_config:
+                        schedule["interval"] = 1.0 / reply["fps"]
+                    return
+                sent_at = pending.pop(reply.get("seq"), None)
+                if sent_at is None:
+                    return
+                stats.received += 1
+                stats.latencies.append(time.perf_counter() - sent_at)
+                if reply.get("type") == "punch":
+                    stats.punches += 1
+
+            receiver = asyncio.create_task(receive())
+            end = time.perf_counter() + duration
+            next_at = time.perf_counter()
+            seq = 0
+            while next_at < end:
+                if receiver.done():
+                    break  # server closed the connection (e.g. refused at capacity)
+                # Absolute schedule: a slow send doesn't push later frames back
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -schedule["interval"]:
+                    stats.late_sends += 1
+                next_at += schedule["interval"]
+                pending[seq] = time.perf_counter()
+                await ws.send(json.dumps({
+                    "type": "frame",
+                    "image": session[(offset + seq) % len(session)],
+                    "timestamp": int(time.time() * 1000),
+                    "seq": seq,
+                }))
+                stats.sent += 1
+                seq += 1
+
+            deadline = time.perf_counter() + drain
+            while pending and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            receiver.cancel()
+    except (OSError, websockets.exceptions.WebSocketException) as e:
+        stats.error = repr(e)
+    return stats
+
+
+async def run_level(url, session, clients, fps, duration, ramp, drain, follow_config):
+    # Clients start evenly spread over the ramp, the same way on every run
+    tasks = [
+        run_client(i, url, session, fps, duration, ramp * i / max(1, clients), drain, follow_config)
+        for i in range(clients)
+    ]
+    return await asyncio.gather(*tasks)
+
+
+def run(url, session, levels, fps=FRONTEND_FPS, duration=30.0, ramp=1.0, drain=5.0, metrics_url=None,
+        follow_config=False):
+    """
+    Run one load level per entry in `levels` (number of concurrent clients)
+
+    Returns:
+        list[dict]: One result per level
+    """
+    metrics_url = metrics_url or default_metrics_url(url)
+    results = []
+    for clients in levels:
+        before = scrape_metrics(metrics_url)
+        wall_start = time.perf_counter()
+        stats = asyncio.run(run_level(url, session, clients, fps, duration, ramp, drain, follow_config))
+        wall = time.perf_counter() - wall_start
+        after = scrape_metrics(metrics_url)
+
+        sent = sum(s.sent for s in stats)
+        received = sum(s.received for s in stats)
+        latencies = [latency for s in stats for latency in s.latencies]
+        errors = [s.error for s in stats if s.error and not s.refused]
+        row = {
+            "case": f"clients_{clients}",
+            "clients": clients,
+            "target_fps": fps,
+            "duration_s": duration,
+            "frames_sent": sent,
+            "frames_answered": received,
+            "drop_rate": round(1 - received / sent, 4) if sent else None,
+            "late_send_rate": round(sum(s.late_sends for s in stats) / sent, 4) if sent else None,
+            "answered_fps_per_client": round(received / duration / clients, 2),
+            "punch_replies": sum(s.punches for s in stats),
+            "refused_clients": sum(1 for s in stats if s.refused),
+            "config_messages": sum(s.config_changes for s in stats),
+            "latency": summarize_ms(latencies),
+            "client_errors": errors,
+        }
+        if before and after:
+            cpu = after["cpu_seconds"] - before["cpu_seconds"]
+            row["server"] = {
+                "cpu_seconds": round(cpu, 3),
+                "cpu_cores": round(cpu / wall, 3),
+                "cpu_cores_per_client": round(cpu / wall / clients, 4),
+                "frames_dropped": after["frames_dropped"] - before["frames_dropped"],
+                "frames_received": after["frames_in"] - before["frames_in"],
+            }
+        results.append(row)
+
+        latency = row["latency"]
+        server = row.get("server", {})
+        print(f"{clients:>4} clients  answered {row['answered_fps_per_client']:>5.1f}/{fps} fps  "
+              f"drop {row['drop_rate']:.1%}  p50 {latency.get('p50_ms', 0):>7.1f}ms  p95 {latency.get('p95_ms', 0):>7.1f}ms  "
+              f"p99 {latency.get('p99_ms', 0):>7.1f}ms  server cpu/client {server.get('cpu_cores_per_client', float('nan')):.3f} cores"
+              + (f"  ⚠️ {row['refused_clients']} refused" if row["refused_clients"] else "")
+              + (f"  ⚠️ {len(errors)} client errors" if errors else ""))
+    return results
+
+
+# --------------------------
+# CLI
+# --------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay camera sessions against /ws with N concurrent clients")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="Turn a camera recording into a session folder")
+    record.add_argument("video", help="Input video")
+    record.add_argument("out_dir", help="Session folder to write")
+    record.add_argument("--fps", type=float, default=FRONTEND_FPS)
+    record.add_argument("--width", type=int, default=640)
+    record.add_argument("--quality", type=int, default=FRONTEND_JPEG_QUALITY)
+    record.add_argument("--max-frames", type=int, default=None)
+
+    load = sub.add_parser("run", help="Run the load test")
+    load.add_argument("--url", default="ws://localhost:8000/ws")
+    load.add_argument("--metrics-url", default=None, help="Default: /metrics on the same host")
+    load.add_argument("--session", default=None, help="Session folder (default: seeded synthetic session)")
+    load.add_argument("--seed", type=int, default=0, help="Seed for the synthetic session")
+    load.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels to run")
+    load.add_argument("--fps", type=float, default=FRONTEND_FPS, help="Frames per second per client")
+    load.add_argument("--duration", type=float, default=30.0, help="Seconds of sending per level")
+    load.add_argument("--ramp", type=float, default=1.0, help="Seconds over which clients connect")
+    load.add_argument("--drain", type=float, default=5.0, help="Seconds to wait for late replies")
+    load.add_argument("--follow-config", action="store_true",
+                      help="Adapt the send rate to the server's config messages, like camera-feed.tsx")
+    load.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/loadgen.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "record":
+        frames = record_session(args.video, args.out_dir, args.fps, args.width, args.quality, args.max_frames)
+        print(f"Wrote {frames} frames to {args.out_dir}")
+        return
+
+    session = load_session(args.session) if args.session else synthetic_session(seed=args.seed)
+    results = run(args.url, session, args.clients, args.fps, args.duration, args.ramp, args.drain, args.metrics_url,
+                  args.follow_config)
+    params = {key: getattr(args, key) for key in ("url", "session", "seed", "clients", "fps", "duration", "ramp", "drain",
+                                                  "follow_config")}
+    params["session_frames"] = len(session)
+    write_results(args.json or default_output("loadgen"), "loadgen", results, params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Peak memory benchmark for YOLOProcessor.process_video
+
+Runs each (mode, duration) pair in a fresh child process and reports its peak RSS,
+so "buffered" (old behaviour: predict() without stream=True, every Results object
+kept until the end) can be compared against "streamed" (current process_video).
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.memory --durations 10 30 60 120
+    python -m webapp.backend.benchmarks.memory --durations 30 60 --json memory.json
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .fixtures import synthetic_clip_path
+from .results import write_results
+
+MODES = ["buffered", "streamed"]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def run_child(mode, video_path, max_resolution):
+    """Run one measurement inside this (child) process and print a JSON line"""
+    from ..models import YOLOProcessor
+
+    processor = YOLOProcessor()
+    if processor.model is None:
+        raise SystemExit("YOLO model not loaded")
+    rss_after_load = peak_rss_mb()
+
+    start = time.perf_counter()
+    if mode == "buffered":
+        # What process_video did before streaming: the whole list of Results is alive at once
+        results = processor.model.predict(
+            source=str(video_path),
+            conf=processor.confidence_threshold,
+            verbose=False,
+            save=False,
+            imgsz=max_resolution,
+            device=processor.device,
+        )
+        frames = len([processor._first_punch_type(result) for result in results])
+    else:
+        frames = sum(1 for _ in processor.iter_frame_punches(str(video_path), max_resolution=max_resolution))
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": mode,
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "rss_after_load_mb": round(rss_after_load, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def measure(mode, video_path, max_resolution):
+    """Spawn a child process for one measurement and return its result dict"""
+    cmd = [
+        sys.executable, "-m", "webapp.backend.benchmarks.memory",
+        "--child", mode, "--video", str(video_path), "--max-resolution", str(max_resolution),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{proc.stderr}")
+    # The child also prints model loading messages; the result is the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Peak RSS of process_video vs. video duration")
+    parser.add_argument("--durations", type=float, nargs="+", default=[10, 30, 60],
+                        help="Synthetic clip durations in seconds")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--max-resolution", type=int, default=640)
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "brawlr-bench"),
+                        help="Where generated clips are cached")
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    # Internal: run a single measurement in this process
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--video", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.child:
+        run_child(args.child, args.video, args.max_resolution)
+        return
+
+    rows = []
+    for duration in args.durations:
+        clip = synthetic_clip_path(args.cache_dir, duration, fps=args.fps, width=args.width, height=args.height)
+        for mode in args.modes:
+            result = measure(mode, clip, args.max_resolution)
+            result["case"] = f"{mode}_{duration:g}s"
+            result["duration_s"] = duration
+            rows.append(result)
+            print(f"{duration:>8.0f}s  {mode:<9} peak {result['peak_rss_mb']:>8.1f} MB  "
+                  f"(after load {result['rss_after_load_mb']:.1f} MB, {result['frames']} frames, {result['seconds']:.1f}s)")
+
+    if args.json:
+        params = {key: getattr(args, key) for key in ("durations", "modes", "width", "height", "fps", "max_resolution")}
+        write_results(args.json, "memory", rows, params)
+
+
+if __name__ == "__main__":
+    main()
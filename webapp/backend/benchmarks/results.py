@@ -0,0 +1,140 @@
+"""
+Shared helpers for benchmark results
+
+Every suite writes the same JSON envelope so results from different
+commits can be diffed with benchmarks/compare.py:
+
+    {
+      "benchmark": "frame",
+      "git": { "sha": "...", "dirty": false },
+      "environment": { "python": "...", "platform": "...", "device": "cpu", ... },
+      "created_at": 1700000000.0,
+      "params": { ... },
+      "results": [ { "case": "...", <metric>: <value>, ... }, ... ]
+    }
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+
+
+def git_info():
+    """Commit sha and dirty flag of the working tree (None when git is unavailable)"""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        return {"sha": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"sha": None, "dirty": None}
+
+
+def environment_info(device=None):
+    """Where the numbers came from"""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "device": device,
+    }
+    try:
+        import cv2  # type: ignore
+        info["opencv"] = cv2.__version__
+    except ImportError:
+        pass
+    try:
+        import ultralytics  # type: ignore
+        info["ultralytics"] = ultralytics.__version__
+    except (ImportError, AttributeError):
+        pass
+    return info
+
+
+def summarize_ms(samples_s):
+    """
+    Latency summary of a list of durations
+
+    Args:
+        samples_s: Durations in seconds
+
+    Returns:
+        dict: n, mean_ms, p50_ms, p95_ms, p99_ms, max_ms
+    """
+    if not samples_s:
+        return {"n": 0}
+    ordered = sorted(samples_s)
+
+    def pct(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pct(0.50), 3),
+        "p95_ms": round(pct(0.95), 3),
+        "p99_ms": round(pct(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def time_calls(fn, iterations, warmup=0):
+    """
+    Call fn() repeatedly and return each call's duration in seconds
+
+    Args:
+        fn: Zero-argument callable
+        iterations: Timed calls
+        warmup: Untimed calls first (model/JIT/cache warmup)
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def write_results(path, benchmark, results, params=None, device=None):
+    """
+    Write one suite's results in the shared envelope
+
+    Args:
+        path: Output JSON file (parent directories are created)
+        benchmark: Suite name ("frame", "video", "score", ...)
+        results: List of result dicts, each with a "case" key
+        params: Parameters the suite ran with
+        device: Inference device, if relevant
+
+    Returns:
+        dict: The written document
+    """
+    document = {
+        "benchmark": benchmark,
+        "git": git_info(),
+        "environment": environment_info(device),
+        "created_at": time.time(),
+        "params": params or {},
+        "results": results,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to: {path}", file=sys.stderr)
+    return document
+
+
+def default_output(benchmark, results_dir="benchmark-results"):
+    """benchmark-results/<short sha>/<benchmark>.json"""
+    sha = git_info()["sha"] or "nogit"
+    return Path(results_dir) / sha[:10] / f"{benchmark}.json"
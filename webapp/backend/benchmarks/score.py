@@ -0,0 +1,112 @@
+"""
+Latency of save_or_update_score (leaderboard transaction) against a local Firestore emulator
+
+Never runs against production: FIRESTORE_EMULATOR_HOST must be set.
+
+Start the emulator first, then run the benchmark (from repo root):
+    gcloud emulators firestore start --host-port=localhost:8080
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m webapp.backend.benchmarks.score
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m webapp.backend.benchmarks.score --iterations 200 --concurrency 1 8
+
+Cases:
+    new_user     - first score for a username (transaction writes)
+    improved     - higher score for an existing user (transaction writes)
+    not_improved - lower score for an existing user (read-only transaction)
+    contended_N  - N threads updating the same user at once (transaction retries)
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .results import default_output, summarize_ms, write_results
+
+
+def timed_save(save, username, score):
+    start = time.perf_counter()
+    result = asyncio.run(save(username, score))
+    return time.perf_counter() - start, result["status"]
+
+
+def run(iterations=50, concurrency=(1, 4)):
+    """
+    Run the score benchmark
+
+    Returns:
+        list[dict]: One result per case
+    """
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        raise SystemExit("FIRESTORE_EMULATOR_HOST is not set; refusing to benchmark against a real Firestore project")
+
+    # Imported here so the emulator check happens before the Firebase app is initialised
+    from ..firebaseAdmin import db, save_or_update_score
+
+    run_id = uuid.uuid4().hex[:8]
+    usernames = []
+
+    def username(suffix):
+        name = f"bench-{run_id}-{suffix}"
+        usernames.append(name)
+        return name
+
+    results = []
+
+    def record(case, samples, statuses):
+        row = {"case": case, **summarize_ms(samples), "statuses": {s: statuses.count(s) for s in set(statuses)}}
+        results.append(row)
+        print(f"{case:<16} p50 {row['p50_ms']:>8.2f}ms  p95 {row['p95_ms']:>8.2f}ms  p99 {row['p99_ms']:>8.2f}ms  {row['statuses']}")
+
+    try:
+        # new_user: a fresh document every call
+        runs = [timed_save(save_or_update_score, username(f"new-{i}"), 100) for i in range(iterations)]
+        record("new_user", [r[0] for r in runs], [r[1] for r in runs])
+
+        # improved: same user, score goes up every call
+        user = username("improved")
+        timed_save(save_or_update_score, user, 0)
+        runs = [timed_save(save_or_update_score, user, i + 1) for i in range(iterations)]
+        record("improved", [r[0] for r in runs], [r[1] for r in runs])
+
+        # not_improved: same user, score never beats the best
+        user = username("not-improved")
+        timed_save(save_or_update_score, user, 10 ** 6)
+        runs = [timed_save(save_or_update_score, user, i) for i in range(iterations)]
+        record("not_improved", [r[0] for r in runs], [r[1] for r in runs])
+
+        # contended: many writers on one document at once
+        for workers in concurrency:
+            if workers <= 1:
+                continue
+            user = username(f"contended-{workers}")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                runs = list(pool.map(lambda i: timed_save(save_or_update_score, user, i + 1), range(iterations)))
+            record(f"contended_{workers}", [r[0] for r in runs], [r[1] for r in runs])
+    finally:
+        # Leave the emulator as we found it
+        for name in usernames:
+            db.collection("leaderboard").document(name.lower()).delete()
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="save_or_update_score latency against the Firestore emulator")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per case")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4],
+                        help="Thread counts for the contended case (1 = skip)")
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/score.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run(args.iterations, args.concurrency)
+    params = {"iterations": args.iterations, "concurrency": args.concurrency,
+              "emulator_host": os.getenv("FIRESTORE_EMULATOR_HOST")}
+    write_results(args.json or default_output("score"), "score", results, params)
+
+
+if __name__ == "__main__":
+    main()
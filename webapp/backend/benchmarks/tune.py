@@ -0,0 +1,309 @@
+"""
+Autotuner for the upload presets: imgsz, confidence, frame_stride and frame_skip
+
+YOLO runs once per (clip, imgsz), on every frame, at the lowest confidence
+in the sweep. The raw punch detections (class and confidence of each box)
+are cached on disk. Every other knob is applied offline from the cache:
+- confidence: ignore detections below it
+- frame_stride: take every Nth frame's detections and repeat them in
+  between (what FramePipeline does)
+- frame_skip: cluster thresholds (clustering.adaptive_frame_skip)
+So a sweep costs one YOLO pass per (clip, imgsz), however many points it
+has, and a second run with the same clips and sizes costs none.
+
+Accuracy is the per-type punch count error against labels.json in the
+clips directory, e.g. {"clip.mp4": {"straight": 2, "hook": 1, "uppercut": 0}}.
+Clips without labels are scored against the most expensive point of the
+sweep. Speed is estimated from timings taken while caching. The staged
+pipeline takes about as long as its slowest stage:
+    process_s ~= max(decode_s, infer_s * inferred_frames / frames)
+The motion gate and the cascade are off throughout.
+
+Outputs:
+- benchmark-results/<sha>/tune.json: every point, with "pareto": true on
+  the speed/accuracy front
+- tune.png next to it (needs matplotlib): error vs time, front and picks
+- with --write-presets: "accurate" (lowest error, fastest among ties) and
+  "fast" (fastest front point within --fast-tolerance error rate of
+  accurate) go to BRAWLR_PRESETS, which the upload endpoints read at startup
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.tune --clips ~/brawlr-clips
+    python -m webapp.backend.benchmarks.tune --clips ~/brawlr-clips --imgsz 320 480 640 --write-presets
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from .. import presets, video_io
+from ..clustering import PUNCH_TYPES, adaptive_frame_skip, video_counter
+from ..pipeline import fit_frame
+from .fixtures import clip_info, recorded_clips, synthetic_clip_path
+from .results import default_output, write_results
+
+
+def detect_clip(processor, clip, frame_size, imgsz, min_confidence, batch_size=8):
+    """
+    Run YOLO on every frame of a clip and keep the raw punch detections
+
+    Returns:
+        dict: frames, fps, decode_s, infer_s and detections (per frame, a
+        list of [class, confidence] in YOLO's order)
+    """
+    detections = []
+    decode_s = infer_s = 0.0
+
+    def infer(batch):
+        results = processor.model.predict(source=batch, conf=min_confidence, imgsz=imgsz, verbose=False,
+                                          device=processor.device)
+        for result in results:
+            boxes = result.boxes
+            frame = []
+            if boxes is not None and len(boxes):
+                for class_id, confidence in zip(boxes.cls.tolist(), boxes.conf.tolist()):
+                    class_name = processor.model.names[int(class_id)]
+                    if class_name in PUNCH_TYPES:
+                        frame.append([class_name, round(float(confidence), 4)])
+            detections.append(frame)
+
+    with video_io.VideoReader(clip) as video:
+        fps = video.fps
+        frames = video.frames()
+        batch = []
+        while True:
+            start = time.perf_counter()
+            frame = next(frames, None)
+            if frame is not None:
+                batch.append(fit_frame(frame, min(frame_size, imgsz)))
+            decode_s += time.perf_counter() - start
+            if batch and (frame is None or len(batch) == batch_size):
+                start = time.perf_counter()
+                infer(batch)
+                infer_s += time.perf_counter() - start
+                batch = []
+            if frame is None:
+                break
+    return {"frames": len(detections), "fps": fps, "decode_s": decode_s, "infer_s": infer_s, "detections": detections}
+
+
+def cached_detections(processor, clip, frame_size, imgsz, min_confidence, cache_dir):
+    """detect_clip(), cached per clip file, sizes, confidence, model and device"""
+    stat = Path(clip).stat()
+    key = (f"{Path(clip).stem}-{stat.st_size}-{int(stat.st_mtime)}-f{frame_size}-i{imgsz}-c{min_confidence:g}"
+           f"-{Path(processor.model_path).stem}-{processor.device}.json")
+    path = Path(cache_dir) / "tune" / key
+    if path.exists():
+        return json.loads(path.read_text())
+    data = detect_clip(processor, clip, frame_size, imgsz, min_confidence)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+    return data
+
+
+def simulate_counts(data, confidence, frame_stride, frame_skip):
+    """
+    Punch counts process_video would report for these settings, from cached detections
+
+    Returns:
+        dict: { "straight", "hook", "uppercut", "total" }
+    """
+    fps = int(data["fps"])
+    duration = data["frames"] / fps if fps > 0 else 0
+    counter = video_counter(adaptive_frame_skip(duration, frame_skip))
+    last = None
+    for index, frame in enumerate(data["detections"]):
+        if index % frame_stride == 0:
+            last = next((class_name for class_name, score in frame if score >= confidence), None)
+        counter.add_frame(last)
+    return counter.result()
+
+
+def estimated_seconds(data, frame_stride):
+    inferred = -(-data["frames"] // frame_stride)
+    infer_s = data["infer_s"] * inferred / data["frames"] if data["frames"] else 0.0
+    return max(data["decode_s"], infer_s)
+
+
+def count_error(counts, reference):
+    return sum(abs(counts[key] - reference.get(key, 0)) for key in PUNCH_TYPES)
+
+
+def pareto_front(points):
+    """Points no other point beats on both process_s and abs_error, fastest first"""
+    front = []
+    for point in sorted(points, key=lambda p: (p["process_s"], p["abs_error"])):
+        if not front or point["abs_error"] < front[-1]["abs_error"]:
+            front.append(point)
+    return front
+
+
+def choose_presets(points, front, fast_tolerance, preprocess_resolution):
+    """
+    Returns:
+        list[presets.Preset]: "accurate" and "fast"
+    """
+    accurate = min(points, key=lambda p: (p["abs_error"], p["process_s"]))
+    fast = next(p for p in front if p["error_rate"] <= accurate["error_rate"] + fast_tolerance)
+    return [
+        presets.Preset(name, preprocess_resolution=preprocess_resolution, imgsz=point["imgsz"],
+                       confidence=point["confidence"], frame_stride=point["frame_stride"],
+                       frame_skip=point["frame_skip"])
+        for name, point in (("accurate", accurate), ("fast", fast))
+    ]
+
+
+def plot(points, front, chosen, path):
+    """Error vs time scatter with the Pareto front; skipped without matplotlib"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not installed, skipping the plot")
+        return None
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.scatter([p["process_s"] for p in points], [p["abs_error"] for p in points], s=12, alpha=0.4, label="sweep")
+    ax.plot([p["process_s"] for p in front], [p["abs_error"] for p in front], "o-", color="tab:red", label="Pareto front")
+    for preset, point in chosen:
+        ax.annotate(preset.name, (point["process_s"], point["abs_error"]), textcoords="offset points", xytext=(6, 6))
+    ax.set_xlabel("estimated process time, all clips (s)")
+    ax.set_ylabel("punch count error, all clips")
+    ax.set_title("Upload analysis: speed vs accuracy")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return path
+
+
+def run(clips, labels, imgsz_values, confidences, strides, frame_skips, frame_size=480, cache_dir=None):
+    """
+    Returns:
+        (list[dict] points, list[dict] front, device)
+    """
+    from ..models import YOLOProcessor
+
+    processor = YOLOProcessor(gate_model_path=None)
+    if processor.model is None:
+        raise SystemExit("YOLO model not loaded")
+
+    min_confidence = min(confidences)
+    cached = {}
+    for clip in clips:
+        for imgsz in imgsz_values:
+            start = time.perf_counter()
+            cached[clip.name, imgsz] = cached_detections(processor, clip, frame_size, imgsz, min_confidence, cache_dir)
+            print(f"{clip.name:<36} imgsz {imgsz:>4}  detections ready in {time.perf_counter() - start:6.2f}s")
+
+    def clip_counts(clip, imgsz, confidence, stride, skip):
+        return simulate_counts(cached[clip.name, imgsz], confidence, stride, skip)
+
+    # Clips without labels: the most expensive point stands in for the truth
+    references = {}
+    for clip in clips:
+        references[clip.name] = labels.get(clip.name) or clip_counts(
+            clip, max(imgsz_values), min_confidence, min(strides), min(frame_skips))
+    reference_punches = sum(sum(reference.get(key, 0) for key in PUNCH_TYPES) for reference in references.values())
+
+    points = []
+    for imgsz, confidence, stride, skip in itertools.product(imgsz_values, confidences, strides, frame_skips):
+        errors = {}
+        seconds = 0.0
+        for clip in clips:
+            counts = clip_counts(clip, imgsz, confidence, stride, skip)
+            errors[clip.name] = count_error(counts, references[clip.name])
+            seconds += estimated_seconds(cached[clip.name, imgsz], stride)
+        abs_error = sum(errors.values())
+        points.append({
+            "case": f"imgsz{imgsz}_conf{confidence:g}_stride{stride}_skip{skip}",
+            "imgsz": imgsz,
+            "confidence": confidence,
+            "frame_stride": stride,
+            "frame_skip": skip,
+            "process_s": round(seconds, 3),
+            "abs_error": abs_error,
+            "error_rate": round(abs_error / reference_punches, 4) if reference_punches else float(abs_error > 0),
+            "exact_clips": sum(1 for error in errors.values() if error == 0),
+            "clip_errors": errors,
+        })
+
+    front = pareto_front(points)
+    for point in points:
+        point["pareto"] = point in front
+    return points, front, processor.device
+
+
+def load_labels(clips_dir):
+    """labels.json next to the clips ({} when there is none)"""
+    if not clips_dir:
+        return {}
+    path = Path(clips_dir) / "labels.json"
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sweep upload analysis settings and pick speed/accuracy presets")
+    parser.add_argument("--clips", default=os.getenv("BRAWLR_BENCH_CLIPS"),
+                        help="Directory of evaluation clips (and labels.json); a synthetic clip if unset")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[320, 480, 640], help="YOLO inference sizes")
+    parser.add_argument("--confidences", type=float, nargs="+", default=[0.01, 0.05, 0.1, 0.25])
+    parser.add_argument("--strides", type=int, nargs="+", default=[1, 2, 3, 5], help="Run YOLO on every Nth frame")
+    parser.add_argument("--frame-skips", type=int, nargs="+", default=[1, 2, 3, 4], help="Cluster threshold setting")
+    parser.add_argument("--frame-size", type=int, default=480, help="preprocess_video resolution")
+    parser.add_argument("--fast-tolerance", type=float, default=0.05,
+                        help="Extra error rate (errors / punches) the fast preset may have over accurate")
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "brawlr-bench"),
+                        help="Where detections (and generated clips) are cached")
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/tune.json)")
+    parser.add_argument("--plot", default=None, help="Plot file (default: tune.png next to the JSON)")
+    parser.add_argument("--write-presets", nargs="?", const=str(presets.PRESETS_PATH), default=None,
+                        help=f"Write the chosen presets (default file: {presets.PRESETS_PATH})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    clips = recorded_clips(args.clips)
+    if not clips:
+        print("No --clips given: tuning on a synthetic clip (smoke test only, the numbers mean nothing)")
+        clips = [synthetic_clip_path(args.cache_dir, 10, width=640, height=360)]
+    labels = load_labels(args.clips)
+    print(f"{len(clips)} clips, {sum(1 for clip in clips if clip.name in labels)} labelled, "
+          f"{sum(clip_info(clip)['frames'] for clip in clips)} frames")
+
+    points, front, device = run(clips, labels, args.imgsz, args.confidences, args.strides, args.frame_skips,
+                                args.frame_size, args.cache_dir)
+    chosen_presets = choose_presets(points, front, args.fast_tolerance, args.frame_size)
+    chosen = [
+        (preset, next(p for p in points if (p["imgsz"], p["confidence"], p["frame_stride"], p["frame_skip"]) ==
+                      (preset.imgsz, preset.confidence, preset.frame_stride, preset.frame_skip)))
+        for preset in chosen_presets
+    ]
+
+    print("Pareto front (fastest first):")
+    for point in front:
+        print(f"  {point['case']:<36} {point['process_s']:>8.2f}s  error {point['abs_error']:>4}  "
+              f"({point['error_rate']:.1%})  exact clips {point['exact_clips']}/{len(clips)}")
+    for preset, point in chosen:
+        print(f"{preset.name:<9} -> {point['case']} ({point['process_s']:.2f}s, error {point['abs_error']})")
+
+    output = Path(args.json or default_output("tune"))
+    params = {key: getattr(args, key) for key in ("clips", "imgsz", "confidences", "strides", "frame_skips",
+                                                  "frame_size", "fast_tolerance")}
+    params["chosen"] = {preset.name: preset.to_dict() for preset in chosen_presets}
+    write_results(output, "tune", points, params, device)
+    plot_path = plot(points, front, chosen, args.plot or output.with_suffix(".png"))
+    if plot_path:
+        print(f"Plot written to: {plot_path}")
+
+    if args.write_presets:
+        presets.write_presets(chosen_presets, args.write_presets, source={"benchmark": "tune", **params})
+        print(f"Presets written to: {args.write_presets} (restart the backend to use them)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Throughput of the upload path (/upload-video)
+
+Runs preprocess_video + process_video on clips of several resolutions and
+durations, and reports wall time per stage, frames per second and the
+realtime factor (video seconds analysed per wall-clock second).
+
+With --motion-check, each clip is also run with the motion gate off, to
+report the share of frames the gate skipped and check that punch counts
+are the same both ways.
+
+Usage (from repo root):
+    python -m webapp.backend.benchmarks.video
+    python -m webapp.backend.benchmarks.video --sizes 640x360 1280x720 1920x1080 --durations 10 30
+    python -m webapp.backend.benchmarks.video --clips ~/brawlr-clips --repeat 3 --json video.json
+    python -m webapp.backend.benchmarks.video --clips ~/brawlr-clips --motion-check
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from ..motion import UPLOAD_ENABLED, MotionGate
+from ..utils import preprocess_video
+from .fixtures import clip_info, recorded_clips, synthetic_clip_path
+from .frame import parse_size
+from .results import default_output, write_results
+
+
+def bench_clip(processor, clip, max_resolution, frame_skip, repeat, motion_check=False):
+    """
+    Time preprocess_video and process_video on one clip
+
+    Args:
+        motion_check: Force the motion gate on for the timed runs, and add one
+            ungated run to compare against
+
+    Returns:
+        dict: Clip properties, median stage times, fps, realtime factor and
+        the share of frames the motion gate skipped
+    """
+    info = clip_info(clip)
+    preprocess_s, process_s = [], []
+    punch_counts = None
+    gate = None
+    ungated = {}
+    for run_index in range(repeat + (1 if motion_check else 0)):
+        start = time.perf_counter()
+        preprocessed = preprocess_video(str(clip), max_resolution=max_resolution)
+        elapsed = time.perf_counter() - start
+        try:
+            if run_index == repeat:
+                # Extra run for --motion-check: every frame through YOLO
+                start = time.perf_counter()
+                analysis = processor.process_video(preprocessed, frame_skip=frame_skip, max_resolution=max_resolution,
+                                                   motion_gate=MotionGate("upload", enabled=False))
+                ungated["punch_counts"] = analysis["punchCounts"]
+                ungated["process_s"] = time.perf_counter() - start
+                continue
+            preprocess_s.append(elapsed)
+            gate = MotionGate("upload", enabled=True) if motion_check else MotionGate("upload", enabled=UPLOAD_ENABLED)
+            start = time.perf_counter()
+            punch_counts = processor.process_video(preprocessed, frame_skip=frame_skip, max_resolution=max_resolution,
+                                                   motion_gate=gate)["punchCounts"]
+            process_s.append(time.perf_counter() - start)
+        finally:
+            if preprocessed != str(clip) and os.path.exists(preprocessed):
+                os.unlink(preprocessed)
+
+    preprocess = statistics.median(preprocess_s)
+    process = statistics.median(process_s)
+    total = preprocess + process
+    row = {
+        **{key: info[key] for key in ("width", "height", "fps", "frames", "duration_s")},
+        "preprocess_s": round(preprocess, 3),
+        "process_s": round(process, 3),
+        "total_s": round(total, 3),
+        "frames_per_s": round(info["frames"] / total, 2) if total else None,
+        "realtime_factor": round(info["duration_s"] / total, 2) if total else None,
+        "punch_counts": punch_counts,
+        "motion_gate": gate.enabled,
+        "motion_skip_rate": round(gate.skip_rate(), 4),
+    }
+    if ungated:
+        row["process_s_ungated"] = round(ungated["process_s"], 3)
+        row["punch_counts_ungated"] = ungated["punch_counts"]
+        row["counts_match"] = ungated["punch_counts"] == punch_counts
+    return row
+
+
+def run(sizes, durations, clips=(), fps=30, max_resolution=640, frame_skip=3, repeat=1, cache_dir=None,
+        motion_check=False):
+    """
+    Run the video benchmark over synthetic clips (sizes x durations) and recorded clips
+
+    Returns:
+        (list[dict], device)
+    """
+    from ..models import YOLOProcessor
+
+    processor = YOLOProcessor()
+    if processor.model is None:
+        raise SystemExit("YOLO model not loaded")
+
+    cases = [
+        (f"synthetic_{width}x{height}_{duration:g}s", synthetic_clip_path(cache_dir, duration, fps=fps, width=width, height=height))
+        for width, height in sizes
+        for duration in durations
+    ]
+    cases += [(f"recorded_{clip.stem}", clip) for clip in clips]
+
+    results = []
+    for case, clip in cases:
+        row = {"case": case, **bench_clip(processor, clip, max_resolution, frame_skip, repeat, motion_check)}
+        results.append(row)
+        print(f"{case:<36} preprocess {row['preprocess_s']:>7.2f}s  process {row['process_s']:>7.2f}s  "
+              f"{row['frames_per_s']:>7.1f} fps  {row['realtime_factor']:>5.2f}x realtime  "
+              f"skipped {row['motion_skip_rate']:.1%}")
+        if motion_check:
+            print(f"{'':<36} ungated process {row['process_s_ungated']:>7.2f}s  "
+                  f"counts {'match' if row['counts_match'] else 'DIFFER'}")
+    return results, processor.device
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="preprocess_video + process_video throughput by resolution and duration")
+    parser.add_argument("--sizes", nargs="+", default=["640x360", "1280x720"], help="Synthetic clip sizes, WIDTHxHEIGHT")
+    parser.add_argument("--durations", type=float, nargs="+", default=[10, 30], help="Synthetic clip durations in seconds")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--clips", default=os.getenv("BRAWLR_BENCH_CLIPS"), help="Directory of recorded clips")
+    parser.add_argument("--max-resolution", type=int, default=640)
+    parser.add_argument("--frame-skip", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per clip (median is reported)")
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "brawlr-bench"),
+                        help="Where generated clips are cached")
+    parser.add_argument("--motion-check", action="store_true",
+                        help="Also run each clip with the motion gate off and compare punch counts")
+    parser.add_argument("--json", default=None, help="Output file (default: benchmark-results/<sha>/video.json)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [parse_size(size) for size in args.sizes]
+    results, device = run(sizes, args.durations, recorded_clips(args.clips), args.fps,
+                          args.max_resolution, args.frame_skip, max(1, args.repeat), args.cache_dir, args.motion_check)
+    params = {key: getattr(args, key) for key in ("sizes", "durations", "fps", "clips", "max_resolution", "frame_skip", "repeat",
+                                                  "motion_check")}
+    write_results(args.json or default_output("video"), "video", results, params, device)
+    if any(row.get("counts_match") is False for row in results):
+        sys.exit("Punch counts differ with the motion gate on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Server-driven capture settings for live camera clients
+
+The server tells each /ws client what to send: frames per second, the
+largest frame size and the JPEG quality. Settings move along a fixed
+ladder, based on the session's measured per-frame latency and on how
+busy this node is. Clients then stop sending pixels that
+preprocess_image would throw away, and stop sending frames the server
+can't keep up with.
+
+Message sent to the client (on connect and whenever the level changes):
+    {"type": "config", "fps": 10, "maxWidth": 640, "maxHeight": 640, "jpegQuality": 0.7}
+"""
+import os
+import time
+
+from . import metrics
+
+# (fps, longest side in px, JPEG quality), best first.
+# 640 px is the top: preprocess_image downsizes anything larger anyway.
+LEVELS = [
+    (10, 640, 0.7),
+    (8, 640, 0.6),
+    (6, 480, 0.6),
+    (5, 416, 0.5),
+    (3, 320, 0.5),
+]
+
+# Set BRAWLR_CAPTURE_ADAPTIVE=0 to keep every session at the top level
+ADAPTIVE = os.getenv("BRAWLR_CAPTURE_ADAPTIVE", "1") != "0"
+
+# Minimum seconds between two level changes for a session
+HOLD_SECONDS = 3.0
+
+# Step down when a frame takes more than this share of the frame interval,
+# or when the node is busier than this
+STEP_DOWN_BUDGET = 0.8
+STEP_DOWN_UTILIZATION = 0.85
+
+# Step up only when the faster level would still leave this much slack
+STEP_UP_BUDGET = 0.5
+STEP_UP_UTILIZATION = 0.6
+
+
+def config_message(level):
+    fps, max_side, quality = LEVELS[level]
+    return {"type": "config", "fps": fps, "maxWidth": max_side, "maxHeight": max_side, "jpegQuality": quality}
+
+
+class CaptureController:
+    """
+    Picks the capture level for one session
+
+    What this does:
+    - Starts at the top level
+    - After each frame, compares the session's average frame latency with
+      the frame interval of the current level, plus node utilization
+    - Steps down one level when overloaded, up one level when there is
+      clear slack, and never changes more often than HOLD_SECONDS
+
+    Args:
+        adaptive: False keeps the session at the top level
+    """
+
+    def __init__(self, adaptive=ADAPTIVE):
+        self.adaptive = adaptive
+        self.level = 0
+        self._changed_at = time.monotonic()
+
+    def initial_message(self):
+        return config_message(self.level)
+
+    def update(self, inference_ms, utilization):
+        """
+        Args:
+            inference_ms: Session's moving-average per-frame processing time
+            utilization: Node utilization from the session registry (0-1)
+
+        Returns:
+            dict or None: A config message to send if the level changed
+        """
+        if not self.adaptive or inference_ms is None:
+            return None
+        now = time.monotonic()
+        if now - self._changed_at < HOLD_SECONDS:
+            return None
+
+        interval_ms = 1000 / LEVELS[self.level][0]
+        if self.level < len(LEVELS) - 1 and (
+            inference_ms > STEP_DOWN_BUDGET * interval_ms or utilization > STEP_DOWN_UTILIZATION
+        ):
+            self.level += 1
+            direction = "down"
+        elif self.level > 0 and (
+            inference_ms < STEP_UP_BUDGET * 1000 / LEVELS[self.level - 1][0] and utilization < STEP_UP_UTILIZATION
+        ):
+            self.level -= 1
+            direction = "up"
+        else:
+            return None
+
+        self._changed_at = now
+        metrics.WS_CAPTURE_CHANGES.labels(direction=direction).inc()
+        return config_message(self.level)
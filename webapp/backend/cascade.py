@@ -0,0 +1,150 @@
+"""
+Two-stage cascade: a small gate model in front of the full punch model
+
+The gate is any small ultralytics model: a classifier (e.g. yolov8n-cls
+fine-tuned on punch / no-punch frames) or a tiny detector trained on the
+same classes as best_straight_v1.pt. It scores each frame for "punch
+likely", and only frames at or above the threshold go to the full
+model. Rejected frames count as no-punch frames, both for live results
+and for cluster counting.
+
+The score comes from the gate classes named in BRAWLR_GATE_CLASSES. A
+gate with none of them is not loaded: it would reject every frame.
+
+Configured with:
+    BRAWLR_GATE_MODEL       path to the gate model (unset = no cascade)
+    BRAWLR_GATE_THRESHOLD   minimum punch score to run the full model (default 0.1)
+    BRAWLR_GATE_IMGSZ       gate inference size (default 320)
+    BRAWLR_GATE_CLASSES     comma-separated gate classes that mean "punch"
+                            (default punch,straight,hook,uppercut)
+"""
+import os
+
+from ultralytics import YOLO
+
+from . import metrics
+from .clustering import PUNCH_TYPES
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+GATE_MODEL = os.getenv("BRAWLR_GATE_MODEL") or None
+GATE_THRESHOLD = float(os.getenv("BRAWLR_GATE_THRESHOLD", "0.1"))
+GATE_IMGSZ = int(os.getenv("BRAWLR_GATE_IMGSZ", "320"))
+GATE_CLASSES = [name.strip() for name in os.getenv("BRAWLR_GATE_CLASSES", ",".join(["punch"] + PUNCH_TYPES)).split(",")
+                if name.strip()]
+
+
+class CascadeGate:
+    """
+    Cheap "punch likely?" check run before the full model
+
+    What this does:
+    - Classifier gate: score = summed probability of the punch classes
+    - Detector gate: score = highest punch-class box confidence
+    - select() scores a batch of frames in one gate forward pass and
+      returns the ones that reach the threshold; passes() does one frame
+    - Counts passed/rejected frames in brawlr_cascade_frames_total
+
+    Args:
+        model_path: Gate model file
+        threshold: Minimum score to pass a frame to the full model
+        imgsz: Gate inference size
+        device: "cuda" or "cpu"
+        punch_classes: Gate class names that count as a punch (default: BRAWLR_GATE_CLASSES)
+
+    Raises:
+        ValueError: None of the gate's classes is in punch_classes
+    """
+
+    def __init__(self, model_path, threshold=GATE_THRESHOLD, imgsz=GATE_IMGSZ, device="cpu", punch_classes=GATE_CLASSES):
+        self.model_path = str(model_path)
+        self.threshold = threshold
+        self.imgsz = imgsz
+        self.device = device
+        self.model = YOLO(self.model_path)
+        if device == "cuda":
+            self.model.to(device)
+        self.passed = 0
+        self.rejected = 0
+        self._punch_ids = [class_id for class_id, name in self.model.names.items() if name in punch_classes]
+        if not self._punch_ids:
+            raise ValueError(f"No gate class is a punch class (gate classes: {sorted(self.model.names.values())}, "
+                             f"punch classes: {list(punch_classes)}); set BRAWLR_GATE_CLASSES")
+        self._passed = metrics.CASCADE_FRAMES.labels(decision="passed")
+        self._rejected = metrics.CASCADE_FRAMES.labels(decision="rejected")
+
+    def scores(self, images):
+        """
+        Args:
+            images: BGR numpy arrays (one batched gate forward pass)
+
+        Returns:
+            list[float]: Punch score in [0, 1] per image
+        """
+        if not images:
+            return []
+        results = self.model.predict(source=list(images), imgsz=self.imgsz, device=self.device, verbose=False)
+        return [self._result_score(result) for result in results]
+
+    def score(self, image):
+        return self.scores([image])[0]
+
+    def _result_score(self, result):
+        probs = getattr(result, "probs", None)
+        if probs is not None:
+            values = probs.data.tolist()
+            return sum(values[class_id] for class_id in self._punch_ids)
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return 0.0
+        return max(
+            (conf for class_id, conf in zip(boxes.cls.tolist(), boxes.conf.tolist()) if int(class_id) in self._punch_ids),
+            default=0.0,
+        )
+
+    def select(self, images):
+        """
+        Returns:
+            list[int]: Indices of the images whose score reaches the threshold
+        """
+        selected = [i for i, score in enumerate(self.scores(images)) if score >= self.threshold]
+        rejected = len(images) - len(selected)
+        self.passed += len(selected)
+        self.rejected += rejected
+        if selected:
+            self._passed.inc(len(selected))
+        if rejected:
+            self._rejected.inc(rejected)
+        return selected
+
+    def passes(self, image):
+        return bool(self.select([image]))
+
+
+def load_gate(model_path=GATE_MODEL, device="cpu"):
+    """
+    Load the gate model if one is configured
+
+    Returns:
+        CascadeGate or None: None when no gate is configured or it failed to load
+        (the full model then runs on every frame)
+    """
+    if not model_path:
+        return None
+    try:
+        gate = CascadeGate(model_path, device=device)
+    except ValueError as e:
+        logger.error("Gate model has no punch class, running without cascade",
+                     extra={"gate_model": str(model_path), "error": str(e)})
+        return None
+    except Exception:
+        logger.exception("Error loading gate model, running without cascade", extra={"gate_model": str(model_path)})
+        return None
+    logger.info("Cascade gate loaded", extra={
+        "gate_model": gate.model_path,
+        "threshold": gate.threshold,
+        "imgsz": gate.imgsz,
+        "punch_classes": [gate.model.names[class_id] for class_id in gate._punch_ids],
+    })
+    return gate
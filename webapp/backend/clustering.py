@@ -0,0 +1,198 @@
+import logging
+
+from .logging_config import SampledLogger, get_logger
+
+logger = get_logger(__name__)
+
+# Per-frame punch events are sampled so the hot loop stays cheap even at DEBUG
+frame_logger = SampledLogger(logger)
+
+PUNCH_TYPES = ["straight", "hook", "uppercut"]
+
+
+class PunchClusterCounter:
+    """
+    Streaming cluster counter for per-frame punch labels
+
+    What this does:
+    - Takes one frame label at a time (punch type or None)
+    - Groups consecutive punch frames into a cluster
+    - When a cluster ends, counts it as 1 punch of the majority type
+      if it is long enough (same rules as count_punches_v5.py)
+    - Only keeps the current cluster in memory, so it works on
+      videos of any length
+    """
+
+    def __init__(self, min_cluster_frames=3, min_majority_frames=6):
+        """
+        Args:
+            min_cluster_frames: Minimum frames in a cluster for it to count
+            min_majority_frames: Minimum frames of the majority punch type
+        """
+        self.min_cluster_frames = min_cluster_frames
+        self.min_majority_frames = min_majority_frames
+        # Frames of each punch type in the current cluster (not the frames themselves,
+        # so a long cluster costs no more memory than a short one)
+        self.cluster_frames = dict.fromkeys(PUNCH_TYPES, 0)
+        self.cluster_length = 0
+        self.punch_counts = {punch_type: 0 for punch_type in PUNCH_TYPES}
+        self.punch_counts["total"] = 0
+        self.frames_seen = 0
+        # Checked once per video rather than once per frame
+        self._debug = logger.isEnabledFor(logging.DEBUG)
+
+    def add_frame(self, punch_type):
+        """
+        Feed the label of the next frame
+
+        Args:
+            punch_type: "straight", "hook", "uppercut" or None for no punch
+        """
+        frame_count = self.frames_seen
+        self.frames_seen += 1
+
+        if punch_type:
+            # Add punch to current cluster
+            self.cluster_frames[punch_type] += 1
+            self.cluster_length += 1
+            if self._debug:
+                frame_logger.debug("Frame punch", frame=frame_count, punch_type=punch_type)
+        elif self.cluster_length:
+            # End of cluster - analyze it
+            self._close_cluster()
+
+    def _cluster_punch(self, min_cluster_frames, min_majority_frames):
+        """The current cluster's majority punch type if it counts under these thresholds, else None"""
+        # Only count if cluster has enough frames (adjusted for frame skip)
+        if self.cluster_length < min_cluster_frames:
+            if self._debug:
+                logger.debug("Cluster ignored: too short", extra={"cluster_frames": self.cluster_length})
+            return None
+        majority_punch = max(self.cluster_frames, key=self.cluster_frames.get)
+        majority_count = self.cluster_frames[majority_punch]
+        if majority_count < min_majority_frames:
+            if self._debug:
+                logger.debug("Cluster ignored: majority too small",
+                             extra={"majority_frames": majority_count, "cluster_frames": self.cluster_length})
+            return None
+        return majority_punch
+
+    def _close_cluster(self):
+        majority_punch = self._cluster_punch(self.min_cluster_frames, self.min_majority_frames)
+        if majority_punch:
+            self.punch_counts[majority_punch] += 1
+            self.punch_counts["total"] += 1
+            if self._debug:
+                logger.debug("Cluster counted", extra={"punch_type": majority_punch, "cluster_frames": self.cluster_length})
+        self._reset_cluster()
+
+    def _reset_cluster(self):
+        # Reset for next cluster
+        self.cluster_frames = dict.fromkeys(PUNCH_TYPES, 0)
+        self.cluster_length = 0
+
+    def result(self):
+        """
+        Returns:
+            dict: { "straight": int, "hook": int, "uppercut": int, "total": int }
+        """
+        return dict(self.punch_counts)
+
+
+# Video types, as in count_punches_v5.py
+STOCK = "stock"
+HOME = "home"
+UNKNOWN = "unknown"
+
+
+class VideoPunchCounter(PunchClusterCounter):
+    """
+    PunchClusterCounter that also tells stock footage from home video, in one pass
+
+    What this does:
+    - Classifies like count_punches_v5.py: "stock" if no cluster is longer
+      than stock_max_cluster_frames (short, edited clips), "home" otherwise,
+      "unknown" if there were no clusters
+    - count_punches_v5.py read the log twice (classify, then count with that
+      type's thresholds). Here each cluster that ends while the type is still
+      open is judged under both: the home outcome goes into punch_counts,
+      the stock outcome into a pending tally
+    - The first cluster to pass stock_max_cluster_frames settles it as home,
+      while that cluster is still going: the pending tally is dropped and the
+      rest of the video is counted with the home thresholds only
+    - A video that ends undecided is stock: the pending tally is the result
+    - The pending tally is a count per punch type, so memory stays constant
+    """
+
+    def __init__(self, min_cluster_frames=3, min_majority_frames=6, stock_max_cluster_frames=6,
+                 stock_min_cluster_frames=1, stock_min_majority_frames=1):
+        """
+        Args:
+            min_cluster_frames, min_majority_frames: Home video thresholds
+            stock_max_cluster_frames: Longest cluster stock footage has
+            stock_min_cluster_frames, stock_min_majority_frames: Stock footage
+                thresholds (count_punches_v5.py counts every stock cluster)
+        """
+        super().__init__(min_cluster_frames, min_majority_frames)
+        self.stock_max_cluster_frames = stock_max_cluster_frames
+        self.stock_min_cluster_frames = stock_min_cluster_frames
+        self.stock_min_majority_frames = stock_min_majority_frames
+        self.video_type = None  # None until settled (see result())
+        self.clusters_seen = 0
+        self._stock_counts = {punch_type: 0 for punch_type in PUNCH_TYPES}
+        self._stock_counts["total"] = 0
+
+    def add_frame(self, punch_type):
+        super().add_frame(punch_type)
+        if self.video_type is None and self.cluster_length > self.stock_max_cluster_frames:
+            self.video_type = HOME
+            self._stock_counts = None
+            logger.info("Video type detected", extra={"video_type": HOME, "frame": self.frames_seen - 1})
+
+    def _close_cluster(self):
+        self.clusters_seen += 1
+        if self.video_type is None:
+            stock_punch = self._cluster_punch(self.stock_min_cluster_frames, self.stock_min_majority_frames)
+            if stock_punch:
+                self._stock_counts[stock_punch] += 1
+                self._stock_counts["total"] += 1
+        super()._close_cluster()
+
+    def detected_type(self):
+        """Video type for the frames seen so far ("stock", "home" or "unknown")"""
+        if self.video_type is not None:
+            return self.video_type
+        # A cluster still open at the end is not counted, but it has been seen
+        return STOCK if self.clusters_seen or self.cluster_length else UNKNOWN
+
+    def result(self):
+        """
+        Returns:
+            dict: { "straight": int, "hook": int, "uppercut": int, "total": int },
+            counted with the thresholds of detected_type()
+        """
+        if self.detected_type() == STOCK:
+            return dict(self._stock_counts)
+        return dict(self.punch_counts)
+
+
+def adaptive_frame_skip(duration_s, frame_skip):
+    """Frame skip for a video of this length (longer videos skip more)"""
+    if duration_s > 60:  # Videos longer than 1 minute
+        return max(4, frame_skip)
+    if duration_s > 30:  # Videos 30-60 seconds
+        return max(3, frame_skip)
+    return frame_skip
+
+
+def video_counter(frame_skip):
+    """
+    VideoPunchCounter for a whole video
+
+    Args:
+        frame_skip: Adaptive frame skip of the video (see adaptive_frame_skip)
+    """
+    return VideoPunchCounter(
+        min_cluster_frames=max(3, 8 // frame_skip),  # Scale down cluster requirements
+        min_majority_frames=6,  # Only count if majority has at least 6 frames
+    )
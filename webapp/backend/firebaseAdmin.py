@@ -1,7 +1,12 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
+import time
 from pathlib import Path
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 # Get the service account key path from environment variable
 # Falls back to default location if not set
@@ -10,10 +15,18 @@ SERVICE_ACCOUNT_KEY = os.getenv(
     str(Path(__file__).parent / 'brawlr-database-firebase-adminsdk-fbsvc-dfb1cf6eef.json')
 )
 
+# Local Firestore emulator (e.g. "localhost:8080"), used by benchmarks and local development.
+# The Firestore client picks this variable up itself; no service account is needed.
+EMULATOR_HOST = os.getenv('FIRESTORE_EMULATOR_HOST')
+
 # Initialize Firebase Admin SDK
 if not firebase_admin._apps:
-    cred = credentials.Certificate(SERVICE_ACCOUNT_KEY)
-    firebase_admin.initialize_app(cred)
+    if EMULATOR_HOST:
+        logger.info("Using Firestore emulator", extra={"emulator_host": EMULATOR_HOST})
+        firebase_admin.initialize_app(options={'projectId': os.getenv('FIREBASE_PROJECT_ID', 'demo-brawlr')})
+    else:
+        cred = credentials.Certificate(SERVICE_ACCOUNT_KEY)
+        firebase_admin.initialize_app(cred)
 
 db = firestore.client()
 
@@ -44,16 +57,22 @@ async def save_or_update_score(username: str, new_score: int):
         else:
             return False, current_score, new_score
 
+    start = time.perf_counter()
     try:
         is_updated, old_score, new_score = update_in_transaction(db.transaction(), user_ref, new_score)
+        metrics.FIRESTORE_TRANSACTION_SECONDS.labels(
+            outcome="updated" if is_updated else "not_updated"
+        ).observe(time.perf_counter() - start)
         
         if is_updated:
-            print(f"Score for {username} updated from {old_score} to {new_score}")
+            logger.info("Score updated", extra={"username": username, "old_score": old_score, "new_score": new_score})
             return {"status": "updated", "old_score": old_score, "new_score": new_score}
         else:
-            print(f"Score for {username} was not updated. New score ({new_score}) is not better than current ({old_score}).")
+            logger.info("Score not updated (not better than current)",
+                        extra={"username": username, "current_score": old_score, "new_score": new_score})
             return {"status": "not_updated", "current_score": old_score, "new_score": new_score}
 
     except Exception as e:
-        print(f"Firestore transaction failed for {username}: {e}")
+        metrics.FIRESTORE_TRANSACTION_SECONDS.labels(outcome="error").observe(time.perf_counter() - start)
+        logger.exception("Firestore transaction failed", extra={"username": username})
         raise e
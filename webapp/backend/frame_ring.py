@@ -0,0 +1,162 @@
+"""
+Shared-memory ring of fixed-size frame slots
+
+Used between a web worker (creates the ring) and an inference server
+(attaches to it). Each slot holds one frame as preprocess_image produces
+it (uint8 BGR, at most 640 px on the long side) plus a small result
+record, so neither the pixels nor the result are ever pickled: only slot
+indices travel over the socket.
+
+Layout of the segment (all arrays are views on the same buffer):
+    meta    int32[slots, 4]      height, width, channels, sequence number
+    result  float32[slots, 6]    punch code (0 = none, 1.. = PUNCH_TYPES), confidence,
+                                 detection box x1, y1, x2, y2 (x2 <= x1 = no box)
+    pixels  uint8[slots, SLOT_BYTES]
+"""
+import queue
+
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+
+from .clustering import PUNCH_TYPES
+
+# Largest frame preprocess_image returns: 640x640x3 uint8
+MAX_SIDE = 640
+SLOT_BYTES = MAX_SIDE * MAX_SIDE * 3
+
+_META_BYTES = 4 * 4
+_RESULT_BYTES = 6 * 4
+
+
+def _layout(slots):
+    meta_end = slots * _META_BYTES
+    result_end = meta_end + slots * _RESULT_BYTES
+    pixels_start = (result_end + 63) // 64 * 64  # cache-line aligned pixel area
+    return meta_end, result_end, pixels_start, pixels_start + slots * SLOT_BYTES
+
+
+class FrameRing:
+    """
+    Fixed number of frame slots in one shared-memory segment
+
+    Creator side (web worker):
+        ring = FrameRing.create(slots=8)
+        index = ring.acquire()          # blocks while every slot is in flight
+        ring.write_frame(index, image)
+        ... send index to the server, wait for it to be done ...
+        result = ring.read_result(index)
+        ring.release(index)
+
+    Attached side (inference server):
+        ring = FrameRing.attach(name, slots)
+        image = ring.read_frame(index)  # zero-copy view
+        ring.write_result(index, result, box)
+    """
+
+    def __init__(self, shm, slots, owner):
+        self.shm = shm
+        self.slots = slots
+        self.owner = owner
+        meta_end, result_end, pixels_start, _ = _layout(slots)
+        self.meta = np.ndarray((slots, 4), dtype=np.int32, buffer=shm.buf, offset=0)
+        self.result = np.ndarray((slots, 6), dtype=np.float32, buffer=shm.buf, offset=meta_end)
+        self.pixels = np.ndarray((slots, SLOT_BYTES), dtype=np.uint8, buffer=shm.buf, offset=pixels_start)
+        self._free = queue.Queue()
+        if owner:
+            for index in range(slots):
+                self._free.put(index)
+
+    @classmethod
+    def create(cls, slots=8):
+        shm = SharedMemory(create=True, size=_layout(slots)[3])
+        return cls(shm, slots, owner=True)
+
+    @classmethod
+    def attach(cls, name, slots, shm_factory=SharedMemory):
+        """
+        Args:
+            name: Segment name from the creator (ring.name)
+            slots: Slot count from the creator
+            shm_factory: How to open the segment (the server uses an untracked attach)
+        """
+        return cls(shm_factory(name), slots, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @staticmethod
+    def fits(image):
+        """True if the frame can go through a slot (otherwise send it inline)"""
+        return image.dtype == np.uint8 and image.ndim == 3 and image.nbytes <= SLOT_BYTES
+
+    # --------------------------
+    # Slot ownership (creator side)
+    # --------------------------
+    def acquire(self, timeout=None):
+        """
+        Take a free slot
+
+        Returns:
+            int or None: Slot index, or None if none freed up within timeout
+        """
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, index):
+        self._free.put(index)
+
+    def in_flight(self):
+        return self.slots - self._free.qsize()
+
+    # --------------------------
+    # Frames
+    # --------------------------
+    def write_frame(self, index, image, seq=0):
+        height, width, channels = image.shape
+        np.copyto(self.pixels[index, :image.nbytes], image.reshape(-1), casting="no")
+        self.meta[index] = (height, width, channels, seq)
+
+    def read_frame(self, index):
+        """The frame in a slot, as a view (valid until the slot is reused)"""
+        height, width, channels, _ = self.meta[index]
+        return self.pixels[index, :height * width * channels].reshape(height, width, channels)
+
+    # --------------------------
+    # Results
+    # --------------------------
+    def write_result(self, index, result, box=None):
+        """
+        Args:
+            result: format_punch_result(...) dict, or None for no punch
+            box: roi.detection_box(...) of the frame, or None
+        """
+        code, confidence = (0, 0.0) if result is None else (PUNCH_TYPES.index(result["punchType"]) + 1, result["confidence"])
+        self.result[index] = (code, confidence, *(box or (0, 0, 0, 0)))
+
+    def read_result(self, index):
+        """
+        Returns:
+            (punch_type, confidence) or None
+        """
+        code, confidence = self.result[index, :2]
+        if code == 0:
+            return None
+        return PUNCH_TYPES[int(code) - 1], round(float(confidence), 4)
+
+    def read_box(self, index):
+        """
+        Returns:
+            (x1, y1, x2, y2) or None
+        """
+        x1, y1, x2, y2 = (float(v) for v in self.result[index, 2:])
+        return (x1, y1, x2, y2) if x2 > x1 else None
+
+    def close(self):
+        # Views must go before the buffer can be closed
+        self.meta = self.result = self.pixels = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
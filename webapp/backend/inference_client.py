@@ -0,0 +1,248 @@
+"""
+Web-worker side of the inference server (see inference_server.py)
+
+RemoteYOLOProcessor has the same interface app.py uses on YOLOProcessor
+(process_frame, process_video, model), but never imports torch: frames are
+decoded and preprocessed here, written into a slot of a shared-memory
+FrameRing, and only the slot index goes over the socket. The server
+writes the result back into the same slot.
+"""
+import itertools
+import os
+import threading
+from multiprocessing.connection import Client
+
+from . import metrics
+from . import motion
+from . import roi
+from . import profiling
+from .frame_ring import FrameRing
+from .inference_server import authkey, parse_address
+from .logging_config import get_logger
+from .utils import decode_frame, format_punch_result
+
+logger = get_logger(__name__)
+
+# Frames one web worker can have in flight at once
+FRAME_SLOTS = int(os.getenv("BRAWLR_FRAME_SLOTS", "8"))
+
+# Seconds a frame may wait for a free slot / for its result before it is dropped
+FRAME_TIMEOUT = float(os.getenv("BRAWLR_INFERENCE_TIMEOUT", "10"))
+
+
+class InferenceError(Exception):
+    """The inference server reported an error or could not be reached"""
+
+
+class InferenceTimeout(InferenceError):
+    """No reply within the timeout (the request may still be running on the server)"""
+
+
+class _Call:
+    __slots__ = ("event", "status", "payload")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.status = None
+        self.payload = None
+
+
+class RemoteYOLOProcessor:
+    """
+    Drop-in for YOLOProcessor that forwards inference to an inference server
+
+    What this does:
+    - Picks one inference server per web worker (by pid), so load spreads
+      evenly when there are more web workers than inference servers
+    - Owns a FrameRing the server attaches on connect; up to FRAME_SLOTS
+      frames can be in flight, replies are matched to requests by tag
+    - A frame whose result times out keeps its slot until the server is
+      done with it, so a late write never lands in a reused slot
+    - Reconnects once if the server restarted
+
+    Args:
+        addresses: Inference server addresses (Unix socket paths or host:port)
+        slots: Frame slots in the ring
+    """
+
+    def __init__(self, addresses, slots=FRAME_SLOTS):
+        if not addresses:
+            raise ValueError("At least one inference server address is required")
+        self.addresses = list(addresses)
+        self.address = self.addresses[os.getpid() % len(self.addresses)]
+        self.ring = FrameRing.create(slots=slots)
+        self._conn = None
+        self._connect_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._calls = {}
+        self._calls_lock = threading.Lock()
+        self._tags = itertools.count(1)
+        self.server_info = {}  # the server's info() as of the current connection's hello
+        logger.info("Using inference server", extra={"address": self.address, "frame_ring": self.ring.name, "slots": slots})
+
+    @property
+    def model(self):
+        """
+        Model path loaded by the inference server, or None (mirrors YOLOProcessor.model checks)
+
+        Taken from the server's reply to the connection's hello, so checking
+        it is no IPC round trip once connected.
+        """
+        try:
+            self._ensure_connected()
+        except (InferenceError, EOFError, OSError):
+            return None
+        return self.server_info.get("model")
+
+    # --------------------------
+    # IPC
+    # --------------------------
+    def _ensure_connected(self):
+        with self._connect_lock:
+            if self._conn is not None:
+                return self._conn
+            conn = Client(parse_address(self.address), authkey=authkey())
+            conn.send((0, "hello", self.ring.name, self.ring.slots))
+            _, status, payload = conn.recv()
+            if status != "ok":
+                conn.close()
+                raise InferenceError(payload)
+            self.server_info = payload
+            self._conn = conn
+            threading.Thread(target=self._read_replies, args=(conn,), name="brawlr-infer-replies", daemon=True).start()
+            return conn
+
+    def _read_replies(self, conn):
+        """Dispatch replies to waiting callers until the connection drops"""
+        try:
+            while True:
+                tag, status, payload = conn.recv()
+                with self._calls_lock:
+                    call = self._calls.pop(tag, None)
+                if call is None:
+                    continue
+                call.status, call.payload = status, payload
+                call.event.set()
+        except (EOFError, OSError):
+            pass
+
+        # Connection gone: fail everything still waiting on it
+        with self._connect_lock:
+            if self._conn is conn:
+                self._conn = None
+        with self._calls_lock:
+            calls, self._calls = self._calls, {}
+        for call in calls.values():
+            call.status, call.payload = "disconnected", f"Inference server {self.address} disconnected"
+            call.event.set()
+
+    def _call(self, kind, *args, slot=None, timeout=None):
+        tag = next(self._tags)
+        call = _Call()
+        for attempt in range(2):
+            try:
+                conn = self._ensure_connected()
+                with self._calls_lock:
+                    self._calls[tag] = call
+                with self._send_lock:
+                    conn.send((tag, kind, *args))
+                break
+            except (EOFError, OSError) as e:
+                with self._calls_lock:
+                    self._calls.pop(tag, None)
+                with self._connect_lock:
+                    self._conn = None
+                if attempt:
+                    raise InferenceError(f"Inference server {self.address} unavailable: {e}") from e
+
+        if not call.event.wait(timeout):
+            with self._calls_lock:
+                # Still pending: the slot stays reserved until the late reply (or a disconnect) comes in
+                if self._calls.get(tag) is call:
+                    self._calls[tag] = _Orphan(self.ring, slot)
+            raise InferenceTimeout(f"Inference request timed out after {timeout}s")
+        if call.status != "ok":
+            raise InferenceError(call.payload)
+        return call.payload
+
+    def close(self):
+        """Disconnect and free the frame ring"""
+        with self._connect_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self.ring.close()
+
+    def health(self):
+        return self._call("health", timeout=FRAME_TIMEOUT)
+
+    # --------------------------
+    # YOLOProcessor interface
+    # --------------------------
+    def process_image(self, processed_image, roi_tracker=None):
+        with profiling.stage("inference", metrics.WS_INFERENCE_SECONDS):
+            # Cropped here, so only the region crosses into the ring
+            return roi.tracked_result(roi_tracker, processed_image, self.detect)
+
+    def detect(self, image, imgsz=None):
+        if not FrameRing.fits(image):
+            return self._call("frame_inline", image, imgsz, timeout=FRAME_TIMEOUT)
+
+        slot = self.ring.acquire(timeout=FRAME_TIMEOUT)
+        if slot is None:
+            metrics.WS_FRAMES_DROPPED.labels(reason="busy").inc()
+            return None, None
+        keep_slot = False
+        try:
+            self.ring.write_frame(slot, image)
+            try:
+                self._call("slot", slot, imgsz, slot=slot, timeout=FRAME_TIMEOUT)
+            except InferenceTimeout:
+                # The server may still be using the slot; its late reply releases it
+                keep_slot = True
+                raise
+            punch = self.ring.read_result(slot)
+            box = self.ring.read_box(slot)
+        finally:
+            if not keep_slot:
+                self.ring.release(slot)
+        return (format_punch_result(*punch) if punch else None), box
+
+    def process_frame(self, base64_data, motion_gate=None, roi_tracker=None):
+        try:
+            processed_image = decode_frame(base64_data)
+            if processed_image is None:
+                return None
+            # Gated here, so still frames never leave the web worker
+            return motion.gated_result(motion_gate, processed_image,
+                                       lambda image: self.process_image(image, roi_tracker))
+        except Exception:
+            metrics.WS_FRAMES_DROPPED.labels(reason="error").inc()
+            logger.exception("Error processing frame")
+            return None
+
+    def process_video(self, video_path, frame_skip=3, max_resolution=640, **options):
+        # Same host: the server reads the (preprocessed) temp file directly.
+        # options: other process_video keywords, e.g. a preset's confidence and frame_stride
+        return self._call("video", os.path.abspath(video_path), frame_skip, max_resolution, options)
+
+
+class _Orphan:
+    """Stands in for a timed-out call: releases its frame slot when the reply finally arrives"""
+
+    __slots__ = ("ring", "slot", "status", "payload", "event")
+
+    def __init__(self, ring, slot):
+        self.ring = ring
+        self.slot = slot
+        self.status = self.payload = None
+        self.event = self
+
+    def set(self):
+        if self.slot is not None:
+            self.ring.release(self.slot)
+
+
+def inference_addresses():
+    """Addresses from BRAWLR_INFERENCE_SERVERS (comma separated), empty when running in-process"""
+    return [address.strip() for address in os.getenv("BRAWLR_INFERENCE_SERVERS", "").split(",") if address.strip()]
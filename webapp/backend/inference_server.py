@@ -0,0 +1,222 @@
+"""
+Dedicated inference server process
+
+Holds the only copy of torch + the YOLO model. Web workers (uvicorn
+processes started by serve.py) connect over local IPC and send it decoded
+frames and video jobs instead of loading the model themselves, so memory
+scales with the number of inference servers, not web workers.
+
+Protocol: pickled (tag, kind, *args) requests over a multiprocessing.connection;
+every request gets one (tag, status, payload) reply, status "ok" or "error".
+Frames travel through a shared-memory FrameRing (frame_ring.py), so only
+slot indices go over the socket:
+    (tag, "hello", ring_name, slots)            attach the client's frame ring
+    (tag, "slot", index)                        run YOLO on the frame in slot `index`,
+                                                write the result into the same slot
+    (tag, "frame_inline", ndarray)              fallback for frames that don't fit a slot
+    (tag, "video", path, frame_skip, max_res, options)  -> {"videoType", "punchCounts"} (options: process_video kwargs)
+    (tag, "health")                             -> info
+
+Frames, hello and health are answered on the serving thread, in order.
+Video jobs run on their own threads (up to BRAWLR_INFERENCE_VIDEO_JOBS at
+once) and take the model's predict lock one batch at a time, so live
+frames from every connection are served between their batches.
+
+Usage (normally started by serve.py):
+    BRAWLR_INFERENCE_AUTHKEY=secret python -m webapp.backend.inference_server --address /tmp/brawlr-infer-0.sock
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Listener, wait
+from multiprocessing.shared_memory import SharedMemory
+
+from .frame_ring import FrameRing
+from .logging_config import get_logger, setup_logging
+
+logger = get_logger(__name__)
+
+# Shared secret for the IPC connections (serve.py generates one per deployment)
+AUTHKEY_ENV = "BRAWLR_INFERENCE_AUTHKEY"
+
+# Video jobs run at once; more wait their turn (frames never wait for them)
+VIDEO_JOBS = int(os.getenv("BRAWLR_INFERENCE_VIDEO_JOBS", "1"))
+
+
+def parse_address(address):
+    """'host:port' -> (host, port) for TCP; anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host, int(port))
+    return address
+
+
+def authkey():
+    key = os.getenv(AUTHKEY_ENV)
+    if not key:
+        raise RuntimeError(f"{AUTHKEY_ENV} must be set for inference server IPC")
+    return key.encode("utf-8")
+
+
+def attach_shared_memory(name):
+    """
+    Attach to a segment created by a web worker without taking ownership
+
+    The creating worker unlinks it; the attaching side must not, so it is
+    kept out of this process's resource tracker.
+    """
+    try:
+        return SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class InferenceServer:
+    """
+    Serves one YOLOProcessor to any number of web worker connections
+
+    What this does:
+    - Accepts connections on a background thread
+    - Handles frame, hello and health requests from all connections on one
+      thread, one at a time
+    - Runs video jobs on a small thread pool; YOLOProcessor's predict lock
+      lets frames in between their batches, so an upload never holds up
+      live sessions for its whole length
+    - Keeps each connection's attached frame ring until it disconnects
+    """
+
+    def __init__(self, address, processor, video_jobs=VIDEO_JOBS):
+        self.address = address
+        self.processor = processor
+        self.listener = Listener(parse_address(address), authkey=authkey())
+        self._rings = {}
+        self._new = []
+        self._new_lock = threading.Lock()
+        self._videos = ThreadPoolExecutor(max_workers=max(1, video_jobs), thread_name_prefix="brawlr-infer-video")
+        # Replies come from the serving thread and from video job threads
+        self._send_lock = threading.Lock()
+
+    def info(self):
+        return {
+            "pid": os.getpid(),
+            "address": self.address,
+            "model": self.processor.model_path if self.processor.model is not None else None,
+            "device": self.processor.device,
+            "gate_model": self.processor.cascade.model_path if getattr(self.processor, "cascade", None) else None,
+            "connections": len(self._rings),
+        }
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception:
+                logger.exception("Rejected inference connection")
+                continue
+            with self._new_lock:
+                self._new.append(conn)
+
+    def handle(self, conn, kind, args):
+        if kind == "slot":
+            index, imgsz = args
+            ring = self._rings[conn]
+            ring.write_result(index, *self.processor.detect(ring.read_frame(index), imgsz))
+            return None
+        if kind == "frame_inline":
+            image, imgsz = args
+            return self.processor.detect(image, imgsz)
+        if kind == "hello":
+            name, slots = args
+            self._close_ring(conn)
+            self._rings[conn] = FrameRing.attach(name, slots, shm_factory=attach_shared_memory)
+            return self.info()
+        if kind == "health":
+            return self.info()
+        raise ValueError(f"Unknown request: {kind!r}")
+
+    def _send(self, conn, reply):
+        with self._send_lock:
+            conn.send(reply)
+
+    def _run_video(self, conn, tag, args):
+        path, frame_skip, max_resolution, options = args
+        try:
+            result = self.processor.process_video(path, frame_skip=frame_skip, max_resolution=max_resolution, **options)
+            reply = (tag, "ok", result)
+        except Exception as e:
+            logger.exception("Inference request failed", extra={"request_kind": "video"})
+            reply = (tag, "error", f"{type(e).__name__}: {e}")
+        try:
+            self._send(conn, reply)
+        except (EOFError, OSError):
+            pass  # client gone; the serving thread drops the connection
+
+    def _close_ring(self, conn):
+        ring = self._rings.pop(conn, None)
+        if ring is not None:
+            ring.close()
+
+    def serve_forever(self):
+        threading.Thread(target=self._accept_loop, name="brawlr-infer-accept", daemon=True).start()
+        logger.info("Inference server ready", extra=self.info())
+
+        connections = []
+        while True:
+            with self._new_lock:
+                connections.extend(self._new)
+                self._new.clear()
+
+            # Short timeout so newly accepted connections get picked up
+            for conn in wait(connections, timeout=0.05):
+                try:
+                    tag, kind, *args = conn.recv()
+                except (EOFError, OSError):
+                    connections.remove(conn)
+                    self._close_ring(conn)
+                    conn.close()
+                    continue
+                if kind == "video":
+                    self._videos.submit(self._run_video, conn, tag, args)
+                    continue
+                try:
+                    reply = (tag, "ok", self.handle(conn, kind, args))
+                except Exception as e:
+                    logger.exception("Inference request failed", extra={"request_kind": kind})
+                    reply = (tag, "error", f"{type(e).__name__}: {e}")
+                try:
+                    self._send(conn, reply)
+                except (EOFError, OSError):
+                    connections.remove(conn)
+                    self._close_ring(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Brawlr inference server (holds the YOLO model for web workers)")
+    parser.add_argument("--address", required=True, help="Unix socket path or host:port to listen on")
+    parser.add_argument("--model", default=None, help="Model path (default: models/best_straight_v1.pt)")
+    args = parser.parse_args()
+
+    setup_logging()
+    if os.path.exists(args.address):
+        os.unlink(args.address)  # stale socket from a previous run
+
+    # Imported here: this is the only process type that needs torch
+    from .models import YOLOProcessor
+
+    server = InferenceServer(args.address, YOLOProcessor(model_path=args.model))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.listener.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import contextvars
+import itertools
+import json
+import logging
+import os
+import sys
+import uuid
+
+# Correlation id of the HTTP request / WebSocket session being handled ("-" outside of one)
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_configured = False
+
+
+def new_request_id():
+    """Short random id used when the client did not send X-Request-ID"""
+    return uuid.uuid4().hex[:12]
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to every record"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line
+
+    What this does:
+    - Writes ts, level, logger, request_id and msg
+    - Adds any fields passed with extra={...} as top-level keys
+    - Adds the formatted traceback under "exc" when there is one
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development (BRAWLR_LOG_FORMAT=text)"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RESERVED_ATTRS}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def setup_logging(level=None, fmt=None):
+    """
+    Configure the "brawlr" logger tree once
+
+    Args:
+        level: Log level name (default: BRAWLR_LOG_LEVEL or INFO)
+        fmt: "json" or "text" (default: BRAWLR_LOG_FORMAT or json)
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    level = (level or os.getenv("BRAWLR_LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("BRAWLR_LOG_FORMAT", "json")).lower()
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    root = logging.getLogger("brawlr")
+    root.setLevel(level)
+    root.addHandler(handler)
+    root.propagate = False
+
+
+def get_logger(name):
+    """
+    Logger under the "brawlr" tree, e.g. get_logger(__name__) -> brawlr.webapp.backend.models
+    """
+    return logging.getLogger(f"brawlr.{name}")
+
+
+class SampledLogger:
+    """
+    Logs only every Nth call, for per-frame events
+
+    What this does:
+    - Returns immediately when the level is disabled (no formatting, no counting)
+    - Otherwise logs 1 in `every` calls and tags the record with sample_every
+
+    Args:
+        logger: Logger to write to
+        every: Keep 1 in N events (default BRAWLR_LOG_SAMPLE_EVERY or 30)
+    """
+
+    def __init__(self, logger, every=None):
+        self.logger = logger
+        self.every = max(1, int(every or os.getenv("BRAWLR_LOG_SAMPLE_EVERY", "30")))
+        self._counter = itertools.count()
+
+    def debug(self, msg, *args, **fields):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        if next(self._counter) % self.every:
+            return
+        fields["sample_every"] = self.every
+        self.logger.debug(msg, *args, extra=fields)
+
@@ -0,0 +1,317 @@
+import bisect
+import os
+import threading
+import time
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Per-frame stages on /ws (milliseconds range)
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0)
+
+# Upload job stages and remote calls (seconds range)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Timer:
+    """Context manager that observes elapsed seconds into a histogram child"""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _Metric:
+    """
+    Base class for a metric family
+
+    What this does:
+    - Registers the metric so render() includes it
+    - Keeps one child (value holder) per combination of label values
+    - Metrics without labels have a single child and can be used directly
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+        _REGISTRY.append(self)
+
+    def labels(self, **labels):
+        """Return the child for these label values (created on first use)"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """Yield (suffix, labelvalues, extra_label, value) for every child"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labelvalues, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock", "_function")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function = None
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def set_function(self, function):
+        """Read the total from function() at scrape time (it must never decrease)"""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self._value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (name should end in _total)"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def get(self):
+        return self._default.get()
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield "", key, None, child.get()
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock", "_function")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function = None
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        self._value = float(value)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead of storing it"""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self._value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def get(self):
+        return self._default.get()
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield "", key, None, child.get()
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager: with HIST.time(): ... observes the block's duration"""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets (seconds for all timers here)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=FRAME_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child._counts)
+                total = child._sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", key, ("le", _format_value(bound)), cumulative
+            yield "_count", key, None, cumulative
+            yield "_sum", key, None, total
+
+
+def render():
+    """
+    Render every registered metric in Prometheus text format
+
+    Returns:
+        str: Body for the /metrics endpoint
+    """
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+def _resident_memory_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+# --------------------------
+# Process
+# --------------------------
+PROCESS_CPU_SECONDS = Counter("process_cpu_seconds_total", "Total user and system CPU time spent in seconds.")
+PROCESS_CPU_SECONDS.set_function(time.process_time)
+PROCESS_RESIDENT_MEMORY = Gauge("process_resident_memory_bytes", "Resident memory size in bytes.")
+PROCESS_RESIDENT_MEMORY.set_function(_resident_memory_bytes)
+PROCESS_START_TIME = Gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.")
+PROCESS_START_TIME.set(time.time())
+
+# --------------------------
+# Live camera (/ws)
+# --------------------------
+WS_ACTIVE_SOCKETS = Gauge("brawlr_ws_active_sockets", "Currently open /ws connections.")
+WS_SESSIONS_REFUSED = Counter("brawlr_ws_sessions_refused_total", "/ws sessions refused because the node was at BRAWLR_MAX_SESSIONS.")
+WS_FRAMES_IN = Counter("brawlr_ws_frames_received_total", "Frames received on /ws.")
+WS_FRAMES_OUT = Counter("brawlr_ws_results_sent_total", "Results (punch/no_punch) sent on /ws.")
+WS_FRAMES_DROPPED = Counter("brawlr_ws_frames_dropped_total", "Frames that could not be processed, by reason.",
+                            labelnames=("reason",))
+WS_CAPTURE_CHANGES = Counter("brawlr_ws_capture_changes_total", "Capture level changes sent to clients, by direction.",
+                             labelnames=("direction",))
+MOTION_FRAMES = Counter("brawlr_motion_frames_total", "Frames seen by the motion gate, by path (ws, upload) and decision (inferred, skipped).",
+                       labelnames=("path", "decision"))
+WS_ROI_FRAMES = Counter("brawlr_ws_roi_frames_total", "Live frames run on the full frame vs an ROI crop, by mode.",
+                        labelnames=("mode",))
+WS_DECODE_SECONDS = Histogram("brawlr_ws_decode_seconds", "Base64 JPEG to BGR array decode time.")
+WS_PREPROCESS_SECONDS = Histogram("brawlr_ws_preprocess_seconds", "Frame resize/preprocess time.")
+WS_INFERENCE_SECONDS = Histogram("brawlr_ws_inference_seconds", "YOLO inference + parsing time per frame.")
+WS_SEND_SECONDS = Histogram("brawlr_ws_send_seconds", "Time to send one result over the socket.")
+
+CASCADE_FRAMES = Counter("brawlr_cascade_frames_total", "Frames scored by the cascade gate model, by decision (passed, rejected).",
+                         labelnames=("decision",))
+
+# --------------------------
+# Video upload
+# --------------------------
+UPLOAD_STAGE_SECONDS = Histogram("brawlr_upload_stage_seconds", "Upload job time per stage (write, preprocess, decode, prepare, infer, cluster).",
+                                 labelnames=("stage",), buckets=JOB_BUCKETS)
+UPLOAD_JOBS = Counter("brawlr_upload_jobs_total", "Finished upload jobs by endpoint and status.",
+                      labelnames=("endpoint", "status"))
+SCRATCH_FILES = Counter("brawlr_scratch_files_total", "Temporary upload files created, by backing (ram, disk).",
+                        labelnames=("backing",))
+UPLOADS_REJECTED = Counter("brawlr_uploads_rejected_total", "Uploads refused before processing (too_large, invalid, busy).",
+                           labelnames=("reason",))
+UPLOAD_CHUNKS = Counter("brawlr_upload_chunks_total", "Chunks received by resumable uploads (ok, conflict, error).",
+                        labelnames=("status",))
+
+# --------------------------
+# Firestore
+# --------------------------
+FIRESTORE_TRANSACTION_SECONDS = Histogram("brawlr_firestore_transaction_seconds", "Leaderboard transaction latency by outcome.",
+                                          labelnames=("outcome",), buckets=JOB_BUCKETS)
@@ -1,16 +1,28 @@
 # yolo_processor.py
 import torch
 import sys
-import time
+import threading
 from pathlib import Path
 from ultralytics import YOLO
-from .utils import base64_to_image, format_punch_result, preprocess_image
+from .utils import decode_frame, format_punch_result
+from . import clustering
+from . import cascade
+from . import metrics
+from . import motion
+from . import pipeline
+from . import roi
+from . import video_io
+from . import profiling
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 class YOLOProcessor:
     """
     Unified YOLO Processor:
       - Single-frame detection (process_frame)
-      - Full-video inference + automatic cluster analysis (process_video_auto)
+      - Full-video inference + automatic cluster analysis (process_video)
+      - Optional cascade: a small gate model decides which frames the full model sees
       - Writes inference_log.txt to latest runs/detect/predict* (if available)
       - Returns structured results:
           { "videoType": "home|stock|unknown",
@@ -18,7 +30,7 @@ class YOLOProcessor:
           }
     """
 
-    def __init__(self, model_path=None, confidence_threshold=0.01):
+    def __init__(self, model_path=None, confidence_threshold=0.01, gate_model_path=cascade.GATE_MODEL):
         """
         Initialize YOLO processor and load model
         
@@ -26,57 +38,108 @@ class YOLOProcessor:
         - Finds the model file 
         - Loads the YOLO model
         - Sets up for inference with GPU optimization
+        - Loads the cascade gate model, if one is configured
         
         Args:
             model_path: Optional path to model file
             confidence_threshold: Minimum confidence for detections (default 0.15)
+            gate_model_path: Optional gate model for the cascade (default: BRAWLR_GATE_MODEL)
         """
         if model_path is None:
             current_dir = Path(__file__).parent
             model_path = current_dir / "models" / "best_straight_v1.pt" 
         
-        print(f"Loading YOLO model from: {model_path}")
+        self.model_path = str(model_path)
+        logger.info("Loading YOLO model", extra={"model_path": str(model_path)})
         
         # Detect available device
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        print(f"Using device: {self.device}")
+        logger.info("Using device", extra={"device": self.device})
         
+        self.cascade = None
+        # Live frames and upload analysis threads share the model; one forward pass at a time
+        self._predict_lock = threading.Lock()
         try:
             self.model = YOLO(str(model_path))
             
             # Move model to GPU if available
             if self.device == 'cuda':
                 self.model.to(self.device)
-                print("YOLO model moved to GPU for faster processing!")
+                logger.info("YOLO model moved to GPU for faster processing")
             else:
-                print("GPU not available, using CPU")
-            
-            print("YOLO model loaded successfully!")
+                logger.info("GPU not available, using CPU")
             
             # Set confidence threshold (configurable to catch more detections on stock videos)
             self.confidence_threshold = confidence_threshold
-            print("✅ YOLO model loaded successfully.")
-        except Exception as e:
-            print(f"❌ Error loading YOLO model: {e}")
+            logger.info("YOLO model loaded successfully")
+
+            # Frames the gate rejects never reach the full model
+            self.cascade = cascade.load_gate(gate_model_path, self.device)
+        except Exception:
+            logger.exception("Error loading YOLO model")
             self.model = None
 
     # --------------------------
     # Single-frame processing
     # --------------------------
-    def process_frame(self, base64_data):
+    def process_frame(self, base64_data, motion_gate=None, roi_tracker=None):
+        """
+        Args:
+            base64_data: Data URL sent by the frontend
+            motion_gate: The session's MotionGate; still frames reuse its last result
+            roi_tracker: The session's RoiTracker; YOLO runs on its crop of the frame
+        """
         if self.model is None:
             return None
         try:
-            image_array = base64_to_image(base64_data)
-            if image_array is None:
+            processed_image = decode_frame(base64_data)
+            if processed_image is None:
                 return None
-            processed_image = preprocess_image(image_array)
-            results = self.model.predict(source=processed_image, conf=self.confidence_threshold, verbose=False)
-            return self._parse_results(results)
-        except Exception as e:
-            print(f"Error processing frame: {e}")
+            return motion.gated_result(motion_gate, processed_image,
+                                       lambda image: self.process_image(image, roi_tracker))
+        except Exception:
+            metrics.WS_FRAMES_DROPPED.labels(reason="error").inc()
+            logger.exception("Error processing frame")
             return None
 
+    def process_image(self, processed_image, roi_tracker=None):
+        """
+        Run YOLO on an already decoded + preprocessed frame
+
+        Args:
+            processed_image: BGR numpy array from preprocess_image
+            roi_tracker: RoiTracker to crop with (None = full frame)
+
+        Returns:
+            dict or None: format_punch_result(...) for the best punch, or None
+        """
+        with profiling.stage("inference", metrics.WS_INFERENCE_SECONDS):
+            return roi.tracked_result(roi_tracker, processed_image, self.detect)
+
+    def detect(self, image, imgsz=None):
+        """
+        Run YOLO on one image (a full frame or an ROI crop)
+
+        Used by process_image and by the inference server, which receives
+        decoded frames from web workers instead of base64 strings.
+
+        Args:
+            image: BGR numpy array
+            imgsz: Inference size (None = the model's default, 640)
+
+        Returns:
+            (dict or None, tuple or None): format_punch_result(...) for the best
+            punch, and roi.detection_box(...) of the confident detections.
+            (None, None) when the cascade gate rejects the image.
+        """
+        options = {"imgsz": imgsz} if imgsz else {}
+        with self._predict_lock:
+            if self.cascade is not None and not self.cascade.passes(image):
+                return None, None
+            results = self.model.predict(source=image, conf=self.confidence_threshold, verbose=False, **options)
+        self._record_yolo_speed(results[0])
+        return self._parse_results(results), roi.detection_box(results[0])
+
     def _parse_results(self, results):
         try:
             result = results[0]
@@ -100,25 +163,107 @@ class YOLOProcessor:
                 # Return JSON friendly format
                 return format_punch_result(best_type, best_conf)
             return None
-        except Exception as e:
-            print(f"Error parsing YOLO results: {e}")
+        except Exception:
+            logger.exception("Error parsing YOLO results")
             return None
     
-    def process_video(self, video_path, frame_skip=3, max_resolution=640):
+    def iter_frame_punches(self, video_path, max_resolution=640, motion_gate=None):
+        """
+        Run YOLO over a video and yield the punch type detected in each frame
+
+        What this does:
+        - Runs the staged pipeline (pipeline.FramePipeline): decode, resize +
+          motion gate and batched YOLO each on their own thread, so they
+          overlap with each other and with the caller's clustering
+        - Handles frames as they come instead of collecting a Results object
+          (with its decoded image) for every frame
+        - Still frames (motion gate) repeat the last punch type, and frames
+          the cascade gate rejects count as no punch
+        - Yields the first punch class found in the frame, or None
+
+        Args:
+            video_path: Path to video file
+            max_resolution: Inference image size
+            motion_gate: MotionGate for this video (None or disabled = every frame)
+
+        Yields:
+            str or None: "straight", "hook", "uppercut" or None
+        """
+        yield from pipeline.FramePipeline(self, video_path, max_resolution=max_resolution, motion_gate=motion_gate)
+
+    def frame_punch_types(self, frames, max_resolution=640, confidence=None):
+        """
+        Run YOLO on a batch of decoded frames
+
+        Args:
+            frames: BGR numpy arrays, already no larger than max_resolution
+            max_resolution: Inference image size
+            confidence: Confidence threshold (default: self.confidence_threshold)
+
+        Returns:
+            list: Punch type or None per frame (None for frames the cascade rejects)
+        """
+        punch_types = [None] * len(frames)
+        with self._predict_lock:
+            # The gate scores the whole batch in one forward pass too
+            selected = self.cascade.select(frames) if self.cascade is not None else list(range(len(frames)))
+            if not selected:
+                return punch_types
+            results = self.model.predict(
+                source=[frames[i] for i in selected],  # One batched forward pass
+                conf=confidence or self.confidence_threshold,
+                verbose=False,
+                imgsz=max_resolution,  # Resize to max_resolution for speed
+                device=self.device  # Use detected device (GPU if available)
+            )
+        for i, result in zip(selected, results):
+            self._record_yolo_speed(result)
+            punch_types[i] = self._first_punch_type(result)
+        return punch_types
+
+    def _record_yolo_speed(self, result):
+        """Add ultralytics' own pre/inference/post timings to the active profile (only when profiling)"""
+        if profiling.active():
+            for name, ms in (getattr(result, "speed", None) or {}).items():
+                if ms is not None:
+                    profiling.add_stage_time(f"yolo_{name}", ms / 1000)
+
+    def _first_punch_type(self, result):
+        """Return the first punch class detected in a single Results object, or None"""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return None
+        for class_id in boxes.cls.tolist():
+            class_name = self.model.names[int(class_id)]
+            if class_name in ["straight", "hook", "uppercut"]:
+                return class_name  # Take the first punch detection in this frame
+        return None
+
+    def process_video(self, video_path, frame_skip=3, max_resolution=640, motion_gate=None, batch_size=None,
+                      frame_size=None, expected_size=None, confidence=None, frame_stride=1):
         """
         Process an entire video file and count punches using cluster analysis
         
         What this does:
         - Loads video file
         - Processes every nth frame with YOLO (frame sampling for speed)
+        - Runs YOLO on batches of frames, results kept in frame order
         - Groups consecutive punch detections into clusters
-        - Counts each cluster as 1 punch (not 30+ frames)
-        - Returns total counts
+        - Tells stock footage from home video as it goes (clustering.VideoPunchCounter)
+        - Counts each cluster as 1 punch (not 30+ frames), with that video type's thresholds
+        - Returns the video type and total counts
         
         Args:
             video_path: Path to video file
             frame_skip: Process every nth frame (default 3 for 3x speed)
             max_resolution: Maximum video resolution (default 640px)
+            motion_gate: MotionGate to use (default: a new one configured from the environment)
+            batch_size: Frames per YOLO call (default: BRAWLR_UPLOAD_BATCH, capped by free memory)
+            frame_size: Resize frames to this longest side first (what preprocess_video would do)
+            expected_size: Final size in bytes of a video still being uploaded; it is
+                decoded as the bytes arrive (needs a streamable container and PyAV)
+            confidence: YOLO confidence threshold (default: self.confidence_threshold)
+            frame_stride: Run YOLO on every Nth frame only (presets.Preset.frame_stride)
         
         Returns:
             dict: { "videoType": str, "punchCounts": { "straight": int, "hook": int, "uppercut": int, "total": int } }
@@ -127,120 +272,60 @@ class YOLOProcessor:
             raise Exception("YOLO model not loaded")
         
         try:
-            print(f"Processing video: {video_path}")
+            logger.info("Processing video", extra={"video_path": str(video_path)})
             
             # Adaptive frame skip based on video length
-            import cv2  # type: ignore
-            cap = cv2.VideoCapture(video_path)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
+            with video_io.VideoReader(video_path, expected_size=expected_size) as video:
+                total_frames = video.frame_count
+                fps = int(video.fps)
+                decoder = video.decoder
             video_duration = total_frames / fps if fps > 0 else 0
-            cap.release()
             
             # Adjust frame skip based on video length
-            if video_duration > 60:  # Videos longer than 1 minute
-                adaptive_frame_skip = max(4, frame_skip)  # Skip more frames for long videos
-            elif video_duration > 30:  # Videos 30-60 seconds
-                adaptive_frame_skip = max(3, frame_skip)
-            else:  # Short videos
-                adaptive_frame_skip = frame_skip
+            adaptive_frame_skip = clustering.adaptive_frame_skip(video_duration, frame_skip)
             
-            print(f"Video duration: {video_duration:.1f}s, Total frames: {total_frames}")
-            print(f"Frame skip: {adaptive_frame_skip}, Max resolution: {max_resolution}")
-            
-            # Initialize punch counters
-            punch_counts = {
-                # "jab": 0,
-                # "cross": 0,
-                "straight": 0, # ADDED STRAIGHT
-                "hook": 0,
-                "uppercut": 0,
-                "total": 0
-            }
-            
-            # Process video with YOLO with optimizations
-            results = self.model.predict(
-                source=video_path,
-                conf=self.confidence_threshold,
-                verbose=False,
-                save=False,  # Don't save output video
-                imgsz=max_resolution,  # Resize to max_resolution for speed
-                device=self.device  # Use detected device (GPU if available)
-            )
+            logger.info("Video info", extra={
+                "duration_s": round(video_duration, 1),
+                "total_frames": total_frames,
+                "frame_skip": adaptive_frame_skip,
+                "frame_stride": frame_stride,
+                "max_resolution": max_resolution,
+                "confidence": confidence or self.confidence_threshold,
+                "decoder": decoder,
+            })
             
             # Cluster analysis for punch counting with frame sampling
-            current_cluster_punches = []
-            in_cluster = False
-            frame_count = 0
-            
             # Adjust cluster thresholds based on adaptive frame skip
-            min_cluster_frames = max(3, 8 // adaptive_frame_skip)  # Scale down cluster requirements
-            min_majority_frames = max(2, 6 // adaptive_frame_skip)  # Scale down majority requirements
-            
-            for result in results:
-                boxes = result.boxes
-                frame_has_punch = False
-                frame_punch_type = None
-                
-                if boxes is not None and len(boxes) > 0:
-                    for box in boxes:
-                        class_id = int(box.cls[0])
-                        confidence = float(box.conf[0])
-                        class_name = self.model.names[class_id]
-                        
-                        # Check if this is a punch type
-                        # if class_name in ["jab", "cross", "hook", "uppercut"]:
-                        if class_name in ["straight", "hook", "uppercut"]: # ADDED STRAIGHT
-                            frame_has_punch = True
-                            frame_punch_type = class_name
-                            break  # Take the first punch detection in this frame
-                
-                # Cluster logic (based on count_punches_v5.py)
-                if frame_has_punch and frame_punch_type:
-                    # Add punch to current cluster
-                    current_cluster_punches.append(frame_punch_type)
-                    in_cluster = True
-                    print(f"Frame {frame_count} punch: {frame_punch_type}")
-                    
-                elif in_cluster and len(current_cluster_punches) > 0:
-                    # End of cluster - analyze it
-                    print(f"Cluster ended. Punches: {current_cluster_punches}")
-                    
-                    # Only count if cluster has enough frames (adjusted for frame skip)
-                    if len(current_cluster_punches) >= min_cluster_frames:
-                        # Count frame types in cluster
-                        # jab_frames = current_cluster_punches.count("jab")
-                        # cross_frames = current_cluster_punches.count("cross")
-                        straight_frames = current_cluster_punches.count("straight") # ADDED STRAIGHT
-                        hook_frames = current_cluster_punches.count("hook")
-                        uppercut_frames = current_cluster_punches.count("uppercut")
-
-                        punch_frame_counts = {
-                            "straight": straight_frames,
-                            "hook": hook_frames,
-                            "uppercut": uppercut_frames
-                        }
-                        
-                        majority_punch = max(punch_frame_counts, key=punch_frame_counts.get)
-                        majority_count = punch_frame_counts[majority_punch]
-                        
-                        # Only count if majority has at least 6 frames
-                        if majority_count >= 6:
-                            punch_counts[majority_punch] += 1
-                            punch_counts["total"] += 1
-                            print(f"Counted 1 {majority_punch} punch")
-                        else:
-                            print(f"No punch type had 6+ frames - ignoring cluster")
-                    else:
-                        print(f"Cluster too short ({len(current_cluster_punches)} frames) - ignoring")
-                    
-                    # Reset for next cluster
-                    current_cluster_punches = []
-                    in_cluster = False
-            
-            print(f"Video processing complete. Punch counts: {punch_counts}")
-            return punch_counts
+            counter = clustering.video_counter(adaptive_frame_skip)
+
+            # Decode, resize, inference and clustering (this thread) run as overlapping stages.
+            # Frames flow through bounded queues, so memory stays flat for any video length.
+            gate = motion_gate or motion.MotionGate("upload", enabled=motion.UPLOAD_ENABLED)
+            frames = pipeline.FramePipeline(self, video_path, max_resolution=max_resolution, motion_gate=gate,
+                                            batch_size=batch_size, frame_size=frame_size,
+                                            expected_size=expected_size, confidence=confidence,
+                                            frame_stride=frame_stride)
+            for frame_punch_type in frames:
+                counter.add_frame(frame_punch_type)
+
+            stats = frames.stats()
+            for stage, seconds in stats["busy_s"].items():
+                metrics.UPLOAD_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+                profiling.add_stage_time(stage, seconds)
+
+            punch_counts = counter.result()
+            video_type = counter.detected_type()
+            logger.info("Video processing complete", extra={
+                "video_type": video_type,
+                "punch_counts": punch_counts,
+                "frames": counter.frames_seen,
+                "frames_skipped": gate.skipped,
+                "pipeline": stats,
+            })
+            return {"videoType": video_type, "punchCounts": punch_counts}
             
+        except video_io.UploadStalled:
+            raise  # the caller can resume once the upload grows again
         except Exception as e:
-            print(f"Error processing video: {e}")
+            logger.exception("Error processing video")
             raise Exception(f"Video processing failed: {str(e)}")
@@ -0,0 +1,136 @@
+"""
+Motion gate: skip YOLO on frames where nothing moved
+
+Between combinations the boxer mostly stands still, and YOLO would give
+the same answer as for the last frame it saw. The gate compares each frame
+with the last frame that went through YOLO on a small grayscale thumbnail.
+Only frames with enough changed pixels are sent to the model. Skipped
+frames reuse the last result.
+
+Used per /ws session (process_frame), and per upload (process_video) when
+BRAWLR_MOTION_UPLOAD_GATE=1.
+"""
+import os
+import time
+
+import cv2  # type: ignore
+import numpy as np
+
+from . import metrics
+
+# Set BRAWLR_MOTION_GATE=0 to run YOLO on every frame
+ENABLED = os.getenv("BRAWLR_MOTION_GATE", "1") != "0"
+
+# Uploads are not gated unless BRAWLR_MOTION_UPLOAD_GATE=1. A skipped frame repeats
+# the keyframe's punch type, so a gated punch cluster can grow by up to MAX_SKIP
+# frames. Cluster lengths set the thresholds and the stock/home video type, so turn
+# this on only after `benchmarks.video --motion-check` passes on recorded clips.
+UPLOAD_ENABLED = ENABLED and os.getenv("BRAWLR_MOTION_UPLOAD_GATE", "0") == "1"
+
+# Share of thumbnail pixels that must change for a frame to count as moving
+MIN_CHANGED = float(os.getenv("BRAWLR_MOTION_MIN_CHANGED", "0.01"))
+
+# Run YOLO at least once every this many frames, even on a still scene
+MAX_SKIP = int(os.getenv("BRAWLR_MOTION_MAX_SKIP", "15"))
+
+# Thumbnail width, and the gray-level change that counts a pixel as changed
+# (well above JPEG/sensor noise once the frame is area-downsampled)
+THUMB_WIDTH = 64
+PIXEL_DELTA = 15
+
+
+def thumbnail(image):
+    """Small grayscale copy of a BGR frame, used for differencing"""
+    height, width = image.shape[:2]
+    thumb_height = max(1, round(height * THUMB_WIDTH / width))
+    small = cv2.resize(image, (THUMB_WIDTH, thumb_height), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small
+
+
+class MotionGate:
+    """
+    Decides, frame by frame, whether YOLO needs to run
+
+    What this does:
+    - Keeps a thumbnail of the last frame YOLO ran on (the keyframe)
+    - should_infer() is False when under MIN_CHANGED of the thumbnail
+      differs from the keyframe, for at most MAX_SKIP frames in a row
+    - Counts inferred/skipped frames in brawlr_motion_frames_total{path}
+    - last_result holds whatever the caller got for the keyframe
+
+    Args:
+        path: "ws" or "upload" (metric label)
+        enabled: False runs YOLO on every frame (still counts frames)
+        min_changed: Share of changed pixels that counts as motion
+        max_skip: Longest run of skipped frames
+    """
+
+    def __init__(self, path, enabled=ENABLED, min_changed=MIN_CHANGED, max_skip=MAX_SKIP):
+        self.enabled = enabled
+        self.min_changed = min_changed
+        self.max_skip = max_skip
+        self.frames = 0
+        self.skipped = 0
+        self.last_result = None
+        self._keyframe = None
+        self._run = 0
+        self._inferred_counter = metrics.MOTION_FRAMES.labels(path=path, decision="inferred")
+        self._skipped_counter = metrics.MOTION_FRAMES.labels(path=path, decision="skipped")
+
+    def should_infer(self, image):
+        """
+        Args:
+            image: BGR frame (any size; the same size for the whole session)
+
+        Returns:
+            bool: True if YOLO should run on this frame
+        """
+        self.frames += 1
+        if self.enabled:
+            thumb = thumbnail(image)
+            if (
+                self._keyframe is not None
+                and self._keyframe.shape == thumb.shape
+                and self._run < self.max_skip
+                and self._changed(thumb) < self.min_changed
+            ):
+                self._run += 1
+                self.skipped += 1
+                self._skipped_counter.inc()
+                return False
+            self._keyframe = thumb
+        self._run = 0
+        self._inferred_counter.inc()
+        return True
+
+    def _changed(self, thumb):
+        diff = cv2.absdiff(thumb, self._keyframe)
+        return np.count_nonzero(diff > PIXEL_DELTA) / diff.size
+
+    def skip_rate(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+
+def gated_result(gate, image, infer):
+    """
+    Run infer(image) unless the gate says the frame is still
+
+    Args:
+        gate: MotionGate for the session, or None to always run
+        image: Preprocessed BGR frame
+        infer: Callable returning a format_punch_result(...) dict or None
+
+    Returns:
+        dict or None: The new result, or a copy of the last one (with a fresh
+        timestamp) for a skipped frame
+    """
+    if gate is None:
+        return infer(image)
+    if gate.should_infer(image):
+        gate.last_result = infer(image)
+        return gate.last_result
+    if gate.last_result is None:
+        return None
+    return {**gate.last_result, "timestamp": int(time.time() * 1000)}
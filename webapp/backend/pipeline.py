@@ -0,0 +1,327 @@
+"""
+Staged upload analysis pipeline
+
+process_video used to decode, resize, run YOLO and cluster each frame
+back to back on one thread. Here each step is a stage on its own thread,
+and bounded queues link the stages:
+
+    decode  ->  prepare  ->  infer  ->  cluster (the consuming thread)
+                resize to     batches of
+                max_resolution batch_size
+                + motion gate  frames
+
+While YOLO works on one batch, the next frames are decoded and
+prepared. Wall time approaches the time of the slowest stage instead of
+the sum of all stages. Each stage records its busy time (the time it is
+not waiting on a queue). stats() reports busy time and utilization per
+stage, so the bottleneck is visible.
+
+The infer stage waits until it has batch_size frames for YOLO (or the
+video ends) and makes one batched call for them. Results are put back in
+frame order. batch_size is BRAWLR_UPLOAD_BATCH, capped by
+fit_batch_size() so that one batch fits in the memory the device has free.
+
+Configured with:
+    BRAWLR_UPLOAD_BATCH     frames per YOLO call (default 8)
+    BRAWLR_BATCH_FRAME_MB   memory one 640x640 frame needs in a batch (default 64)
+    BRAWLR_PIPELINE_QUEUE   frames buffered between stages (default 16)
+"""
+import contextvars
+import os
+import queue
+import threading
+import time
+
+import cv2  # type: ignore
+
+from . import profiling
+from . import scratch
+from . import video_io
+
+BATCH_SIZE = int(os.getenv("BRAWLR_UPLOAD_BATCH", "8"))
+QUEUE_DEPTH = int(os.getenv("BRAWLR_PIPELINE_QUEUE", "16"))
+
+# Inference memory per frame at 640x640 (input, activations, outputs), scaled by imgsz^2
+FRAME_MB = float(os.getenv("BRAWLR_BATCH_FRAME_MB", "64"))
+
+# Share of free memory one batch may use
+_MEMORY_SHARE = 0.25
+
+STAGES = ("decode", "prepare", "infer", "cluster")
+
+# Marks the end of a stage's output
+_END = object()
+
+# How often a blocked stage checks whether the pipeline was stopped
+_POLL_SECONDS = 0.1
+
+
+class _Failed:
+    """Carries a stage's exception downstream to the consumer"""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+class _Stopped(Exception):
+    """The consumer went away; upstream stages just exit"""
+
+
+def fit_frame(frame, max_resolution):
+    """
+    Resize so the longest side is at most max_resolution
+
+    Same size and interpolation as ultralytics' letterbox, so YOLO only has
+    to pad the frame and sees the same pixels as before.
+    """
+    height, width = frame.shape[:2]
+    scale = min(max_resolution / height, max_resolution / width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+
+
+def available_memory_bytes(device):
+    """
+    Free memory on the inference device
+
+    Returns:
+        int or None: Free CUDA memory, or MemAvailable from /proc/meminfo on
+        CPU; None if it can't be read
+    """
+    if device == "cuda":
+        import torch
+        free, _ = torch.cuda.mem_get_info()
+        return free
+    return scratch.available_memory_bytes()
+
+
+def fit_batch_size(requested, device, max_resolution=640):
+    """
+    Largest batch up to `requested` that fits in a quarter of free memory
+
+    Args:
+        requested: Configured batch size
+        device: "cuda" or "cpu"
+        max_resolution: Inference size (memory per frame scales with its square)
+
+    Returns:
+        int: Batch size, at least 1
+    """
+    requested = max(1, requested)
+    free = available_memory_bytes(device)
+    if free is None:
+        return requested
+    per_frame = FRAME_MB * 1024 * 1024 * (max_resolution / 640) ** 2
+    return max(1, min(requested, int(free * _MEMORY_SHARE // per_frame)))
+
+
+class FramePipeline:
+    """
+    Per-frame punch types of one video, produced by the staged pipeline
+
+    What this does:
+    - Iterating starts the decode, prepare and infer threads and yields the
+      punch type (or None) of every frame, in order
+    - Frames the motion gate calls still, and frames between frame_stride
+      samples, get the last inferred frame's punch type
+    - Time the consumer spends between frames is recorded as "cluster"
+    - Stopping iteration early, or an error in any stage, stops every thread
+
+    Args:
+        processor: YOLOProcessor (uses frame_punch_types for the infer stage)
+        video_path: Video file
+        max_resolution: Longest side fed to YOLO
+        motion_gate: MotionGate or None
+        batch_size: Frames per YOLO call (default: BRAWLR_UPLOAD_BATCH, capped by free memory)
+        depth: Queue size between stages
+        frame_size: Longest side frames are resized to before inference (default: max_resolution)
+        expected_size: Final size of a video still being uploaded (decoded as it grows)
+        confidence: YOLO confidence threshold (default: the processor's)
+        frame_stride: YOLO runs on every Nth frame; frames in between repeat its result
+    """
+
+    def __init__(self, processor, video_path, max_resolution=640, motion_gate=None,
+                 batch_size=None, depth=QUEUE_DEPTH, frame_size=None, expected_size=None,
+                 confidence=None, frame_stride=1):
+        self.processor = processor
+        self.video_path = video_path
+        self.max_resolution = max_resolution
+        self.frame_size = min(frame_size or max_resolution, max_resolution)
+        self.expected_size = expected_size
+        self.confidence = confidence
+        self.frame_stride = max(1, frame_stride)
+        self.motion_gate = motion_gate
+        if batch_size is None:
+            batch_size = fit_batch_size(BATCH_SIZE, processor.device, max_resolution)
+        self.batch_size = max(1, batch_size)
+        self.depth = max(1, depth)
+        self.decoder = None
+        self.frames = 0
+        self.batches = 0
+        self.batched_frames = 0
+        self.busy = dict.fromkeys(STAGES, 0.0)
+        self.wall_seconds = 0.0
+        self._stop = threading.Event()
+
+    # --------------------------
+    # Queue helpers (every blocking call wakes up to check for stop)
+    # --------------------------
+    def _put(self, q, item):
+        while True:
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    raise _Stopped()
+
+    def _get(self, q):
+        while True:
+            try:
+                item = q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise _Stopped()
+                continue
+            if isinstance(item, _Failed):
+                raise item.error
+            return item
+
+    def _run_stage(self, body, output):
+        try:
+            with profiling.sampled_thread():  # a profiled upload samples the stage threads too
+                body()
+        except _Stopped:
+            return
+        except BaseException as e:
+            try:
+                self._put(output, _Failed(e))
+            except _Stopped:
+                pass
+
+    # --------------------------
+    # Stages
+    # --------------------------
+    def _decode(self, video, output):
+        frames = video.frames()
+        while True:
+            start = time.perf_counter()
+            frame = next(frames, _END)
+            self.busy["decode"] += time.perf_counter() - start
+            self._put(output, frame)
+            if frame is _END:
+                return
+
+    def _prepare(self, source, output):
+        gate = self.motion_gate
+        index = 0
+        while True:
+            frame = self._get(source)
+            if frame is _END:
+                self._put(output, _END)
+                return
+            start = time.perf_counter()
+            sampled = index % self.frame_stride == 0
+            index += 1
+            if not sampled:
+                self._put(output, (None, False))
+                continue
+            frame = fit_frame(frame, self.frame_size)
+            run = gate is None or gate.should_infer(frame)
+            self.busy["prepare"] += time.perf_counter() - start
+            # A skipped frame only needs its place in the order, not its pixels
+            self._put(output, (frame if run else None, run))
+
+    def _infer(self, source, output):
+        last = None  # punch type of the most recent frame YOLO ran on
+        done = False
+        while not done:
+            # Collect frames until batch_size of them need YOLO (skipped frames ride along)
+            batch = []
+            pending = 0
+            while pending < self.batch_size:
+                item = self._get(source)
+                if item is _END:
+                    done = True
+                    break
+                batch.append(item)
+                pending += item[1]
+
+            start = time.perf_counter()
+            to_run = [frame for frame, run in batch if run]
+            results = iter(self.processor.frame_punch_types(to_run, self.max_resolution, self.confidence) if to_run else ())
+            punch_types = []
+            for _, run in batch:
+                if run:
+                    last = next(results)
+                punch_types.append(last)
+            if to_run:
+                self.batches += 1
+                self.batched_frames += len(to_run)
+            self.busy["infer"] += time.perf_counter() - start
+
+            for punch_type in punch_types:
+                self._put(output, punch_type)
+        self._put(output, _END)
+
+    # --------------------------
+    # Consumer
+    # --------------------------
+    def __iter__(self):
+        decoded = queue.Queue(self.depth)
+        prepared = queue.Queue(self.depth)
+        labelled = queue.Queue(self.depth)
+
+        start = time.perf_counter()
+        with video_io.VideoReader(self.video_path, expected_size=self.expected_size) as video:
+            self.decoder = video.decoder
+            threads = []
+            for name, body, output in (
+                ("decode", lambda: self._decode(video, decoded), decoded),
+                ("prepare", lambda: self._prepare(decoded, prepared), prepared),
+                ("infer", lambda: self._infer(prepared, labelled), labelled),
+            ):
+                # Each thread gets its own copy of the request context (request id, active profile)
+                context = contextvars.copy_context()
+                thread = threading.Thread(target=context.run, args=(self._run_stage, body, output),
+                                          name=f"brawlr-upload-{name}", daemon=True)
+                thread.start()
+                threads.append(thread)
+            try:
+                while True:
+                    punch_type = self._get(labelled)
+                    if punch_type is _END:
+                        break
+                    self.frames += 1
+                    handed_off = time.perf_counter()
+                    yield punch_type
+                    self.busy["cluster"] += time.perf_counter() - handed_off
+            finally:
+                self._stop.set()
+                for thread in threads:
+                    thread.join()
+                self.wall_seconds = time.perf_counter() - start
+
+    def stats(self):
+        """
+        Returns:
+            dict: frames, batch size and batches, wall_s, the decoder used,
+            per-stage busy seconds and utilization (busy / wall), and the
+            bottleneck stage
+        """
+        wall = self.wall_seconds
+        utilization = {name: round(self.busy[name] / wall, 3) if wall else 0.0 for name in STAGES}
+        return {
+            "frames": self.frames,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "mean_batch": round(self.batched_frames / self.batches, 2) if self.batches else 0.0,
+            "decoder": self.decoder,
+            "wall_s": round(wall, 3),
+            "busy_s": {name: round(seconds, 3) for name, seconds in self.busy.items()},
+            "utilization": utilization,
+            "bottleneck": max(STAGES, key=lambda name: self.busy[name]),
+        }
@@ -0,0 +1,128 @@
+"""
+Named operating points ("presets") for upload analysis
+
+A preset fixes the knobs that trade speed for accuracy on uploads:
+
+    preprocess_resolution  longest side preprocess_video resizes to
+    imgsz                  YOLO inference size (process_video max_resolution)
+    confidence             YOLO confidence threshold
+    frame_stride           run YOLO on every Nth frame; the frames between
+                           repeat its result (1 = every frame)
+    frame_skip             cluster thresholds (see clustering.adaptive_frame_skip)
+
+Upload endpoints take ?preset=<name> (/upload-video, POST /uploads), and
+/upload-video-fast uses "fast". ("profile" is already taken: ?profile=1
+captures a request profile.)
+
+The built-in presets are hand-picked: "accurate" is what uploads always
+used. `python -m webapp.backend.benchmarks.tune --write-presets` sweeps
+these knobs over the evaluation clips and writes the chosen points to
+BRAWLR_PRESETS, which overrides and extends the built-ins.
+
+Configured with:
+    BRAWLR_PRESETS          JSON file of tuned presets (default webapp/backend/presets.json)
+    BRAWLR_UPLOAD_PRESET    preset used when a request names none (default accurate)
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+PRESETS_PATH = Path(os.getenv("BRAWLR_PRESETS", str(Path(__file__).parent / "presets.json")))
+DEFAULT_PRESET = os.getenv("BRAWLR_UPLOAD_PRESET", "accurate")
+
+
+class Preset:
+    """One operating point (see the module docstring for the fields)"""
+
+    __slots__ = ("name", "preprocess_resolution", "imgsz", "confidence", "frame_stride", "frame_skip")
+
+    def __init__(self, name, preprocess_resolution=480, imgsz=640, confidence=0.01, frame_stride=1, frame_skip=3):
+        self.name = name
+        self.preprocess_resolution = int(preprocess_resolution)
+        self.imgsz = int(imgsz)
+        self.confidence = float(confidence)
+        self.frame_stride = max(1, int(frame_stride))
+        self.frame_skip = max(1, int(frame_skip))
+
+    def process_options(self):
+        """Keyword arguments for process_video"""
+        return {
+            "frame_skip": self.frame_skip,
+            "max_resolution": self.imgsz,
+            "confidence": self.confidence,
+            "frame_stride": self.frame_stride,
+        }
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__ if key != "name"}
+
+    @classmethod
+    def from_dict(cls, name, values):
+        return cls(name, **{key: values[key] for key in cls.__slots__ if key in values})
+
+
+BUILTIN = {
+    # What uploads did before presets existed
+    "accurate": Preset("accurate", preprocess_resolution=480, imgsz=640, confidence=0.01, frame_stride=1, frame_skip=3),
+    # Hand-picked until tuned: smaller inference size and YOLO on every other frame
+    "fast": Preset("fast", preprocess_resolution=480, imgsz=480, confidence=0.01, frame_stride=2, frame_skip=3),
+}
+
+
+def load_presets(path=PRESETS_PATH):
+    """
+    Built-in presets, overridden and extended by the tuned presets file
+
+    Returns:
+        dict: name -> Preset
+    """
+    presets = dict(BUILTIN)
+    try:
+        data = json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return presets
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read presets, using built-ins", extra={"path": str(path), "error": str(e)})
+        return presets
+    for name, values in data.get("presets", {}).items():
+        try:
+            presets[name] = Preset.from_dict(name, values)
+        except (TypeError, ValueError) as e:
+            logger.warning("Invalid preset ignored", extra={"preset": name, "error": str(e)})
+    return presets
+
+
+def write_presets(presets, path=PRESETS_PATH, source=None):
+    """
+    Save presets (only the given ones; built-ins not listed stay as they are)
+
+    Args:
+        presets: Iterable of Preset
+        path: Output file
+        source: Where they came from (e.g. the tune parameters), stored alongside
+    """
+    data = {
+        "created_at": time.time(),
+        "source": source,
+        "presets": {preset.name: preset.to_dict() for preset in presets},
+    }
+    Path(path).write_text(json.dumps(data, indent=2) + "\n")
+
+
+PRESETS = load_presets()
+
+
+def get_preset(name=None):
+    """
+    Args:
+        name: Preset name (None = BRAWLR_UPLOAD_PRESET)
+
+    Raises:
+        KeyError: No preset with that name
+    """
+    return PRESETS[name or DEFAULT_PRESET]
@@ -0,0 +1,355 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import hmac
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .logging_config import get_logger, new_request_id, request_id_var
+
+logger = get_logger(__name__)
+
+# Profiling is only available when an admin token is configured
+ADMIN_TOKEN = os.getenv("BRAWLR_ADMIN_TOKEN")
+
+# Where profile artifacts are written
+PROFILE_DIR = Path(os.getenv("BRAWLR_PROFILE_DIR", str(Path(tempfile.gettempdir()) / "brawlr-profiles")))
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = float(os.getenv("BRAWLR_PROFILE_INTERVAL", "0.005"))
+
+# Profile of the request/session currently running in this context (None = profiling off)
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+
+_PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def is_admin(token):
+    """True if token matches BRAWLR_ADMIN_TOKEN (always False when none is configured)"""
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(str(token), ADMIN_TOKEN)
+
+
+class _NullStage:
+    """Shared no-op context manager used when nothing needs timing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _StageTimer:
+    __slots__ = ("_profile", "_name", "_histogram", "_start")
+
+    def __init__(self, profile, name, histogram):
+        self._profile = profile
+        self._name = name
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self._profile.add_stage_time(self._name, elapsed)
+        if self._histogram is not None:
+            self._histogram.observe(elapsed)
+        return False
+
+
+def stage(name, histogram=None):
+    """
+    Time a block as a named stage
+
+    What this does:
+    - Profiling off: just the histogram timer (or a shared no-op), nothing else
+    - Profiling on: also adds the time to the active profile's per-stage timers
+
+    Args:
+        name: Stage name, e.g. "decode", "preprocess", "infer"
+        histogram: Optional metrics histogram (or labelled child) to observe into
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        return histogram.time() if histogram is not None else _NULL_STAGE
+    return _StageTimer(profile, name, histogram)
+
+
+def add_stage_time(name, seconds):
+    """Add already-measured time to the active profile (no-op when profiling is off)"""
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add_stage_time(name, seconds)
+
+
+def active():
+    """True while the current request/session is being profiled"""
+    return _active_profile.get() is not None
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of a set of threads at a fixed interval
+
+    What this does:
+    - A daemon thread reads sys._current_frames() for each registered thread
+    - Each sample is folded into a "collapsed" stack line
+      (thread name;outermost;...;innermost)
+    - Threads can join and leave while it runs (add_thread/remove_thread),
+      e.g. the upload pipeline's stage threads
+    - Output works with flamegraph.pl and speedscope
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.threads = {}  # ident -> thread name
+        self.thread_names = set()  # every thread sampled at some point
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="brawlr-profiler", daemon=True)
+        self.add_thread(thread_id)
+
+    def add_thread(self, ident=None):
+        """Sample this thread too (default: the calling thread)"""
+        if ident is None:
+            ident, name = threading.get_ident(), threading.current_thread().name
+        else:
+            name = next((t.name for t in threading.enumerate() if t.ident == ident), str(ident))
+        self.threads[ident] = name
+        self.thread_names.add(name)
+
+    def remove_thread(self, ident=None):
+        self.threads.pop(threading.get_ident() if ident is None else ident, None)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            current = sys._current_frames()
+            for ident, name in list(self.threads.items()):
+                frame = current.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+@contextlib.contextmanager
+def sampled_thread():
+    """
+    Add the calling thread to the active profile's stack samples while the block runs
+
+    For worker threads doing a profiled request's work (pipeline stages,
+    asyncio.to_thread calls). They must run in a copy of the request's
+    context. No-op when profiling is off.
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.add_thread()
+    try:
+        yield
+    finally:
+        profile.remove_thread()
+
+
+class RequestProfile:
+    """
+    Sampling profile + per-stage timers for one request or /ws session
+
+    The thread that activates it is sampled, plus any worker thread that
+    runs the request's work inside sampled_thread(). Activated on the event
+    loop (every async endpoint and /ws), the loop thread's samples are
+    whole-loop samples; the summary says so ("event_loop_samples").
+
+    Usage:
+        profile = RequestProfile("upload", label=filename)
+        token = profile.activate()
+        try:
+            ...  # code using profiling.stage(...)
+        finally:
+            profile.deactivate(token)
+            artifact = profile.save()
+    """
+
+    def __init__(self, kind, label=""):
+        self.kind = kind
+        self.label = label
+        self.request_id = request_id_var.get()
+        self.started_at = time.time()
+        # The request id can come from a client header, so only safe ones go into the file name
+        suffix = self.request_id if _PROFILE_ID_RE.match(self.request_id) and len(self.request_id) <= 64 else new_request_id()
+        self.id = f"{kind}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}-{suffix}"
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._profiler = SamplingProfiler()
+        self._start = None
+        self.duration = 0.0
+        self.event_loop = False
+
+    def add_stage_time(self, name, seconds):
+        with self._lock:
+            total, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + seconds, count + 1)
+
+    def add_thread(self):
+        """Sample the calling thread too (see sampled_thread())"""
+        self._profiler.add_thread()
+
+    def remove_thread(self):
+        self._profiler.remove_thread()
+
+    def activate(self):
+        """Start sampling the current thread and make this the active profile"""
+        self._start = time.perf_counter()
+        try:
+            asyncio.get_running_loop()
+            # The loop thread runs every session and request on this worker, not just this one
+            self.event_loop = True
+        except RuntimeError:
+            self.event_loop = False
+        self._profiler.start()
+        return _active_profile.set(self)
+
+    def deactivate(self, token):
+        self._profiler.stop()
+        self.duration = time.perf_counter() - self._start
+        _active_profile.reset(token)
+
+    def save(self):
+        """
+        Write <id>.json (summary + stage timers) and <id>.collapsed (stack samples)
+
+        Returns:
+            dict: { "id": str, "url": str } pointing at the download endpoint
+        """
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        summary = {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "duration_s": round(self.duration, 4),
+            "sample_interval_s": self._profiler.interval,
+            "samples": self._profiler.samples,
+            "threads": sorted(self._profiler.thread_names),
+            # True: samples of the event-loop thread include whatever else the loop ran meanwhile
+            # (other /ws sessions and requests), not only this request
+            "event_loop_samples": self.event_loop,
+            "stages": {
+                name: {"total_s": round(total, 4), "count": count, "mean_ms": round(total / count * 1000, 3)}
+                for name, (total, count) in sorted(self.stages.items(), key=lambda item: -item[1][0])
+            },
+            "top_stacks": [
+                {"stack": stack, "samples": count}
+                for stack, count in self._profiler.stacks.most_common(20)
+            ],
+        }
+        with open(PROFILE_DIR / f"{self.id}.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        with open(PROFILE_DIR / f"{self.id}.collapsed", "w", encoding="utf-8") as f:
+            f.write(self._profiler.collapsed())
+        logger.info("Profile saved", extra={"profile_id": self.id, "samples": self._profiler.samples})
+        return {"id": self.id, "url": f"/debug/profiles/{self.id}"}
+
+
+def artifact_path(profile_id, fmt="json"):
+    """
+    Path of a saved artifact, or None if it does not exist
+
+    Args:
+        profile_id: Id returned by RequestProfile.save()
+        fmt: "json" (summary) or "collapsed" (flamegraph input)
+    """
+    if not _PROFILE_ID_RE.match(profile_id) or fmt not in ("json", "collapsed"):
+        return None
+    path = PROFILE_DIR / f"{profile_id}.{fmt}"
+    return path if path.exists() else None
+
+
+def list_artifacts():
+    """Ids of saved profiles, newest first"""
+    if not PROFILE_DIR.exists():
+        return []
+    paths = sorted(PROFILE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [p.stem for p in paths]
+
+
+class WebSocketProfiling:
+    """
+    Admin toggle for profiling /ws sessions (POST /debug/profile)
+
+    While enabled, each new session is profiled for up to max_frames frames
+    and its artifact is saved when the limit is hit or the socket closes.
+
+    The setting is a small file in PROFILE_DIR rather than process memory,
+    so a POST to any serve.py web worker applies to all of them. It stays
+    set across restarts until it is turned off.
+    """
+
+    DEFAULTS = {"enabled": False, "max_frames": 300}
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else PROFILE_DIR / "ws-profiling.toggle"
+
+    def settings(self):
+        """Current {"enabled", "max_frames"} (read at each new session, so never stale)"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return {**self.DEFAULTS, **json.load(f)}
+        except (OSError, ValueError):
+            return dict(self.DEFAULTS)
+
+    @property
+    def enabled(self):
+        return bool(self.settings()["enabled"])
+
+    @property
+    def max_frames(self):
+        return int(self.settings()["max_frames"])
+
+    def configure(self, enabled, max_frames=None):
+        settings = {"enabled": bool(enabled), "max_frames": int(max_frames) if max_frames else self.max_frames}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Written whole and renamed: a worker reading it never sees half a file
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(settings, f)
+        os.replace(tmp, self.path)
+        return settings
+
+
+ws_profiling = WebSocketProfiling()
@@ -0,0 +1,183 @@
+"""
+Region-of-interest tracking for live frames
+
+Punches only happen around the boxer, but a camera frame is mostly
+background. After a confident detection, the tracker keeps a smoothed box
+around recent detections. The next frames are cropped to that box plus a
+margin, and YOLO runs on the crop at an image size matching the crop
+(rounded up to the model stride). The boxer keeps the same pixel
+resolution, and the model processes fewer pixels.
+
+The tracker falls back to the full frame:
+- every BRAWLR_ROI_REFRESH_EVERY frames, so someone stepping into view is found
+- after MAX_MISSES crops in a row with no detection above MIN_CONFIDENCE
+- when the crop would cover most of the frame anyway
+"""
+import math
+import os
+
+from . import metrics
+
+# Set BRAWLR_ROI=0 to always run on the full frame
+ENABLED = os.getenv("BRAWLR_ROI", "1") != "0"
+
+# Run on the full frame at least once every this many frames
+REFRESH_EVERY = int(os.getenv("BRAWLR_ROI_REFRESH_EVERY", "30"))
+
+# Detections below this confidence neither place nor keep the region
+MIN_CONFIDENCE = 0.25
+
+# Crops in a row without a confident detection before going back to full frames
+MAX_MISSES = 3
+
+# Margin added on each side, as a share of the box's width/height
+MARGIN = 0.5
+
+# Smallest crop side in px, and the largest share of the frame worth cropping to
+MIN_SIDE = 224
+MAX_AREA = 0.6
+
+# YOLO input sizes must be multiples of the model stride
+STRIDE = 32
+
+# Weight of the newest box in the smoothed region
+_SMOOTHING = 0.5
+
+
+def detection_box(result):
+    """
+    Union of the confident detections in one ultralytics Results object
+
+    Returns:
+        (x1, y1, x2, y2) in image pixels, or None if nothing reached MIN_CONFIDENCE
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return None
+    confident = [xyxy for xyxy, conf in zip(boxes.xyxy.tolist(), boxes.conf.tolist()) if conf >= MIN_CONFIDENCE]
+    if not confident:
+        return None
+    return (
+        min(b[0] for b in confident),
+        min(b[1] for b in confident),
+        max(b[2] for b in confident),
+        max(b[3] for b in confident),
+    )
+
+
+class RoiTracker:
+    """
+    Per-session crop region for live frames
+
+    What this does:
+    - crop() returns the part of the frame YOLO should see and the matching
+      inference size (None = full frame at the model's default size)
+    - update() takes the detection box found in that crop, moves it back to
+      frame coordinates and blends it into the smoothed region
+    - Counts full vs cropped frames in brawlr_ws_roi_frames_total{mode}
+
+    Args:
+        enabled: False always returns the full frame
+        refresh_every: Frames between forced full-frame passes
+    """
+
+    def __init__(self, enabled=ENABLED, refresh_every=REFRESH_EVERY):
+        self.enabled = enabled
+        self.refresh_every = refresh_every
+        self.box = None  # smoothed region, frame coordinates
+        self._latest = None  # newest detection box, frame coordinates
+        self._misses = 0
+        self._since_full = 0
+        self._full_counter = metrics.WS_ROI_FRAMES.labels(mode="full")
+        self._crop_counter = metrics.WS_ROI_FRAMES.labels(mode="crop")
+
+    def crop(self, image):
+        """
+        Args:
+            image: Preprocessed BGR frame
+
+        Returns:
+            (region, (x offset, y offset), imgsz or None)
+        """
+        height, width = image.shape[:2]
+        region = self._region(width, height)
+        if region is None:
+            self._since_full = 0
+            self._full_counter.inc()
+            return image, (0, 0), None
+        self._since_full += 1
+        self._crop_counter.inc()
+        x1, y1, x2, y2 = region
+        imgsz = min(max(width, height), math.ceil(max(x2 - x1, y2 - y1) / STRIDE) * STRIDE)
+        return image[y1:y2, x1:x2], (x1, y1), imgsz
+
+    def _region(self, width, height):
+        if not self.enabled or self.box is None or self._since_full >= self.refresh_every - 1:
+            return None
+        # Cover the smoothed region and the newest detection, so a fast move isn't cut off
+        x1, y1, x2, y2 = (
+            min(self.box[0], self._latest[0]),
+            min(self.box[1], self._latest[1]),
+            max(self.box[2], self._latest[2]),
+            max(self.box[3], self._latest[3]),
+        )
+        x1, x2 = _expand(x1, x2, width)
+        y1, y2 = _expand(y1, y2, height)
+        if (x2 - x1) * (y2 - y1) > MAX_AREA * width * height:
+            return None
+        return x1, y1, x2, y2
+
+    def update(self, box, offset=(0, 0)):
+        """
+        Args:
+            box: detection_box(...) of the crop returned by crop(), or None
+            offset: Offset returned by crop()
+        """
+        if box is None:
+            self._misses += 1
+            if self._misses >= MAX_MISSES:
+                self.box = self._latest = None
+            return
+        self._misses = 0
+        dx, dy = offset
+        box = (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy)
+        self._latest = box
+        if self.box is None:
+            self.box = box
+        else:
+            self.box = tuple((1 - _SMOOTHING) * old + _SMOOTHING * new for old, new in zip(self.box, box))
+
+
+def _expand(start, end, limit):
+    """Add MARGIN on both sides, grow to MIN_SIDE and clamp to [0, limit]"""
+    margin = (end - start) * MARGIN
+    start, end = start - margin, end + margin
+    if end - start < MIN_SIDE:
+        center = (start + end) / 2
+        start, end = center - MIN_SIDE / 2, center + MIN_SIDE / 2
+    # Shift back inside the frame before clamping, so the crop keeps its size near edges
+    if start < 0:
+        start, end = 0, end - start
+    if end > limit:
+        start, end = start - (end - limit), limit
+    return max(0, int(start)), min(limit, int(math.ceil(end)))
+
+
+def tracked_result(tracker, image, detect):
+    """
+    Run detect on the tracker's crop of image and feed the detection back
+
+    Args:
+        tracker: The session's RoiTracker, or None for the full frame
+        image: Preprocessed BGR frame
+        detect: Callable (image, imgsz) -> (format_punch_result(...) or None, detection box or None)
+
+    Returns:
+        dict or None: The punch result
+    """
+    if tracker is None:
+        return detect(image, None)[0]
+    region, offset, imgsz = tracker.crop(image)
+    result, box = detect(region, imgsz)
+    tracker.update(box, offset)
+    return result
@@ -0,0 +1,278 @@
+"""
+Session-affine router for /ws across several backend nodes
+
+A camera's frames must keep reaching the node that holds its session
+state, so the router:
+- issues a session id on connect (or reuses ?session=<id> from a reconnecting client)
+- remembers session -> node for BRAWLR_ROUTER_AFFINITY_TTL seconds after the socket closes
+- sends new sessions to the accepting node with the most headroom,
+  based on each node's GET /capacity (polled every second)
+- refuses a new session with close code 1013 when no node is accepting
+
+Two ways to use it:
+- Proxy: clients connect to ws://router/ws and frames are relayed
+- Redirect: GET /route returns the node's /ws URL plus the session id,
+  and the client connects to the node directly
+
+Usage (from repo root):
+    # Route across nodes that are already running
+    python -m webapp.backend.router --nodes http://127.0.0.1:8001 http://127.0.0.1:8002 --port 8000
+
+    # Local test: spawn 3 single-process nodes on ports 8001-8003, at most 4 sessions each
+    python -m webapp.backend.router --spawn 3 --max-sessions 4 --port 8000
+    python -m webapp.backend.benchmarks.loadgen run --url ws://127.0.0.1:8000/ws --clients 4 8 16
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+import uvicorn
+import websockets
+from fastapi import FastAPI, HTTPException, WebSocket
+
+from .logging_config import get_logger, new_request_id, request_id_var, setup_logging
+from .sessions import valid_session_id
+
+logger = get_logger(__name__)
+
+# How long a closed session keeps its node (reconnects within this window go back to it)
+AFFINITY_TTL = float(os.getenv("BRAWLR_ROUTER_AFFINITY_TTL", "300"))
+
+# Seconds between /capacity polls
+POLL_INTERVAL = float(os.getenv("BRAWLR_ROUTER_POLL_INTERVAL", "1.0"))
+
+
+class Node:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        parsed = urlparse(self.base_url)
+        self.ws_url = f"{'wss' if parsed.scheme == 'https' else 'ws'}://{parsed.netloc}/ws"
+        self.capacity = None  # last /capacity body, None while unreachable
+        self.pending = 0  # sessions routed here since the last poll
+
+    def headroom(self):
+        """Sort key for new sessions: lower is better, None = don't send anything"""
+        if not self.capacity or not self.capacity.get("accepting"):
+            return None
+        active = self.capacity["active_sessions"] + self.pending
+        limit = self.capacity.get("max_sessions") or 0
+        if limit and active >= limit:
+            return None
+        fill = active / limit if limit else 0.0
+        return (max(fill, self.capacity.get("utilization", 0.0)), self.capacity.get("queue_depth", 0), active)
+
+    def snapshot(self):
+        return {"url": self.base_url, "capacity": self.capacity, "pending": self.pending}
+
+
+class Router:
+    """
+    Session -> node affinity plus capacity-aware placement
+
+    Args:
+        node_urls: Base HTTP URLs of the backend nodes
+    """
+
+    def __init__(self, node_urls):
+        self.nodes = [Node(url) for url in node_urls]
+        self._affinity = {}  # session id -> (node, expires_at or None while connected)
+
+    def _fetch_capacity(self, node):
+        try:
+            with urllib.request.urlopen(f"{node.base_url}/capacity", timeout=2) as response:
+                return json.loads(response.read())
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+
+    async def poll_forever(self):
+        while True:
+            await self.poll()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def poll(self):
+        capacities = await asyncio.gather(*(asyncio.to_thread(self._fetch_capacity, node) for node in self.nodes))
+        for node, capacity in zip(self.nodes, capacities):
+            node.capacity = capacity
+            node.pending = 0
+        now = time.monotonic()
+        for session_id, (_, expires_at) in list(self._affinity.items()):
+            if expires_at is not None and expires_at < now:
+                del self._affinity[session_id]
+
+    def place(self, session_id, exclude=()):
+        """
+        Pick the node for a session
+
+        Returns:
+            Node or None: The session's existing node if it has one, otherwise
+            the accepting node with the most headroom (None if all are full)
+        """
+        entry = self._affinity.get(session_id)
+        if entry and entry[0] not in exclude and entry[0].capacity is not None:
+            return entry[0]
+        candidates = [(node.headroom(), index, node) for index, node in enumerate(self.nodes) if node not in exclude]
+        candidates = [c for c in candidates if c[0] is not None]
+        if not candidates:
+            return None
+        node = min(candidates)[2]
+        node.pending += 1
+        return node
+
+    def bind(self, session_id, node):
+        self._affinity[session_id] = (node, None)
+
+    def release(self, session_id):
+        entry = self._affinity.get(session_id)
+        if entry:
+            self._affinity[session_id] = (entry[0], time.monotonic() + AFFINITY_TTL)
+
+
+def create_app(node_urls):
+    router = Router(node_urls)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await router.poll()
+        poller = asyncio.create_task(router.poll_forever())
+        yield
+        poller.cancel()
+
+    app = FastAPI(title="Brawlr Router", lifespan=lifespan)
+
+    @app.get("/capacity")
+    async def capacity():
+        return {"nodes": [node.snapshot() for node in router.nodes], "sessions": len(router._affinity)}
+
+    @app.get("/route")
+    async def route(session: str = None):
+        """Redirect mode: which node a (new or returning) session should connect to"""
+        session_id = session if valid_session_id(session) else new_request_id()
+        node = router.place(session_id)
+        if node is None:
+            raise HTTPException(status_code=503, detail="All nodes are at capacity")
+        router.bind(session_id, node)
+        router.release(session_id)  # the router never sees this socket close
+        return {"sessionId": session_id, "url": f"{node.ws_url}?session={session_id}"}
+
+    @app.websocket("/ws")
+    async def proxy(websocket: WebSocket):
+        await websocket.accept()
+        session_id = websocket.query_params.get("session")
+        if not valid_session_id(session_id):
+            session_id = new_request_id()
+        request_id_var.set(session_id)
+
+        # Try nodes in order of headroom; a node can still refuse if its capacity changed since the last poll
+        tried = []
+        upstream = None
+        while upstream is None:
+            node = router.place(session_id, exclude=tried)
+            if node is None:
+                logger.warning("No node accepting new sessions")
+                await websocket.send_text(json.dumps({"type": "error", "code": "capacity"}))
+                await websocket.close(code=1013)
+                return
+            tried.append(node)
+            try:
+                candidate = await websockets.connect(f"{node.ws_url}?session={session_id}", max_size=None)
+                first = await candidate.recv()
+            except (OSError, websockets.exceptions.WebSocketException):
+                logger.warning("Node unreachable", extra={"node": node.base_url})
+                continue
+            if json.loads(first).get("type") == "error":
+                await candidate.close()
+                continue
+            upstream = candidate
+
+        router.bind(session_id, node)
+        logger.info("Session routed", extra={"node": node.base_url})
+        await websocket.send_text(first)
+
+        async def client_to_node():
+            while True:
+                await upstream.send(await websocket.receive_text())
+
+        async def node_to_client():
+            async for message in upstream:
+                await websocket.send_text(message)
+
+        # Relay until either side goes away
+        tasks = [asyncio.create_task(client_to_node()), asyncio.create_task(node_to_client())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream.close()
+            router.release(session_id)
+            logger.info("Session closed", extra={"node": node.base_url})
+
+    app.state.router = router
+    return app
+
+
+def spawn_nodes(count, base_port, max_sessions):
+    """Start `count` single-process backend nodes on localhost for local testing"""
+    processes = []
+    for index in range(count):
+        port = base_port + index
+        env = dict(os.environ, BRAWLR_NODE_ID=f"node-{index + 1}", BRAWLR_MAX_SESSIONS=str(max_sessions))
+        cmd = [sys.executable, "-m", "uvicorn", "webapp.backend.app:app", "--host", "127.0.0.1", "--port", str(port)]
+        processes.append(subprocess.Popen(cmd, env=env))
+    return processes, [f"http://127.0.0.1:{base_port + index}" for index in range(count)]
+
+
+def wait_for_nodes(urls, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                urllib.request.urlopen(f"{url}/capacity", timeout=2).close()
+                break
+            except (urllib.error.URLError, OSError):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Node {url} not ready after {timeout}s")
+                time.sleep(0.5)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Session-affine /ws router across backend nodes")
+    nodes = parser.add_mutually_exclusive_group(required=True)
+    nodes.add_argument("--nodes", nargs="+", help="Base URLs of running nodes, e.g. http://10.0.0.5:8000")
+    nodes.add_argument("--spawn", type=int, help="Start this many local nodes (for testing)")
+    parser.add_argument("--node-base-port", type=int, default=8001, help="First port for --spawn nodes")
+    parser.add_argument("--max-sessions", type=int, default=0, help="BRAWLR_MAX_SESSIONS for --spawn nodes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging()
+
+    processes = []
+    node_urls = args.nodes
+    if args.spawn:
+        processes, node_urls = spawn_nodes(args.spawn, args.node_base_port, args.max_sessions)
+    try:
+        wait_for_nodes(node_urls)
+        uvicorn.run(create_app(node_urls), host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Scratch space for temporary video files
+
+An upload writes two short-lived files: the raw upload and the
+preprocess_video re-encode. Both used to go to the default tempdir (disk)
+and were deleted a moment later. Here they go to a RAM-backed directory
+(tmpfs, e.g. /dev/shm) when there is room:
+
+- The RAM share is capped at BRAWLR_SCRATCH_MB in total (all files there,
+  from every worker on the node)
+- A file only goes to RAM if the host keeps BRAWLR_SCRATCH_MIN_FREE_MB of
+  memory available afterwards; otherwise it goes to the disk directory
+- Readers map files with mmap (video_io decodes RAM scratch files from
+  the mapping)
+- ScratchFile is a context manager: the file is deleted on exit, error or not
+- Files left behind by a crashed worker are removed after BRAWLR_SCRATCH_TTL
+
+Configured with:
+    BRAWLR_SCRATCH_RAM_DIR       tmpfs directory (default /dev/shm/brawlr-scratch, "" = disk only)
+    BRAWLR_SCRATCH_DIR           disk fallback (default <tmp>/brawlr-scratch)
+    BRAWLR_SCRATCH_MB            total size of RAM scratch files (default 1024)
+    BRAWLR_SCRATCH_MIN_FREE_MB   memory to leave available (default 2048)
+    BRAWLR_SCRATCH_TTL           seconds before an orphaned file is removed (default 3600)
+"""
+import mmap
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from . import metrics
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_DEFAULT_RAM_DIR = "/dev/shm/brawlr-scratch" if os.path.isdir("/dev/shm") else ""
+
+RAM_DIR = os.getenv("BRAWLR_SCRATCH_RAM_DIR", _DEFAULT_RAM_DIR)
+DISK_DIR = os.getenv("BRAWLR_SCRATCH_DIR", str(Path(tempfile.gettempdir()) / "brawlr-scratch"))
+MAX_RAM_BYTES = int(float(os.getenv("BRAWLR_SCRATCH_MB", "1024")) * 1024 * 1024)
+MIN_FREE_BYTES = int(float(os.getenv("BRAWLR_SCRATCH_MIN_FREE_MB", "2048")) * 1024 * 1024)
+SCRATCH_TTL = float(os.getenv("BRAWLR_SCRATCH_TTL", "3600"))
+
+# Seconds between sweeps for orphaned files
+_SWEEP_INTERVAL = 60.0
+
+
+def available_memory_bytes():
+    """MemAvailable from /proc/meminfo (free pages elsewhere), or None if it can't be read"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _reserved_bytes(entry):
+    # Files are named "<size_hint>_<random><suffix>", so a file that is still
+    # being written counts at its expected size, in every worker
+    size = entry.stat().st_size
+    hint = entry.name.split("_", 1)[0]
+    return max(size, int(hint)) if hint.isdigit() else size
+
+
+def map_file(path):
+    """Read-only mmap of a file (empty files can't be mapped: ValueError)"""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ScratchFile:
+    """
+    One temporary file in scratch space, deleted when the with-block exits
+
+    Attributes:
+        path: File path (str), for writers and decoders that take a path
+        in_ram: True if the file is on tmpfs
+        size_hint: Bytes reserved for it in the RAM budget
+    """
+
+    __slots__ = ("path", "in_ram", "size_hint")
+
+    def __init__(self, path, in_ram, size_hint):
+        self.path = path
+        self.in_ram = in_ram
+        self.size_hint = size_hint
+
+    def map(self):
+        """Read-only mmap of the file (close it before the file is released)"""
+        return map_file(self.path)
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def release(self):
+        """Delete the file (safe to call more than once)"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class ScratchSpace:
+    """
+    Hands out scratch files in RAM when the budget allows, on disk otherwise
+
+    Args:
+        ram_dir: tmpfs directory ("" or None = disk only)
+        disk_dir: Disk fallback directory
+        max_ram_bytes: Total size of files in ram_dir
+        min_free_bytes: Memory that must stay available after a RAM file
+        ttl: Age after which files nobody deleted are swept
+    """
+
+    def __init__(self, ram_dir=RAM_DIR, disk_dir=DISK_DIR, max_ram_bytes=MAX_RAM_BYTES,
+                 min_free_bytes=MIN_FREE_BYTES, ttl=SCRATCH_TTL):
+        self.ram_dir = Path(ram_dir) if ram_dir else None
+        self.disk_dir = Path(disk_dir)
+        self.max_ram_bytes = max_ram_bytes
+        self.min_free_bytes = min_free_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def ram_bytes(self):
+        """RAM budget in use: files in the RAM directory (all workers), at least their size hint"""
+        if self.ram_dir is None:
+            return 0
+        total = 0
+        try:
+            for entry in os.scandir(self.ram_dir):
+                try:
+                    total += _reserved_bytes(entry)
+                except FileNotFoundError:
+                    pass
+        except FileNotFoundError:
+            pass
+        return total
+
+    def _fits_in_ram(self, size_hint):
+        if self.ram_dir is None or size_hint > self.max_ram_bytes:
+            return False
+        if self.ram_bytes() + size_hint > self.max_ram_bytes:
+            return False
+        available = available_memory_bytes()
+        return available is None or available - size_hint >= self.min_free_bytes
+
+    def file(self, suffix="", size_hint=0):
+        """
+        Create an empty scratch file
+
+        Args:
+            suffix: File extension, e.g. ".mp4" (decoders may use it as a hint)
+            size_hint: Expected size in bytes; decides whether it fits in RAM
+
+        Returns:
+            ScratchFile: Use it as a context manager so the file is always deleted
+        """
+        self._sweep()
+        with self._lock:
+            in_ram = self._fits_in_ram(size_hint)
+            directory = self.ram_dir if in_ram else self.disk_dir
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                fd, path = tempfile.mkstemp(suffix=suffix, prefix=f"{size_hint}_", dir=directory)
+            except OSError:
+                if not in_ram:
+                    raise
+                logger.warning("RAM scratch unavailable, using disk", extra={"scratch_dir": str(directory)})
+                in_ram = False
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+                fd, path = tempfile.mkstemp(suffix=suffix, prefix=f"{size_hint}_", dir=self.disk_dir)
+            os.close(fd)
+        metrics.SCRATCH_FILES.labels(backing="ram" if in_ram else "disk").inc()
+        return ScratchFile(path, in_ram, size_hint)
+
+    def in_ram(self, path):
+        """True if path is a file in the RAM directory"""
+        return self.ram_dir is not None and Path(path).parent == self.ram_dir
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < _SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for directory in (self.ram_dir, self.disk_dir):
+            if directory is None or not directory.exists():
+                continue
+            for entry in os.scandir(directory):
+                try:
+                    if now - entry.stat().st_mtime > self.ttl:
+                        os.unlink(entry.path)
+                        logger.info("Orphaned scratch file removed", extra={"path": entry.path})
+                except FileNotFoundError:
+                    pass
+
+
+# Shared by every upload in this worker
+space = ScratchSpace()
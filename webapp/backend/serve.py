@@ -0,0 +1,114 @@
+"""
+Multi-worker launcher: N inference servers + M uvicorn web workers
+
+What this does:
+- Starts N inference server processes (each loads torch + the model once)
+- Waits until every one of them accepts connections
+- Runs uvicorn with M workers; each worker forwards inference to one of the
+  servers over a Unix socket, with frame pixels in shared memory
+- Gives the web workers one node id (BRAWLR_NODE_ID); /ws session limits
+  and /capacity are counted across them (sessions.py)
+- Stops the inference servers when uvicorn exits
+
+Memory grows with N (inference servers), not M (web workers).
+
+Usage (from repo root):
+    python -m webapp.backend.serve --inference-servers 1 --web-workers 4 --port 8000
+    python -m webapp.backend.serve --inference-servers 2 --web-workers 8 --host 0.0.0.0
+
+Single-process mode (uvicorn webapp.backend.app:app) is unchanged.
+"""
+import argparse
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.connection import Client
+from pathlib import Path
+
+import uvicorn
+
+from .inference_server import AUTHKEY_ENV, authkey, parse_address
+from .logging_config import get_logger, setup_logging
+
+logger = get_logger(__name__)
+
+
+def wait_until_ready(address, process, timeout):
+    """Poll the inference server until it accepts an authenticated connection"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Inference server {address} exited with code {process.returncode}")
+        try:
+            conn = Client(parse_address(address), authkey=authkey())
+        except (OSError, EOFError):
+            time.sleep(0.25)
+            continue
+        conn.send((0, "health"))
+        conn.recv()
+        conn.close()
+        return
+    raise TimeoutError(f"Inference server {address} not ready after {timeout}s")
+
+
+def start_inference_servers(count, socket_dir, model, ready_timeout):
+    processes = []
+    for index in range(count):
+        address = str(Path(socket_dir) / f"brawlr-infer-{index}.sock")
+        cmd = [sys.executable, "-m", "webapp.backend.inference_server", "--address", address]
+        if model:
+            cmd += ["--model", model]
+        processes.append((address, subprocess.Popen(cmd)))
+    for address, process in processes:
+        wait_until_ready(address, process, ready_timeout)
+        logger.info("Inference server up", extra={"address": address, "pid": process.pid})
+    return processes
+
+
+def stop_inference_servers(processes):
+    for _, process in processes:
+        process.terminate()
+    for address, process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if os.path.exists(address):
+            os.unlink(address)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the backend with dedicated inference server processes")
+    parser.add_argument("--inference-servers", type=int, default=1, help="Processes holding the model (N)")
+    parser.add_argument("--web-workers", type=int, default=os.cpu_count() or 1, help="Uvicorn workers (M)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default=None, help="Model path (default: models/best_straight_v1.pt)")
+    parser.add_argument("--socket-dir", default=tempfile.gettempdir(), help="Where the Unix sockets are created")
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="Seconds to wait for model loading")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging()
+
+    # Children (inference servers and uvicorn workers) inherit these
+    os.environ.setdefault(AUTHKEY_ENV, secrets.token_hex(16))
+    # One node id for all web workers, so /capacity and router affinity see one node
+    os.environ.setdefault("BRAWLR_NODE_ID", f"{socket.gethostname()}-{os.getpid()}")
+    processes = start_inference_servers(args.inference_servers, args.socket_dir, args.model, args.ready_timeout)
+    os.environ["BRAWLR_INFERENCE_SERVERS"] = ",".join(address for address, _ in processes)
+
+    try:
+        uvicorn.run("webapp.backend.app:app", host=args.host, port=args.port, workers=args.web_workers)
+    finally:
+        stop_inference_servers(processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Live camera sessions on this node, and the capacity signal the router uses
+
+Every /ws connection is a session with an id. The id comes from the
+client (?session=..., set by the router or by a reconnecting client) or
+is issued here. The registry caps concurrent sessions at
+BRAWLR_MAX_SESSIONS and reports load for GET /capacity.
+
+A node can run several uvicorn workers (serve.py), so the figures are
+node-wide: each session holds an flock()ed slot file, like
+upload_guard's upload slots, and each worker publishes its queue depth,
+latencies and busy time to a small file that /capacity adds up.
+
+Configured with:
+    BRAWLR_NODE_ID         node name for the router (default: hostname-pid of serve.py, or of the single process)
+    BRAWLR_MAX_SESSIONS    concurrent /ws sessions per node (default 0 = unlimited)
+    BRAWLR_SESSION_STATE   directory for the node's slot and worker files (default <tmp>/brawlr-sessions)
+"""
+import collections
+import fcntl
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .logging_config import new_request_id
+
+# Identifies this node to the router. serve.py sets it for its workers, so they all report the same id.
+NODE_ID = os.getenv("BRAWLR_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# Concurrent /ws sessions this node accepts (0 = unlimited)
+MAX_SESSIONS = int(os.getenv("BRAWLR_MAX_SESSIONS", "0"))
+
+# Slot and worker files live in <STATE_ROOT>/<node id>
+STATE_ROOT = Path(os.getenv("BRAWLR_SESSION_STATE", str(Path(tempfile.gettempdir()) / "brawlr-sessions")))
+
+# Window for the utilization figure, in seconds
+UTILIZATION_WINDOW = 10.0
+
+# Seconds between a worker's stats file updates while frames keep coming,
+# and how long the node-wide utilization is reused for capture decisions
+PUBLISH_INTERVAL = 0.5
+
+# Client-supplied ids end up in logs and file names
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Weight of the newest sample in the per-session latency average
+_EWMA_ALPHA = 0.2
+
+
+def valid_session_id(session_id):
+    """True if a client-supplied session id is safe to reuse"""
+    return bool(session_id) and bool(_SESSION_ID_RE.match(session_id))
+
+
+class Session:
+    """One /ws connection"""
+
+    __slots__ = ("id", "started_at", "frames", "in_flight", "inference_ms", "slot")
+
+    def __init__(self, session_id, slot=None):
+        self.id = session_id
+        self.started_at = time.time()
+        self.frames = 0
+        self.in_flight = 0
+        self.inference_ms = None  # moving average of per-frame processing time
+        self.slot = slot  # flock()ed slot file, held while the session is open
+
+    def record_frame(self, seconds):
+        ms = seconds * 1000
+        self.frames += 1
+        self.inference_ms = ms if self.inference_ms is None else (1 - _EWMA_ALPHA) * self.inference_ms + _EWMA_ALPHA * ms
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SessionRegistry:
+    """
+    Tracks sessions and how busy this node is, across all its web workers
+
+    What this does:
+    - open() claims a free slot file (session-<n>.lock) and refuses new
+      sessions once max_sessions slots are held on the node; a crashed
+      worker's slots free themselves
+    - begin_frame()/end_frame() track frames in flight (queue depth) and
+      per-session processing latency; each worker publishes them, with its
+      busy seconds per second, to worker-<pid>.json
+    - capacity() summarises the node for the router: active sessions, queue
+      depth, utilization (share of the last 10 s spent processing frames)
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, node_id=NODE_ID, state_dir=None):
+        self.max_sessions = max_sessions
+        self.node_id = node_id
+        self.state_dir = Path(state_dir) if state_dir else STATE_ROOT / re.sub(r"[^A-Za-z0-9_.-]", "_", node_id)
+        self._sessions = set()  # this worker's; a reconnect can briefly overlap its old socket, so not keyed by id
+        self._busy = collections.defaultdict(float)  # whole second (wall clock) -> seconds spent processing frames
+        self._lock = threading.Lock()
+        self._published_at = 0.0
+        self._utilization = (0.0, 0.0)  # (node-wide value, monotonic time it was read)
+        self._worker_file = self.state_dir / f"worker-{os.getpid()}.json"
+
+    def open(self, session_id=None):
+        """
+        Register a new session
+
+        Args:
+            session_id: Id requested by the client/router (a new one is issued if None or malformed)
+
+        Returns:
+            Session or None: None when the node is full
+        """
+        slot = self._claim_slot()
+        if slot is None:
+            return None
+        if not valid_session_id(session_id):
+            session_id = new_request_id()
+        session = Session(session_id, slot)
+        with self._lock:
+            self._sessions.add(session)
+        self._publish(force=True)
+        return session
+
+    def close(self, session):
+        with self._lock:
+            if session not in self._sessions:
+                return
+            self._sessions.discard(session)
+        fcntl.flock(session.slot, fcntl.LOCK_UN)
+        session.slot.close()
+        self._publish(force=True)
+
+    def _claim_slot(self):
+        """Lock the lowest free slot file (None when max_sessions are held)"""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        index = 0
+        while not self.max_sessions or index < self.max_sessions:
+            f = open(self.state_dir / f"session-{index}.lock", "w")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                index += 1
+                continue
+            return f
+        return None
+
+    def active_sessions(self):
+        """Sessions open on the node (held slot files)"""
+        active = 0
+        for path in self.state_dir.glob("session-*.lock"):
+            try:
+                with open(path, "r") as f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        active += 1
+            except OSError:
+                continue
+        return active
+
+    def begin_frame(self, session):
+        session.in_flight += 1
+
+    def end_frame(self, session, seconds):
+        session.in_flight -= 1
+        session.record_frame(seconds)
+        with self._lock:
+            self._busy[int(time.time())] += seconds
+            idle = not any(s.in_flight for s in self._sessions)
+        # Publish when idle too, so other workers never keep seeing a frame that already finished
+        self._publish(force=idle)
+
+    def _local_stats(self):
+        now = time.time()
+        with self._lock:
+            for second in [second for second in self._busy if second < now - UTILIZATION_WINDOW - 1]:
+                del self._busy[second]
+            sessions = list(self._sessions)
+            busy = dict(self._busy)
+        return {
+            "pid": os.getpid(),
+            "queue_depth": sum(s.in_flight for s in sessions),
+            "latencies_ms": [s.inference_ms for s in sessions if s.inference_ms is not None],
+            "busy": busy,
+        }
+
+    def _publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._published_at < PUBLISH_INTERVAL:
+            return
+        self._published_at = now
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self._worker_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._local_stats(), f)
+        os.replace(tmp, self._worker_file)
+
+    def _worker_stats(self):
+        """This worker's live stats plus the last published stats of the node's other live workers"""
+        stats = [self._local_stats()]
+        for path in self.state_dir.glob("worker-*.json"):
+            if path == self._worker_file:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    worker = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not _pid_alive(worker["pid"]):
+                path.unlink(missing_ok=True)  # worker exited without cleaning up
+                continue
+            stats.append(worker)
+        return stats
+
+    @staticmethod
+    def _busy_share(stats):
+        cutoff = time.time() - UTILIZATION_WINDOW
+        busy = sum(seconds for worker in stats for second, seconds in worker["busy"].items() if float(second) >= cutoff)
+        return min(1.0, max(0.0, busy) / UTILIZATION_WINDOW)
+
+    def utilization(self):
+        """Node-wide share of the last 10 s spent processing frames (re-read at most every PUBLISH_INTERVAL)"""
+        value, read_at = self._utilization
+        now = time.monotonic()
+        if now - read_at >= PUBLISH_INTERVAL:
+            value = self._busy_share(self._worker_stats())
+            self._utilization = (value, now)
+        return value
+
+    def capacity(self):
+        """
+        Returns:
+            dict: Body of GET /capacity
+        """
+        stats = self._worker_stats()
+        active = self.active_sessions()
+        latencies = [ms for worker in stats for ms in worker["latencies_ms"]]
+        return {
+            "node_id": self.node_id,
+            "active_sessions": active,
+            "max_sessions": self.max_sessions,
+            "accepting": not self.max_sessions or active < self.max_sessions,
+            "queue_depth": sum(worker["queue_depth"] for worker in stats),
+            "utilization": round(self._busy_share(stats), 4),
+            "inference_ms_mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        }
+
+
+registry = SessionRegistry()
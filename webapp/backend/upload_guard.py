@@ -0,0 +1,266 @@
+"""
+Size-bounded, streamed video uploads and a node-wide upload limit
+
+FastAPI's UploadFile spools the whole multipart body to a temporary file
+before the endpoint runs, so a size check in the endpoint comes after the
+disk I/O it meant to prevent. The endpoint then copied the spooled file
+into its own temp file. Here the body is parsed as it arrives:
+
+- A Content-Length over the limit is refused before reading the body
+- The video part is written straight to the scratch file the analysis
+  reads (scratch.py: RAM when there is room), and the upload is cut off
+  as soon as it passes max_bytes
+- Non-video and oversized form fields are refused
+
+upload_slot() caps uploads being received at once on this node (across
+all web workers, using lock files), so disk writes can't saturate it.
+
+Configured with:
+    BRAWLR_MAX_UPLOADS     uploads received at once per node (default 4, 0 = no limit)
+    BRAWLR_UPLOAD_WAIT     seconds an upload waits for a free slot before 503 (default 30)
+    BRAWLR_UPLOAD_LOCKS    directory of the slot lock files (default <tmp>/brawlr-upload-slots)
+"""
+import asyncio
+import contextlib
+import fcntl
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from . import scratch
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MAX_UPLOADS = int(os.getenv("BRAWLR_MAX_UPLOADS", "4"))
+SLOT_WAIT = float(os.getenv("BRAWLR_UPLOAD_WAIT", "30"))
+LOCK_DIR = Path(os.getenv("BRAWLR_UPLOAD_LOCKS", str(Path(tempfile.gettempdir()) / "brawlr-upload-slots")))
+
+# Multipart boundaries and part headers on top of the file itself
+FORM_OVERHEAD = 64 * 1024
+
+# Largest non-file form field (e.g. username)
+MAX_FIELD_BYTES = 4 * 1024
+
+# How often a waiting upload retries the slot locks
+_SLOT_POLL_SECONDS = 0.1
+
+# Extensions kept on scratch files (the client's filename is not trusted)
+_SUFFIX_RE = re.compile(r"^\.[A-Za-z0-9]{1,8}$")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+def file_suffix(filename):
+    """Extension of a client-supplied filename for the scratch file, e.g. ".mp4" ("" if it isn't a plain one)"""
+    suffix = Path(filename).suffix
+    return suffix if _SUFFIX_RE.match(suffix) else ""
+
+
+class UploadBusy(Exception):
+    """No upload slot freed up within BRAWLR_UPLOAD_WAIT seconds"""
+
+
+class ReceivedVideo:
+    """
+    A video part written to a scratch file, plus the other form fields
+
+    Use it as a context manager: the file is deleted on exit.
+    """
+
+    __slots__ = ("scratch", "filename", "content_type", "size", "fields")
+
+    def __init__(self, scratch_file, filename, content_type, size, fields):
+        self.scratch = scratch_file
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.fields = fields
+
+    @property
+    def path(self):
+        return self.scratch.path
+
+    def discard(self):
+        self.scratch.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.discard()
+        return False
+
+
+class _FormWriter:
+    """python-multipart callbacks: the video field goes to a temp file, small fields to memory"""
+
+    def __init__(self, field, max_bytes, size_hint):
+        self.field = field
+        self.max_bytes = max_bytes
+        self.size_hint = size_hint
+        self.fields = {}
+        self.video = None
+        self._file = None
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name = None
+        self._value = None
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _header_field_data(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("latin-1")
+        filename = options.get(b"filename")
+        if self._name != self.field:
+            self._value = bytearray()
+            return
+        if self.video is not None:
+            raise InvalidUpload(f"More than one {self.field} file")
+        content_type = self._headers.get(b"content-type", b"").decode("latin-1")
+        if not content_type.startswith("video/"):
+            raise InvalidUpload("File must be a video")
+        filename = filename.decode("utf-8", "replace") if filename else "upload"
+        # The analysis reads this file directly: no second copy
+        scratch_file = scratch.space.file(suffix=file_suffix(filename), size_hint=self.size_hint)
+        self.video = ReceivedVideo(scratch_file, filename, content_type, 0, self.fields)
+        self._file = open(scratch_file.path, "wb")
+
+    def _part_data(self, data, start, end):
+        if self._file is None:
+            self._value += data[start:end]
+            if len(self._value) > MAX_FIELD_BYTES:
+                raise InvalidUpload(f"Form field {self._name} too large")
+            return
+        self.video.size += end - start
+        if self.video.size > self.max_bytes:
+            raise UploadTooLarge(f"File too large (max {self.max_bytes // (1024 * 1024)}MB)")
+        self._file.write(data[start:end])
+
+    def _part_end(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self._name:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+        if self.video is not None:
+            self.video.discard()
+
+
+async def receive_video(request, max_bytes, field="video"):
+    """
+    Stream a multipart/form-data upload to disk, enforcing the size limit as it arrives
+
+    Args:
+        request: Starlette request (body not read yet)
+        max_bytes: Largest accepted video
+        field: Form field holding the video
+
+    Returns:
+        ReceivedVideo: path, filename, content_type, size and the other
+        form fields (e.g. {"username": ...}); use it in a with-block so the
+        file is deleted
+
+    Raises:
+        UploadTooLarge: Content-Length or the video part is over max_bytes
+        InvalidUpload: Not a multipart form, no video part, not a video
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("Expected a multipart/form-data upload")
+
+    length = request.headers.get("content-length")
+    length = int(length) if length and length.isdigit() else None
+    if length is not None and length > max_bytes + FORM_OVERHEAD:
+        raise UploadTooLarge(f"File too large (max {max_bytes // (1024 * 1024)}MB)")
+
+    form = _FormWriter(field, max_bytes, size_hint=min(length or max_bytes, max_bytes))
+    parser = MultipartParser(boundary, form.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except BaseException:
+        form.abort()
+        raise
+    if form.video is None:
+        raise InvalidUpload(f"No {field} file in the form")
+    return form.video
+
+
+@contextlib.asynccontextmanager
+async def upload_slot(max_uploads=MAX_UPLOADS, wait=SLOT_WAIT):
+    """
+    Hold one of max_uploads node-wide upload slots while receiving a body
+
+    Each slot is an flock()ed file, so the limit holds across web workers
+    and a crashed worker's slots free themselves.
+
+    Raises:
+        UploadBusy: No slot came free within `wait` seconds
+    """
+    if max_uploads <= 0:
+        yield
+        return
+    LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + wait
+    while True:
+        for slot in range(max_uploads):
+            f = open(LOCK_DIR / f"slot-{slot}.lock", "w")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+            return
+        if time.monotonic() >= deadline:
+            logger.warning("Upload slots busy", extra={"max_uploads": max_uploads})
+            raise UploadBusy(f"{max_uploads} uploads already in progress")
+        await asyncio.sleep(_SLOT_POLL_SECONDS)
@@ -0,0 +1,300 @@
+"""
+Chunked, resumable video uploads
+
+A client creates an upload (POST /uploads) and sends the file in chunks
+(PUT /uploads/{id} with an Upload-Offset header). Each chunk is appended
+only when its offset is the number of bytes the server already has. After
+a dropped connection the client asks for the offset (GET /uploads/{id})
+and carries on from there.
+
+Uploads live on disk, so any web worker can take the next chunk:
+
+    <BRAWLR_UPLOAD_DIR>/<upload id>/
+        meta.json   filename, size, content type, username, preset, container
+        data        the bytes received so far (its size is the offset)
+        claim       created by the one worker that runs the analysis
+        result.json analysis result (or error), once done
+
+The first chunk tells whether the container is streamable (WebM, or MP4
+with fragments). A streamable upload is analysed while it arrives (see
+video_io.GrowingFile), so the result is ready soon after the last chunk.
+Other files are analysed when the upload completes.
+
+Configured with:
+    BRAWLR_UPLOAD_DIR    where uploads are spooled (default <tmp>/brawlr-uploads)
+    BRAWLR_UPLOAD_CHUNK  chunk size suggested to clients, bytes (default 4 MiB)
+    BRAWLR_UPLOAD_TTL    seconds before an untouched upload is deleted (default 3600)
+"""
+import fcntl
+import json
+import os
+import re
+import secrets
+import shutil
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+UPLOAD_DIR = Path(os.getenv("BRAWLR_UPLOAD_DIR", str(Path(tempfile.gettempdir()) / "brawlr-uploads")))
+CHUNK_SIZE = int(os.getenv("BRAWLR_UPLOAD_CHUNK", str(4 * 1024 * 1024)))
+UPLOAD_TTL = float(os.getenv("BRAWLR_UPLOAD_TTL", "3600"))
+
+# Upload states, in order
+RECEIVING = "receiving"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+_EBML_MAGIC = b"\x1a\x45\xdf\xa3"  # WebM / Matroska
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class OffsetMismatch(Exception):
+    """The chunk doesn't start where the upload ends (or another request is writing)"""
+
+    def __init__(self, offset):
+        super().__init__(f"upload is at offset {offset}")
+        self.offset = offset
+
+
+def container_kind(head):
+    """
+    Identify the container from the first bytes of a video
+
+    Args:
+        head: The first bytes (the whole first chunk is best: MP4 needs its
+            top-level boxes up to mdat or moof)
+
+    Returns:
+        str or None: "webm", "fmp4" (fragmented MP4), "mp4" (plain MP4, not
+        streamable), "other", or None if more bytes are needed to tell
+    """
+    if head.startswith(_EBML_MAGIC):
+        return "webm"
+    if head[4:8] != b"ftyp":
+        return "other" if len(head) >= 8 else None
+
+    position = 0
+    while position + 8 <= len(head):
+        size, box = struct.unpack(">I4s", head[position:position + 8])
+        if size == 1 and position + 16 <= len(head):
+            size = struct.unpack(">Q", head[position + 8:position + 16])[0]
+        if box == b"moof":
+            return "fmp4"
+        if box == b"moov":
+            # An mvex box in the movie header announces fragments
+            moov = head[position:position + size] if size else head[position:]
+            if b"mvex" in moov:
+                return "fmp4"
+            if size and position + size <= len(head):
+                return "mp4"
+        if box == b"mdat":
+            return "mp4"
+        if size < 8:
+            return "other"
+        position += size
+    return None
+
+
+def streamable(container):
+    """True if the container can be decoded front to back while it arrives"""
+    return container in ("webm", "fmp4")
+
+
+def valid_upload_id(upload_id):
+    return bool(upload_id) and bool(_UPLOAD_ID_RE.match(upload_id))
+
+
+class UploadStore:
+    """
+    Upload sessions spooled to disk
+
+    What this does:
+    - create() starts an upload and returns its metadata
+    - append() writes a chunk at an offset, under a file lock, and refuses
+      chunks that don't start at the current end
+    - claim() lets exactly one worker start the analysis; release() undoes
+      it when a streaming analysis gave up waiting for chunks
+    - finish()/fail() record the result for GET /uploads/{id};
+      discard_data() frees the video once it has been analysed
+    - sweep() deletes uploads nobody touched for BRAWLR_UPLOAD_TTL seconds
+
+    Args:
+        root: Spool directory (default: BRAWLR_UPLOAD_DIR)
+        ttl: Seconds an untouched upload is kept (default: BRAWLR_UPLOAD_TTL)
+    """
+
+    def __init__(self, root=UPLOAD_DIR, ttl=UPLOAD_TTL):
+        self.root = Path(root)
+        self.ttl = ttl
+
+    def _dir(self, upload_id):
+        if not valid_upload_id(upload_id):
+            raise UploadNotFound(upload_id)
+        path = self.root / upload_id
+        if not (path / "meta.json").exists():
+            raise UploadNotFound(upload_id)
+        return path
+
+    def data_path(self, upload_id):
+        return self._dir(upload_id) / "data"
+
+    def _write_json(self, path, value):
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(value))
+        os.replace(tmp, path)  # readers never see a half-written file
+
+    def create(self, filename, size, content_type, username=None, preset=None):
+        """
+        Returns:
+            dict: The upload's metadata (id, filename, size, contentType, username,
+            preset, createdAt)
+        """
+        self.sweep()
+        upload_id = secrets.token_hex(16)
+        path = self.root / upload_id
+        path.mkdir(parents=True)
+        (path / "data").touch()
+        meta = {
+            "id": upload_id,
+            "filename": filename,
+            "size": size,
+            "contentType": content_type,
+            "username": username,
+            "preset": preset,
+            "container": None,
+            "createdAt": time.time(),
+        }
+        self._write_json(path / "meta.json", meta)
+        return meta
+
+    def meta(self, upload_id):
+        return json.loads((self._dir(upload_id) / "meta.json").read_text())
+
+    def offset(self, upload_id):
+        try:
+            return self.data_path(upload_id).stat().st_size
+        except FileNotFoundError:  # analysed and discarded
+            return self.meta(upload_id)["size"]
+
+    async def append(self, upload_id, offset, chunks):
+        """
+        Append a chunk that starts at `offset`
+
+        A chunk cut short by a dropped connection keeps the bytes that
+        arrived; the client resumes from the new offset.
+
+        Args:
+            upload_id: Upload id
+            offset: Where the client thinks the upload ends
+            chunks: Async iterator of bytes (the request body)
+
+        Returns:
+            dict: The upload's metadata with "offset" (bytes now received)
+
+        Raises:
+            UploadNotFound, OffsetMismatch, ValueError (chunk runs past the declared size)
+        """
+        meta = self.meta(upload_id)
+        data = self.data_path(upload_id)
+        if not data.exists():  # complete, analysed and discarded
+            raise OffsetMismatch(meta["size"])
+        with open(data, "r+b") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise OffsetMismatch(data.stat().st_size)
+            try:
+                current = f.seek(0, os.SEEK_END)
+                if offset != current:
+                    raise OffsetMismatch(current)
+                async for chunk in chunks:
+                    if current + len(chunk) > meta["size"]:
+                        raise ValueError(f"upload is {meta['size']} bytes")
+                    f.write(chunk)
+                    current += len(chunk)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        if meta["container"] is None:
+            with open(data, "rb") as f:
+                meta["container"] = container_kind(f.read(CHUNK_SIZE))
+            if meta["container"] is not None or current >= meta["size"]:
+                meta["container"] = meta["container"] or "other"
+                self._write_json(data.parent / "meta.json", meta)
+        return {**meta, "offset": current}
+
+    def claim(self, upload_id):
+        """True for the first caller only: that caller runs the analysis"""
+        try:
+            fd = os.open(self._dir(upload_id) / "claim", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+    def release(self, upload_id):
+        """Back to receiving: the next chunk can claim the upload and start the analysis again"""
+        try:
+            (self._dir(upload_id) / "claim").unlink()
+        except FileNotFoundError:
+            pass
+
+    def finish(self, upload_id, result):
+        self._write_json(self._dir(upload_id) / "result.json", {"state": DONE, "result": result})
+
+    def fail(self, upload_id, error):
+        self._write_json(self._dir(upload_id) / "result.json", {"state": FAILED, "error": error})
+
+    def discard_data(self, upload_id):
+        """Free the video once it is analysed (the metadata and result stay until the TTL)"""
+        try:
+            self.data_path(upload_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def status(self, upload_id):
+        """
+        Returns:
+            dict: uploadId, filename, size, offset, container, state and, once
+            done, result (or error)
+        """
+        path = self._dir(upload_id)
+        meta = self.meta(upload_id)
+        status = {
+            "uploadId": upload_id,
+            "filename": meta["filename"],
+            "size": meta["size"],
+            "offset": self.offset(upload_id),
+            "container": meta["container"],
+            "state": PROCESSING if (path / "claim").exists() else RECEIVING,
+        }
+        result = path / "result.json"
+        if result.exists():
+            status.update(json.loads(result.read_text()))
+        return status
+
+    def sweep(self):
+        """Delete uploads untouched for longer than the TTL"""
+        if not self.root.exists():
+            return
+        cutoff = time.time() - self.ttl
+        for path in self.root.iterdir():
+            try:
+                touched = max(entry.stat().st_mtime for entry in path.iterdir())
+            except (OSError, ValueError):
+                continue
+            if touched < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info("Expired upload removed", extra={"upload_id": path.name})
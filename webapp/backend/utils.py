@@ -5,6 +5,12 @@ import numpy as np
 from io import BytesIO
 from PIL import Image
 import tempfile
+from . import metrics
+from . import profiling
+from . import video_io
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 def base64_to_image(base64_data):
     """
@@ -42,7 +48,7 @@ def base64_to_image(base64_data):
         return bgr_array
         
     except Exception as e:
-        print(f"Error converting base64 to image: {e}")
+        logger.warning("Error converting base64 to image", extra={"error": str(e)})
         return None
 
 def format_punch_result(punch_type, confidence):
@@ -100,7 +106,29 @@ def preprocess_image(image_array):
     
     return image_array
 
-def preprocess_video(video_path, max_resolution=640):
+def decode_frame(base64_data):
+    """
+    Turn a /ws frame message into the array YOLO runs on
+    
+    What this does:
+    - base64_to_image + preprocess_image, each timed into the /ws histograms
+    - Counts undecodable frames as dropped
+    
+    Args:
+        base64_data: Data URL sent by the frontend
+    
+    Returns:
+        numpy array or None: Preprocessed BGR image, or None if decoding failed
+    """
+    with profiling.stage("decode", metrics.WS_DECODE_SECONDS):
+        image_array = base64_to_image(base64_data)
+    if image_array is None:
+        metrics.WS_FRAMES_DROPPED.labels(reason="decode").inc()
+        return None
+    with profiling.stage("preprocess", metrics.WS_PREPROCESS_SECONDS):
+        return preprocess_image(image_array)
+
+def preprocess_video(video_path, max_resolution=640, output_path=None):
     """
     Preprocess video for faster analysis
     
@@ -108,29 +136,35 @@ def preprocess_video(video_path, max_resolution=640):
     - Resizes video to max_resolution for faster processing
     - Compresses video to reduce file size
     - Creates optimized temporary file
+    - Decodes with video_io (PyAV/FFmpeg threads or hardware decoding) on a
+      background thread, so decoding overlaps with resizing and encoding
     
     Args:
         video_path: Path to input video file
         max_resolution: Maximum resolution (default 640px)
+        output_path: Where to write it, e.g. a scratch.ScratchFile path
+            (default: a new temp file the caller deletes)
     
     Returns:
         str: Path to preprocessed video file
     """
     try:
         # Create temporary file for preprocessed video
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        temp_path = temp_file.name
-        temp_file.close()
+        if output_path is None:
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+            temp_path = temp_file.name
+            temp_file.close()
+        else:
+            temp_path = output_path
         
         # Open input video
-        cap = cv2.VideoCapture(video_path)
+        video = video_io.VideoReader(video_path)
         
         # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = int(video.fps)
+        width = video.width
+        height = video.height
         
-        print(f"Original video: {width}x{height} @ {fps}fps")
         
         # Calculate new dimensions maintaining aspect ratio
         if width > height:
@@ -140,30 +174,32 @@ def preprocess_video(video_path, max_resolution=640):
             new_height = min(max_resolution, height)
             new_width = int((width * new_height) / height)
         
-        print(f"Preprocessed video: {new_width}x{new_height} @ {fps}fps")
+        logger.debug("Preprocessing video", extra={
+            "src_size": f"{width}x{height}",
+            "dst_size": f"{new_width}x{new_height}",
+            "fps": fps,
+            "decoder": video.decoder,
+        })
         
         # Set up video writer
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         out = cv2.VideoWriter(temp_path, fourcc, fps, (new_width, new_height))
         
         frame_count = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Resize frame
-            resized_frame = cv2.resize(frame, (new_width, new_height))
-            out.write(resized_frame)
-            frame_count += 1
-        
-        # Clean up
-        cap.release()
-        out.release()
-        
-        print(f"Video preprocessed: {frame_count} frames")
+        try:
+            for frame in video_io.prefetch(video.frames()):
+                # Resize frame
+                resized_frame = cv2.resize(frame, (new_width, new_height))
+                out.write(resized_frame)
+                frame_count += 1
+        finally:
+            # Clean up
+            video.close()
+            out.release()
+        
+        logger.info("Video preprocessed", extra={"frames": frame_count, "size": f"{new_width}x{new_height}"})
         return temp_path
         
-    except Exception as e:
-        print(f"Error preprocessing video: {e}")
+    except Exception:
+        logger.exception("Error preprocessing video")
         return video_path  # Return original if preprocessing fails
\ No newline at end of file
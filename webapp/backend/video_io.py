@@ -0,0 +1,344 @@
+"""
+Video decoding for uploads
+
+One reader interface over two decoders, chosen per host:
+- "pyav": PyAV (FFmpeg) with frame + slice threading. Used when `av` is installed.
+- "opencv": cv2.VideoCapture on the FFmpeg backend. It asks for hardware
+  decoding (VIDEO_ACCELERATION_ANY) and a decoder thread count where the
+  OpenCV build supports them, and falls back to a plain capture otherwise.
+
+prefetch() decodes on a background thread into a bounded queue. The
+next frames are decoded while the model runs on the current one.
+
+Files in the RAM scratch space (scratch.py) are decoded by PyAV from an
+mmap of the file.
+
+GrowingFile reads a file that is still being uploaded, waiting for bytes
+that haven't arrived yet. VideoReader(..., expected_size=N) decodes
+through it with PyAV, so a streamable upload (fragmented MP4, WebM) can be
+analysed while its later chunks are still on the way.
+
+Configured with:
+    BRAWLR_VIDEO_DECODER   auto | pyav | opencv (default auto)
+    BRAWLR_DECODE_THREADS  decoder threads, 0 = let FFmpeg decide (default 0)
+    BRAWLR_DECODE_QUEUE    frames decoded ahead of the consumer (default 8)
+    BRAWLR_UPLOAD_STALL    seconds GrowingFile waits for an upload to grow (default 30)
+"""
+import io
+import itertools
+import os
+import queue
+import threading
+import time
+
+import cv2  # type: ignore
+import numpy as np
+
+from . import scratch
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import av  # type: ignore
+except ImportError:  # optional: pip install av
+    av = None
+
+if av is not None and not hasattr(av.VideoFrame, "rotation"):
+    # Before PyAV 14.1 frames don't carry the display rotation, so portrait phone videos would decode sideways
+    logger.warning("PyAV is older than 14.1, decoding with OpenCV instead", extra={"pyav_version": av.__version__})
+    av = None
+
+DECODER = os.getenv("BRAWLR_VIDEO_DECODER", "auto")
+DECODE_THREADS = int(os.getenv("BRAWLR_DECODE_THREADS", "0"))
+DECODE_QUEUE = int(os.getenv("BRAWLR_DECODE_QUEUE", "8"))
+STALL_TIMEOUT = float(os.getenv("BRAWLR_UPLOAD_STALL", "30"))
+
+# How often GrowingFile checks for new bytes
+_GROW_POLL_SECONDS = 0.05
+
+# Marks the end of the decoded frames in prefetch()
+_END = object()
+
+
+def available_decoders():
+    return (["pyav"] if av is not None else []) + ["opencv"]
+
+
+def pick_decoder(requested=DECODER):
+    """
+    Returns:
+        str: "pyav" or "opencv" (auto prefers PyAV when it is installed)
+    """
+    if requested == "auto":
+        return available_decoders()[0]
+    if requested not in available_decoders():
+        logger.warning("Video decoder not available, using opencv", extra={"decoder": requested})
+        return "opencv"
+    return requested
+
+
+class UploadStalled(TimeoutError):
+    """A GrowingFile stopped growing before reaching its size (position: bytes read)"""
+
+    def __init__(self, position, size):
+        super().__init__(f"upload stalled at {position} of {size} bytes")
+        self.position = position
+
+
+class GrowingFile(io.RawIOBase):
+    """
+    Read-only, forward-only view of a file that is still being written
+
+    What this does:
+    - read() returns the bytes that are there; at the current end of the
+      file it waits for more until `size` bytes have been read (then EOF)
+    - Raises UploadStalled (a TimeoutError) if the file stops growing for
+      stall_timeout seconds (a paused or abandoned upload)
+    - Not seekable, so FFmpeg demuxes it front to back like a network
+      stream and never jumps to the end of the file
+
+    Args:
+        path: File being appended to
+        size: Final size in bytes
+        stall_timeout: Seconds to wait for new bytes (default: BRAWLR_UPLOAD_STALL)
+    """
+
+    def __init__(self, path, size, stall_timeout=STALL_TIMEOUT):
+        super().__init__()
+        self._file = open(path, "rb")
+        self.size = size
+        self.stall_timeout = stall_timeout
+        self.position = 0
+        self.stalled = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        waited_since = None
+        while True:
+            count = self._file.readinto(buffer)
+            if count:
+                self.position += count
+                return count
+            if self.position >= self.size:
+                return 0
+            now = time.monotonic()
+            if waited_since is None:
+                waited_since = now
+            elif now - waited_since > self.stall_timeout:
+                self.stalled = True
+                raise UploadStalled(self.position, self.size)
+            time.sleep(_GROW_POLL_SECONDS)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class _PyAVReader:
+    name = "pyav"
+
+    def __init__(self, path, threads, source=None):
+        # source: a file-like object (or mmap) to decode instead of opening path
+        self._source = source
+        self._container = None
+        try:
+            self._open(path, threads)
+        except Exception:
+            self.close()  # e.g. no video stream, or the first frame doesn't decode
+            raise
+
+    def _open(self, path, threads):
+        self._container = av.open(self._source if self._source is not None else str(path))
+        self._stream = self._container.streams.video[0]
+        self._stream.thread_type = "AUTO"  # frame + slice threading
+        self._stream.thread_count = threads
+        rate = self._stream.average_rate
+        self.fps = float(rate) if rate else 0.0
+        self.frame_count = self._stream.frames or self._estimated_frames()
+
+        # Phone videos are stored landscape with a display matrix. cv2.VideoCapture applies it;
+        # here frames() does. The rotation is read from the first frame, which frames() yields first.
+        self._decoded = self._container.decode(self._stream)
+        self._first = next(self._decoded, None)
+        self.rotation = self._first.rotation if self._first is not None else 0
+        self.width = self._stream.codec_context.width
+        self.height = self._stream.codec_context.height
+        if self.rotation % 180:
+            self.width, self.height = self.height, self.width
+
+    def _estimated_frames(self):
+        # WebM and fragmented MP4 don't record a frame count; their duration usually is known
+        if self._stream.duration and self._stream.time_base:
+            seconds = float(self._stream.duration * self._stream.time_base)
+        elif self._container.duration:
+            seconds = self._container.duration / av.time_base
+        else:
+            return 0
+        return int(round(seconds * self.fps))
+
+    def frames(self):
+        if self._first is None:
+            return
+        # Counterclockwise degrees, as in FFmpeg's display matrix
+        turns = round(self.rotation / 90) % 4
+        for frame in itertools.chain((self._first,), self._decoded):
+            image = frame.to_ndarray(format="bgr24")
+            yield np.ascontiguousarray(np.rot90(image, turns)) if turns else image
+        # PyAV drops exceptions raised in some read callbacks and FFmpeg sees an early EOF instead
+        if getattr(self._source, "stalled", False):
+            raise UploadStalled(self._source.position, self._source.size)
+
+    def close(self):
+        if self._container is not None:
+            self._container.close()
+        if self._source is not None:
+            self._source.close()
+
+
+class _OpenCVReader:
+    name = "opencv"
+
+    def __init__(self, path, threads):
+        params = []
+        if hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        if hasattr(cv2, "CAP_PROP_N_THREADS"):
+            params += [cv2.CAP_PROP_N_THREADS, threads]
+        self._cap = cv2.VideoCapture(str(path), cv2.CAP_FFMPEG, params) if params else None
+        if self._cap is None or not self._cap.isOpened():
+            self._cap = cv2.VideoCapture(str(path))
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def frames(self):
+        while True:
+            ok, frame = self._cap.read()
+            if not ok:
+                return
+            yield frame
+
+    def close(self):
+        self._cap.release()
+
+
+class VideoReader:
+    """
+    Open a video with the decoder picked for this host
+
+    What this does:
+    - Exposes fps, width, height and frame_count (frame_count is estimated
+      from the duration if the container doesn't record it, 0 if neither is known)
+    - frames() yields BGR uint8 arrays, like cv2.VideoCapture.read(), turned
+      upright by the video's display rotation (width/height are the upright size)
+    - Works as a context manager that closes the decoder
+    - PyAV reads files in RAM scratch space through an mmap
+    - With expected_size, reads the file through GrowingFile with PyAV
+      (the only decoder that takes a file object), waiting for bytes still
+      being uploaded
+
+    Args:
+        path: Video file
+        decoder: "auto", "pyav" or "opencv" (default: BRAWLR_VIDEO_DECODER)
+        threads: Decoder threads, 0 = FFmpeg's choice (default: BRAWLR_DECODE_THREADS)
+        expected_size: Final size of a file still being written (None = complete)
+    """
+
+    def __init__(self, path, decoder=DECODER, threads=DECODE_THREADS, expected_size=None):
+        if expected_size is not None:
+            if av is None:
+                raise RuntimeError("Decoding a growing file needs PyAV (pip install av)")
+            self._reader = _PyAVReader(path, threads, source=GrowingFile(path, expected_size))
+        else:
+            self._reader = self._open(path, pick_decoder(decoder), threads)
+        self.decoder = self._reader.name
+        self.fps = self._reader.fps
+        self.width = self._reader.width
+        self.height = self._reader.height
+        self.frame_count = self._reader.frame_count
+
+    @staticmethod
+    def _open(path, name, threads):
+        try:
+            if name == "opencv":
+                return _OpenCVReader(path, threads)
+            if scratch.space.in_ram(path) and os.path.getsize(path):
+                return _PyAVReader(path, threads, source=scratch.map_file(path))
+            return _PyAVReader(path, threads)
+        except Exception as e:
+            if name == "opencv":
+                raise
+            # e.g. a container PyAV can't open but OpenCV's FFmpeg build can
+            logger.warning("PyAV could not open video, using opencv", extra={"error": str(e)})
+            return _OpenCVReader(path, threads)
+
+    def frames(self):
+        return self._reader.frames()
+
+    def close(self):
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def prefetch(frames, depth=DECODE_QUEUE):
+    """
+    Run a frame iterator on a background thread, at most `depth` frames ahead
+
+    What this does:
+    - Decoding (which releases the GIL in FFmpeg) overlaps with whatever the
+      consumer does with each frame
+    - The bounded queue keeps memory flat when the consumer is slower
+    - Decoder errors are re-raised in the consumer
+    - Closing the generator early stops the decoder thread
+
+    Args:
+        frames: Iterator of frames, e.g. VideoReader.frames()
+        depth: Queue size
+
+    Yields:
+        Frames, in order
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode():
+        try:
+            for frame in frames:
+                if not put(frame):
+                    return
+            put(_END)
+        except BaseException as e:  # handed to the consumer
+            put(e)
+
+    thread = threading.Thread(target=decode, name="brawlr-decode", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
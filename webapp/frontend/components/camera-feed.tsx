@@ -22,6 +22,22 @@ import { usePunches } from "@/components/context/PunchContext"
 import { useMatch } from "./context/MatchContext"
 import { SaveScoreModal } from "./SaveScoreModel"
 
+// Capture settings the backend can send over the WebSocket ({"type": "config", ...})
+type CaptureConfig = {
+  fps: number
+  maxWidth: number
+  maxHeight: number
+  jpegQuality: number
+}
+
+// Used until the backend's first config message arrives (full camera resolution, 10 fps)
+const DEFAULT_CAPTURE_CONFIG: CaptureConfig = {
+  fps: 10,
+  maxWidth: Number.POSITIVE_INFINITY,
+  maxHeight: Number.POSITIVE_INFINITY,
+  jpegQuality: 0.7,
+}
+
 export function CameraFeed() {
   // --- State Variables ---
   const [isActive, setIsActive] = useState(false)
@@ -33,6 +49,9 @@ export function CameraFeed() {
    const wsRef = useRef<WebSocket | null>(null)  // Holds WebSocket connection
    const intervalRef = useRef<NodeJS.Timeout | null>(null)  // Holds timer ID
    const canvasRef = useRef<HTMLCanvasElement | null>(null)  // Hidden canvas for frame capture
+   const sessionIdRef = useRef<string | null>(null)  // Backend session id, reused on reconnect so the router keeps us on the same node
+   // Capture settings; the backend sends {"type": "config"} to change them based on its load
+   const captureConfigRef = useRef<CaptureConfig>(DEFAULT_CAPTURE_CONFIG)
    const [isConnected, setIsConnected] = useState(false)  // Backend connection status
 
      // --- Contexts ---
@@ -131,15 +150,17 @@ export function CameraFeed() {
       startTimer()
 
       // --- Connect to backend WebSocket ---
-      const ws = new WebSocket("ws://localhost:8000/ws")
+      const sessionQuery = sessionIdRef.current ? `?session=${encodeURIComponent(sessionIdRef.current)}` : ""
+      const ws = new WebSocket(`ws://localhost:8000/ws${sessionQuery}`)
       wsRef.current = ws
 
       ws.onopen = () => {
         console.log("✅ WebSocket connected")
         setIsConnected(true)
 
-        // Start frame capture loop (every 100ms)
-        intervalRef.current = setInterval(captureFrame, 100)
+        // Start frame capture loop (every 100ms until the backend sends a config)
+        captureConfigRef.current = DEFAULT_CAPTURE_CONFIG
+        intervalRef.current = setInterval(captureFrame, 1000 / DEFAULT_CAPTURE_CONFIG.fps)
       }
 
       ws.onmessage = (event) => {
@@ -165,6 +186,13 @@ export function CameraFeed() {
             }
           } else if (data.type === 'no_punch'){
             // No punch detected - can be used for future features
+          } else if (data.type === "session") {
+            // Remember the session so a reconnect lands on the same backend node
+            sessionIdRef.current = data.sessionId
+          } else if (data.type === "config") {
+            applyCaptureConfig(data)
+          } else if (data.type === "error" && data.code === "capacity") {
+            console.warn("⚠️ Backend is at capacity, try again shortly")
           }
           
         }
@@ -263,6 +291,16 @@ export function CameraFeed() {
     }
   }
 
+  // Apply capture settings from the backend and restart the capture loop if the rate changed
+  function applyCaptureConfig(config: CaptureConfig) {
+    const previousFps = captureConfigRef.current.fps
+    captureConfigRef.current = config
+    if (config.fps !== previousFps && intervalRef.current) {
+      clearInterval(intervalRef.current)
+      intervalRef.current = setInterval(captureFrame, 1000 / config.fps)
+    }
+  }
+
   // Function to capture a frame from video and send to backend
   function captureFrame() {
     const video = videoRef.current
@@ -271,9 +309,12 @@ export function CameraFeed() {
 
     if (!video || !canvas || ws?.readyState !== WebSocket.OPEN) return
 
+    // Downscale to the size the backend asked for (it never uses more than that)
+    const { maxWidth, maxHeight, jpegQuality } = captureConfigRef.current
+    const scale = Math.min(1, maxWidth / video.videoWidth, maxHeight / video.videoHeight)
     const ctx = canvas.getContext("2d")
-    canvas.width = video.videoWidth
-    canvas.height = video.videoHeight
+    canvas.width = Math.round(video.videoWidth * scale)
+    canvas.height = Math.round(video.videoHeight * scale)
     ctx?.drawImage(video, 0, 0, canvas.width, canvas.height)
 
     canvas.toBlob((blob) => {
@@ -290,7 +331,7 @@ export function CameraFeed() {
         }
         reader.readAsDataURL(blob)
       }
-    }, "image/jpeg", 0.7)
+    }, "image/jpeg", jpegQuality)
   }
 
   // --- JSX ---
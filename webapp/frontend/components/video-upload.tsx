@@ -17,6 +17,7 @@ import { Upload, FileVideo, CheckCircle, AlertCircle } from "lucide-react"
 
 interface UploadResult {
   success: boolean
+  videoType?: "home" | "stock" | "unknown"
   punchCounts?: {
     // jab: number
     // cross: number
@@ -28,6 +29,73 @@ interface UploadResult {
   error?: string
 }
 
+const API_URL = 'http://localhost:8000'
+
+// Chunk retries after a dropped connection before giving up
+const MAX_CHUNK_RETRIES = 5
+
+// Send a file with the resumable upload protocol (POST /uploads, then PUT chunks).
+// After a failed chunk it asks the server how much arrived and carries on from there.
+// Returns the upload id once every byte is on the server.
+async function uploadInChunks(file: File, onProgress: (sent: number) => void): Promise<string> {
+  const created = await fetch(`${API_URL}/uploads`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ filename: file.name, size: file.size, contentType: file.type }),
+  })
+  if (!created.ok) {
+    throw new Error(`Upload failed: ${created.statusText}`)
+  }
+  const { uploadId, chunkSize } = await created.json()
+
+  let offset = 0
+  let retries = 0
+  while (offset < file.size) {
+    try {
+      const response = await fetch(`${API_URL}/uploads/${uploadId}`, {
+        method: 'PUT',
+        headers: { 'Upload-Offset': String(offset) },
+        body: file.slice(offset, offset + chunkSize),
+      })
+      if (response.ok || response.status === 409) {
+        // 409: the server has a different offset (e.g. part of a dropped chunk arrived)
+        offset = (await response.json()).offset
+        retries = 0
+      } else {
+        throw new Error(`Upload failed: ${response.statusText}`)
+      }
+    } catch (error) {
+      if (++retries > MAX_CHUNK_RETRIES) {
+        throw error
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000 * retries))
+      const status = await fetch(`${API_URL}/uploads/${uploadId}`).then((r) => r.json()).catch(() => null)
+      if (status) {
+        offset = status.offset
+      }
+    }
+    onProgress(offset)
+  }
+  return uploadId
+}
+
+// Wait for the analysis of a finished upload (streamable videos are mostly done already)
+async function waitForResult(uploadId: string) {
+  while (true) {
+    const response = await fetch(`${API_URL}/uploads/${uploadId}?wait=30`)
+    if (!response.ok) {
+      throw new Error(`Upload failed: ${response.statusText}`)
+    }
+    const status = await response.json()
+    if (status.state === 'done') {
+      return status.result
+    }
+    if (status.state === 'failed') {
+      throw new Error(status.error || 'Video processing failed')
+    }
+  }
+}
+
 export function VideoUpload() {
   const [isUploading, setIsUploading] = useState(false)
   const [uploadProgress, setUploadProgress] = useState(0)
@@ -69,59 +137,69 @@ export function VideoUpload() {
 
 
    try {
-      // Create FormData for file upload
-      const formData = new FormData()
-      formData.append('video', file)
-
-      // Simulate progress with realistic stages
-      const progressStages = [
-        { stage: 'Uploading video...', progress: 20 },
-        { stage: 'Preprocessing video...', progress: 40 },
-        { stage: 'Loading AI model...', progress: 60 },
-        { stage: 'Analyzing frames...', progress: 80 },
-        { stage: 'Counting punches...', progress: 95 }
-      ]
-
- let currentStageIndex = 0
-      
-      progressInterval = setInterval(() => {
-        if (currentStageIndex < progressStages.length) {
-          const currentStage = progressStages[currentStageIndex]
-          setProcessingStage(currentStage.stage)
-          setUploadProgress(currentStage.progress)
-          currentStageIndex++
-        } else {
-          if (progressInterval) {
-            clearInterval(progressInterval)
-            progressInterval = null
+      let data
+      if (fastMode) {
+        // Create FormData for file upload
+        const formData = new FormData()
+        formData.append('video', file)
+
+        // Simulate progress with realistic stages
+        const progressStages = [
+          { stage: 'Uploading video...', progress: 20 },
+          { stage: 'Preprocessing video...', progress: 40 },
+          { stage: 'Loading AI model...', progress: 60 },
+          { stage: 'Analyzing frames...', progress: 80 },
+          { stage: 'Counting punches...', progress: 95 }
+        ]
+
+        let currentStageIndex = 0
+
+        progressInterval = setInterval(() => {
+          if (currentStageIndex < progressStages.length) {
+            const currentStage = progressStages[currentStageIndex]
+            setProcessingStage(currentStage.stage)
+            setUploadProgress(currentStage.progress)
+            currentStageIndex++
+          } else {
+            if (progressInterval) {
+              clearInterval(progressInterval)
+              progressInterval = null
+            }
           }
-        }
-      }, 1000)
-
+        }, 1000)
 
- // Upload to backend (choose endpoint based on fast mode)
-      const endpoint = fastMode ? 'http://localhost:8000/upload-video-fast' : 'http://localhost:8000/upload-video'
-      const response = await fetch(endpoint, {
-        method: 'POST',
-        body: formData,
-      })
+        const response = await fetch(`${API_URL}/upload-video-fast`, {
+          method: 'POST',
+          body: formData,
+        })
 
-if (progressInterval) {
-        clearInterval(progressInterval)
-        progressInterval = null
+        if (progressInterval) {
+          clearInterval(progressInterval)
+          progressInterval = null
+        }
+        if (!response.ok) {
+          throw new Error(`Upload failed: ${response.statusText}`)
+        }
+        data = await response.json()
+      } else {
+        // Chunked upload with real progress; analysis may already be running meanwhile
+        setProcessingStage('Uploading video...')
+        const uploadId = await uploadInChunks(file, (sent) => {
+          setUploadProgress(Math.round((sent / file.size) * 80))
+        })
+        setProcessingStage('Counting punches...')
+        setUploadProgress(90)
+        data = await waitForResult(uploadId)
       }
+
       setProcessingStage('Finalizing results...')
       setUploadProgress(100)
 
-      if (!response.ok) {
-        throw new Error(`Upload failed: ${response.statusText}`)
-      }
-
-      const data = await response.json()
       console.log("Backend response:", data)
       
 setResult({
   success: data.success,
+  videoType: data.videoType,
   punchCounts:
     data.punchCounts ||
     data.results?.punchCounts || // ✅ works with your /upload-video endpoint
@@ -277,6 +355,11 @@ setResult({
             <CheckCircle className="h-6 w-6" />
             <span className="text-xl font-semibold">Analysis Complete!</span>
           </div>
+          {result.videoType && result.videoType !== "unknown" && (
+            <div className="text-center text-sm text-gray-400">
+              Detected: {result.videoType === "stock" ? "stock footage" : "home video"}
+            </div>
+          )}
 
           {/* Punch Breakdown */}
           {result.punchCounts && (